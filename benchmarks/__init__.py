@@ -0,0 +1,5 @@
+# Create empty __init__.py files to make directories Python packages
+import os
+
+# Benchmarks run without MongoDB unless MONGODB_URI points at a test database
+os.environ.setdefault("MONGODB_MOCK_FALLBACK", "true")
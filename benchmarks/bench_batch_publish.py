@@ -0,0 +1,96 @@
+"""One batch publish against one post per account, for the same video on many accounts.
+
+Links N accounts through the login flow, then publishes the same source
+video to all of them twice. First it makes one ``/video/create`` call per
+account. Then it makes a single ``/video/batch`` call, with an extra item
+for an account that is not linked and must come back rejected. For each
+mode it reports the time until every post is published and how much of the
+source video was fetched. Every post's chunks still go to its own upload URL.
+
+Usage: python -m benchmarks.bench_batch_publish [accounts]
+"""
+import asyncio
+import sys
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+
+from benchmarks.load import AppProcess, _link_accounts
+from benchmarks.stubs import StubProcess, fetch_json, media_app, tiktok_app, user_service_app
+
+VIDEO_SIZE = 24 * 1024 * 1024
+FINAL = ("completed", "failed", "rejected")
+
+
+async def _single_posts(client, app, video_url, accounts):
+    async def post(provider_id):
+        response = await client.post(f"{app.url}/api/tiktok/video/create", json={
+            "provider_id": provider_id,
+            "content": {"video_url": video_url, "description": "Single post"},
+        })
+        job_id = response.json()["job_id"]
+        while True:
+            job = (await client.get(f"{app.url}/api/tiktok/video/jobs/{job_id}")).json()
+            if job["status"] in FINAL:
+                return job["status"]
+            await asyncio.sleep(0.1)
+
+    return await asyncio.gather(*(post(provider_id) for provider_id in accounts))
+
+
+async def _batch(client, app, video_url, accounts):
+    response = await client.post(f"{app.url}/api/tiktok/video/batch", json={
+        "content": {"video_url": video_url, "description": "Batch post"},
+        "items": [{"provider_id": provider_id} for provider_id in accounts] + [{"provider_id": "not_linked"}],
+    })
+    created = response.json()
+    assert created["items"][-1]["status"] == "rejected", created
+    while True:
+        batch = (await client.get(f"{app.url}/api/tiktok/video/batches/{created['batch_id']}")).json()
+        if all(item["status"] in FINAL for item in batch["items"]):
+            assert len({item["publish_id"] for item in batch["items"][:-1]}) == len(accounts), batch
+            return [item["status"] for item in batch["items"][:-1]]
+        await asyncio.sleep(0.1)
+
+
+async def main(count):
+    media = StubProcess(media_app, video_size=VIDEO_SIZE).start()
+    tiktok = StubProcess(tiktok_app, latency=0.02, upload_url=f"{media.url}/upload/").start()
+    users = StubProcess(user_service_app, latency=0.02).start()
+    app = AppProcess(
+        TIKTOK_API_BASE_URL=tiktok.url,
+        USER_SERVICE_URL=users.url,
+        TIKTOK_CLIENT_ID="bench",
+        TIKTOK_CLIENT_SECRET="bench",
+        SECRET_KEY="bench",
+        LOG_LEVEL="WARNING",
+        TIKTOK_PUBLISH_STATUS_POLL_INTERVAL="0.2",
+        PUBLISH_WORKER_CONCURRENCY="8",
+    ).start()
+    video_url = f"{media.url}/video.mp4"
+    try:
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        async with httpx.AsyncClient(timeout=120, cookies=no_cookies) as client:
+            accounts = await _link_accounts(client, app.url, tiktok.url, count)
+            print(f"{len(accounts)} accounts, {VIDEO_SIZE / 2**20:.0f} MiB video")
+            print(f"{'mode':<8} {'posts':>5} {'published':>9} {'seconds':>8} {'source GETs':>11} "
+                  f"{'source MiB':>10} {'uploaded MiB':>12}")
+            for mode, run in (("single", _single_posts), ("batch", _batch)):
+                before = fetch_json(f"{media.url}/upload/stats")
+                started = time.perf_counter()
+                statuses = await run(client, app, video_url, accounts)
+                elapsed = time.perf_counter() - started
+                after = fetch_json(f"{media.url}/upload/stats")
+                print(f"{mode:<8} {len(statuses):>5} {statuses.count('completed'):>9} {elapsed:>8.2f} "
+                      f"{after['source_requests'] - before['source_requests']:>11} "
+                      f"{(after['source_bytes'] - before['source_bytes']) / 2**20:>10.1f} "
+                      f"{(after['bytes'] - before['bytes']) / 2**20:>12.1f}")
+    finally:
+        app.stop()
+        for stub in (users, tiktok, media):
+            stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,125 @@
+"""Dashboard polling of the read endpoints: shared upstream calls and 304 responses.
+
+Starts the app against a TikTok stub that takes ``latency`` seconds per
+call, with caches expiring every two seconds and no stale serving, and links
+a few accounts.
+  burst  Fires N identical requests at once for the first page of one
+         account on a cold cache. They must share one video list call.
+  poll   D dashboard tabs poll /api/tiktok/accounts and the first page of
+         every account for a few seconds, first without and then with
+         If-None-Match. Reports requests, 304s, body bytes received, video
+         list calls and latency for each run, and how often the app reused a
+         rendered body instead of serializing it again.
+
+Usage: python -m benchmarks.bench_conditional [tabs] [seconds]
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+from benchmarks.load import AppProcess, _link_accounts, _percentile  # noqa: E402
+from benchmarks.stubs import StubProcess, fetch_json, tiktok_app, user_service_app  # noqa: E402
+
+ACCOUNTS = 5
+POLL_INTERVAL = 0.5
+
+
+def _video_list_calls(tiktok):
+    return fetch_json(f"{tiktok.url}/v2/video/stats")["video_list_calls"]
+
+
+def _metric(text, name):
+    return next((float(line.rpartition(" ")[2]) for line in text.splitlines() if line.startswith(name)), 0)
+
+
+async def burst(client, app, tiktok, provider_id, requests):
+    before = _video_list_calls(tiktok)
+    url = f"{app.url}/api/tiktok/videos/{provider_id}"
+    responses = await asyncio.gather(*(client.get(url) for _ in range(requests)))
+    calls = _video_list_calls(tiktok) - before
+    statuses = Counter(response.status_code for response in responses)
+    assert statuses == {200: requests}, statuses
+    assert len({response.headers["etag"] for response in responses}) == 1
+    assert calls == 1, calls
+    print(f"burst    {requests} identical requests on a cold cache, video list calls: {calls}")
+
+
+async def _tab(client, app, paths, seconds, conditional, results):
+    etags = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for path in paths:
+            headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+            sent = time.perf_counter()
+            response = await client.get(f"{app.url}{path}", headers=headers)
+            results["latencies"].append(time.perf_counter() - sent)
+            results["statuses"][response.status_code] += 1
+            results["bytes"] += len(response.content)
+            etags[path] = response.headers["etag"]
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def poll(client, app, tiktok, accounts, tabs, seconds, conditional):
+    paths = ["/api/tiktok/accounts"] + [f"/api/tiktok/videos/{provider_id}" for provider_id in accounts]
+    results = {"latencies": [], "statuses": Counter(), "bytes": 0}
+    before = _video_list_calls(tiktok)
+    started = time.perf_counter()
+    await asyncio.gather(*(_tab(client, app, paths, seconds, conditional, results) for _ in range(tabs)))
+    elapsed = time.perf_counter() - started
+    calls = _video_list_calls(tiktok) - before
+    statuses = results["statuses"]
+    requests = sum(statuses.values())
+    assert set(statuses) <= {200, 304}, statuses
+    latencies = results["latencies"]
+    print(f"poll     {'If-None-Match' if conditional else 'plain':<13} {requests} requests in {elapsed:.1f}s, "
+          f"{statuses[304]} answered 304, {results['bytes'] / 1024:.0f} KiB of bodies "
+          f"({results['bytes'] / requests:.0f} B each), video list calls: {calls}, "
+          f"p50 {_percentile(latencies, 50) * 1000:.1f} ms, p95 {_percentile(latencies, 95) * 1000:.1f} ms")
+    return results
+
+
+async def main(tabs, seconds):
+    tiktok = StubProcess(tiktok_app, latency=0.2).start()
+    users = StubProcess(user_service_app).start()
+    app = AppProcess(
+        TIKTOK_API_BASE_URL=tiktok.url,
+        USER_SERVICE_URL=users.url,
+        TIKTOK_CLIENT_ID="bench",
+        SECRET_KEY="bench",
+        ACCOUNT_CACHE_TTL="2",
+        VIDEO_CACHE_TTL="2",
+        VIDEO_CACHE_STALE_TTL="0",
+    ).start()
+    try:
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        limits = httpx.Limits(max_connections=tabs, max_keepalive_connections=tabs)
+        async with httpx.AsyncClient(timeout=60, cookies=no_cookies, limits=limits) as client:
+            accounts = await _link_accounts(client, app.url, tiktok.url, ACCOUNTS)
+            await burst(client, app, tiktok, accounts[0], 200)
+            plain = await poll(client, app, tiktok, accounts, tabs, seconds, conditional=False)
+            conditional = await poll(client, app, tiktok, accounts, tabs, seconds, conditional=True)
+            text = (await client.get(f"{app.url}/metrics")).text
+    finally:
+        app.stop()
+        for stub in (users, tiktok):
+            stub.stop()
+
+    reused = _metric(text, 'json_renders_total{outcome="reused"}')
+    rendered = _metric(text, 'json_renders_total{outcome="rendered"}')
+    per_request = [results["bytes"] / sum(results["statuses"].values()) for results in (plain, conditional)]
+    print(f"         bodies {100 * (1 - per_request[1] / per_request[0]):.0f}% smaller per request with "
+          f"If-None-Match; {reused:.0f} bodies reused and {rendered:.0f} serialized across both runs")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 10,
+    ))
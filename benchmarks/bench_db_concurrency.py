@@ -0,0 +1,59 @@
+"""Throughput of blocking vs thread-offloaded Mongo lookups from async handlers.
+
+A MockCollection with an artificial blocking round trip stands in for a
+remote MongoDB, so the benchmark runs without a database.
+
+Usage: python -m benchmarks.bench_db_concurrency [latency_ms] [requests]
+"""
+import asyncio
+import sys
+import time
+
+from shared_module.DB import AsyncCollection, MockCollection
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SlowCollection(MockCollection):
+    """MockCollection whose lookups block like a network round trip"""
+
+    def __init__(self, latency):
+        super().__init__("users")
+        self.latency = latency
+
+    def find_one(self, query):
+        time.sleep(self.latency)
+        return super().find_one(query)
+
+
+async def _throughput(lookup, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handler(index):
+        async with semaphore:
+            await lookup({"email": f"user{index}@example.com"})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(index) for index in range(total)))
+    return total / (time.perf_counter() - started)
+
+
+async def main(latency_ms, total):
+    collection = SlowCollection(latency_ms / 1000)
+    async_collection = AsyncCollection(collection, ThreadPoolExecutor(max_workers=64))
+
+    async def blocking(query):
+        # What the handlers did before: a synchronous call inside async def
+        return collection.find_one(query)
+
+    print(f"latency={latency_ms}ms requests={total}")
+    print(f"{'concurrency':>11} {'blocking rps':>13} {'async rps':>10}")
+    for concurrency in (1, 8, 32, 64):
+        blocking_rps = await _throughput(blocking, total, concurrency)
+        async_rps = await _throughput(async_collection.find_one, total, concurrency)
+        print(f"{concurrency:>11} {blocking_rps:>13.1f} {async_rps:>10.1f}")
+    async_collection.executor.shutdown()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*(args + [5, 400][len(args):])))
@@ -0,0 +1,73 @@
+"""Compare per-call httpx clients with the shared pooled client.
+
+Usage: python -m benchmarks.bench_http_client [requests] [concurrency]
+"""
+import asyncio
+import logging
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.stubs import StubServer, tiktok_app
+from shared_module.http_client import HTTPClientRegistry
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run(call, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def _report(label, samples, elapsed):
+    print(
+        f"{label:<16} p50={_percentile(samples, 50):7.2f}ms "
+        f"p99={_percentile(samples, 99):7.2f}ms "
+        f"mean={statistics.mean(samples):7.2f}ms "
+        f"rps={len(samples) / elapsed:8.1f}"
+    )
+
+
+async def main(total, concurrency):
+    with StubServer(tiktok_app()) as server:
+        url = f"{server.url}/v2/user/info/"
+
+        async def per_call():
+            async with httpx.AsyncClient() as client:
+                (await client.get(url)).raise_for_status()
+
+        registry = HTTPClientRegistry()
+
+        async def pooled():
+            (await registry.get("tiktok").get(url)).raise_for_status()
+
+        # Warm up both paths so the first-connection cost is not counted
+        await per_call()
+        await pooled()
+
+        _report("per-call client", *await _run(per_call, total, concurrency))
+        _report("pooled client", *await _run(pooled, total, concurrency))
+        await registry.aclose()
+
+
+if __name__ == "__main__":
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*(args + [2000, 50][len(args):])))
@@ -0,0 +1,78 @@
+"""Per-call cost of logging on the request path: the old wrapper vs the queued logger.
+
+The old wrapper formatted ``extra_data`` into the message on every call and
+wrote synchronously; the new one returns early for disabled levels and hands
+records to a listener thread. Output goes to /dev/null so only the caller-side
+cost is measured.
+
+Usage: python -m benchmarks.bench_logging [calls]
+"""
+import logging
+import os
+import sys
+import time
+
+from shared_module.log import JsonFormatter, TextFormatter, logging_config
+
+EXTRA = {"publish_id": "v_pub_url~v2.7312345678901234567", "chunks": 12, "video_size": 123456789}
+
+
+def _legacy_logger(name, stream):
+    """The pre-queue wrapper: format eagerly, write synchronously"""
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    original = logger.info
+
+    def info(message, log_type=None, extra_data=None):
+        if extra_data:
+            message = f"{message} | Extra: {extra_data}"
+        original(message)
+
+    return logger, info
+
+
+def _time(call, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        call("Uploaded video chunks to TikTok", log_type="app", extra_data=EXTRA)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main(calls):
+    devnull = open(os.devnull, "w")
+    # Point the listener at /dev/null for the measurement
+    for handler in logging_config.listener.handlers:
+        handler.setStream(devnull)
+
+    legacy, legacy_info = _legacy_logger("bench.legacy", devnull)
+    queued = logging_config.get_logger("bench.queued")
+
+    rows = []
+    for level, label in ((logging.INFO, "enabled"), (logging.WARNING, "disabled")):
+        legacy.setLevel(level)
+        queued.logger.setLevel(level)
+        rows.append((label, _time(legacy_info, calls), _time(queued.info, calls)))
+
+    for name, formatter in (("text", TextFormatter()), ("json", JsonFormatter())):
+        for handler in logging_config.listener.handlers:
+            handler.setFormatter(formatter)
+        queued.logger.setLevel(logging.INFO)
+        started = time.perf_counter()
+        _time(queued.info, calls)
+        logging_config.listener.stop()
+        drained = (time.perf_counter() - started) / calls * 1e6
+        logging_config.listener.start()
+        rows.append((f"{name} end-to-end", None, drained))
+
+    print(f"calls={calls}")
+    print(f"{'level':<20} {'legacy us/call':>15} {'queued us/call':>15}")
+    for label, legacy_us, queued_us in rows:
+        legacy_text = f"{legacy_us:15.2f}" if legacy_us is not None else f"{'-':>15}"
+        print(f"{label:<20} {legacy_text} {queued_us:15.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
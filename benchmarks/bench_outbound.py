@@ -0,0 +1,90 @@
+"""Success rate and latency of TikTok calls against a fault-injecting stub,
+with and without the shared outbound layer (retries, backoff, circuit breaker).
+
+Usage: python -m benchmarks.bench_outbound [requests] [error_rate] [error_status]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from benchmarks.stubs import StubServer, fetch_json, tiktok_app
+from shared_module.http_client import http_clients
+from shared_module.outbound import CircuitOpenError, EndpointPolicy, OutboundClient
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _run(call, total, concurrency=20):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, outcomes = [], {}
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status = (await call(index)).status_code
+            except CircuitOpenError:
+                status = "circuit_open"
+            samples.append((time.perf_counter() - start) * 1000)
+            outcomes[status] = outcomes.get(status, 0) + 1
+
+    await asyncio.gather(*(one(index) for index in range(total)))
+    return samples, outcomes
+
+
+def _report(label, samples, outcomes, upstream):
+    print(
+        f"{label:<10} ok={outcomes.get(200, 0):>5}/{len(samples)} outcomes={outcomes} "
+        f"p50={_percentile(samples, 50):7.1f}ms p99={_percentile(samples, 99):7.1f}ms "
+        f"upstream_requests={upstream}"
+    )
+
+
+async def main(total, error_rate, error_status):
+    app = tiktok_app(error_rate=error_rate, error_status=error_status, retry_after=0, seed=1)
+    with StubServer(app) as server:
+        url = f"{server.url}/v2/video/list/"
+        body = {"json": {"max_count": 20}}
+
+        async def raw(index):
+            return await http_clients.get("tiktok").post(url, **body)
+
+        client = OutboundClient(
+            "tiktok",
+            {"video.list": EndpointPolicy(token_rate=1000, token_burst=1000)},
+            max_retries=4, backoff_base=0.05, backoff_max=1.0,
+        )
+
+        async def layered(index):
+            return await client.post("video.list", url, token=f"token-{index % 50}", **body)
+
+        before = fetch_json(f"{server.url}/__faults__")["requests"]
+        _report("raw", *await _run(raw, total), fetch_json(f"{server.url}/__faults__")["requests"] - before)
+        before = fetch_json(f"{server.url}/__faults__")["requests"]
+        _report("outbound", *await _run(layered, total), fetch_json(f"{server.url}/__faults__")["requests"] - before)
+
+        # A hard-down upstream: the breaker should stop traffic after a few failures
+        app.error_rate = 1.0
+        breaker_client = OutboundClient("tiktok", {}, max_retries=0, breaker_threshold=5)
+
+        async def down(index):
+            return await breaker_client.post("video.list", url, **body)
+
+        before = fetch_json(f"{server.url}/__faults__")["requests"]
+        _report("down+cb", *await _run(down, total), fetch_json(f"{server.url}/__faults__")["requests"] - before)
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("outbound").setLevel(logging.ERROR)
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 500,
+        float(args[1]) if len(args) > 1 else 0.3,
+        int(args[2]) if len(args) > 2 else 503,
+    ))
@@ -0,0 +1,46 @@
+"""Controller dispatch cost as more providers are registered.
+
+Registers dummy providers next to TikTok and times oauth_controller.get_video_job
+through a provider that answers immediately, so only the lookup and the
+call chain are measured.
+
+Usage: python -m benchmarks.bench_provider_dispatch [calls]
+"""
+import asyncio
+import sys
+import time
+
+import oauth_controller
+from src.oauth_service.providers import Provider, providers
+
+
+class DummyProvider(Provider):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    async def get_video_job(self, job_id, user):
+        return {"job_id": job_id}
+
+
+async def _per_call_us(provider, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        await oauth_controller.get_video_job(provider, "job", None)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def main(calls):
+    print(f"{'providers':>9} {'first us':>9} {'last us':>9}")
+    registered = 0
+    for total in (1, 10, 100, 1000):
+        while registered < total:
+            providers.register(DummyProvider(f"dummy{registered}"))
+            registered += 1
+        first = await _per_call_us("dummy0", calls)
+        last = await _per_call_us(f"dummy{total - 1}", calls)
+        print(f"{total:>9} {first:>9.3f} {last:>9.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
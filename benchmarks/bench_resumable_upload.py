@@ -0,0 +1,99 @@
+"""Publish jobs against an upload endpoint that drops connections mid-chunk.
+
+Runs real publish jobs (probe, publish.init, chunked upload, status polling)
+against the TikTok and media stubs. The media stub cuts the connection half
+way through chosen PUTs. Scenarios:
+  chunk retry        the dropped chunk is sent again within the same attempt
+  job retry          no chunk retries, so the job fails and its retry resumes from the checkpoint
+  job retry, stream  the same with a source that ignores Range headers
+
+For each scenario it checks every chunk landed exactly once and reports how
+many bytes were sent compared with the video size.
+
+Usage: python -m benchmarks.bench_resumable_upload [chunks]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.stubs import StubProcess, StubServer, fetch_json, media_app, tiktok_app
+
+CHUNK_SIZE = 5 * 1024 * 1024
+MEDIA_PORT = StubServer._free_port("127.0.0.1")
+
+
+async def _run_job(publish_jobs, kind, video_url):
+    job_id = await publish_jobs.enqueue(
+        kind,
+        {"video_url": video_url, "description": "Resumable upload", "chunk_size": CHUNK_SIZE},
+        email="test@example.com",
+        provider="tiktok",
+        provider_id="test_tiktok_id",
+        publish_id=None,
+    )
+    while True:
+        job = await publish_jobs.get(job_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(0.05)
+
+
+async def main(chunks):
+    video_size = chunks * CHUNK_SIZE
+    media_url = f"http://127.0.0.1:{MEDIA_PORT}"
+    tiktok = StubProcess(tiktok_app, upload_url=f"{media_url}/upload/").start()
+    os.environ.update({
+        "TIKTOK_API_BASE_URL": tiktok.url,
+        "TIKTOK_UPLOAD_CHUNK_RETRY_DELAY": "0.05",
+        "PUBLISH_JOB_RETRY_DELAY": "0.2",
+        "TIKTOK_PUBLISH_STATUS_POLL_INTERVAL": "0.1",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "ERROR"),
+    })
+    from shared_module.DB import connect
+    from shared_module.http_client import http_clients
+    from shared_module.job_queue import publish_jobs
+    from src.oauth_service import tiktok_service, video_upload
+
+    await connect.start()
+    await http_clients.startup()
+    await publish_jobs.start()
+    # Drop the PUT of the second to last chunk
+    drop = chunks - 1
+    scenarios = (
+        ("chunk retry", True, video_upload.CHUNK_RETRIES),
+        ("job retry", True, 0),
+        ("job retry, stream", False, 0),
+    )
+    print(f"video {video_size / 2**20:.0f} MiB in {chunks} chunks, PUT #{drop} dropped mid-body")
+    print(f"{'scenario':<18} {'status':<9} {'attempts':>8} {'PUTs':>5} {'dropped':>7} {'sent MiB':>9} "
+          f"{'overhead':>8} {'seconds':>8}")
+    try:
+        for name, ranges, chunk_retries in scenarios:
+            media = StubProcess(
+                media_app, port=MEDIA_PORT, video_size=video_size, ranges=ranges, drop_puts=(drop,)
+            ).start()
+            video_upload.CHUNK_RETRIES = chunk_retries
+            try:
+                started = time.perf_counter()
+                job = await _run_job(publish_jobs, tiktok_service.PUBLISH_JOB_KIND, f"{media_url}/video.mp4")
+                elapsed = time.perf_counter() - started
+                stats = fetch_json(f"{media_url}/upload/stats")
+            finally:
+                media.stop()
+            landed = sorted(tuple(chunk) for chunk in stats["ranges"])
+            assert job["status"] == "completed", job
+            assert len(landed) == len(set(landed)) == chunks, landed
+            # The dropped PUT sent half a chunk before the connection went
+            sent = stats["bytes"] + stats["dropped"] * CHUNK_SIZE / 2
+            print(f"{name:<18} {job['status']:<9} {job['attempts']:>8} {stats['chunks'] + stats['dropped']:>5} "
+                  f"{stats['dropped']:>7} {sent / 2**20:>9.1f} {100 * (sent / video_size - 1):>7.0f}% "
+                  f"{elapsed:>8.2f}")
+    finally:
+        await publish_jobs.stop()
+        await http_clients.aclose()
+        tiktok.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,174 @@
+"""Scheduled publishing at scale, under a burst, across a restart and with two workers.
+
+Every scenario runs a Scheduler and a JobQueue on a collection of its own.
+The handler only records when each job ran.
+  scale    N posts spread over the next week plus 1,000 due within seconds.
+           Reports schedule and load time and the largest heap; every due
+           post must run on time and no later post early.
+  burst    2,000 posts due at the same instant, released at 500 per second.
+           Reports how the releases spread out.
+  restart  300 posts due over the next few seconds. The scheduler and workers
+           stop half way and start again once every remaining post is
+           overdue; each post must run exactly once and never early.
+  workers  Two schedulers and queues on one collection, as two processes
+           would run; each post must run exactly once.
+
+Without MongoDB the in-memory mock scans where MongoDB uses the
+(status, run_after) index, so load times are pessimistic.
+
+Usage: python -m benchmarks.bench_scheduler [scheduled_posts]
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+os.environ.setdefault("JOB_POLL_INTERVAL", "0.5")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from shared_module.DB import connect  # noqa: E402
+from shared_module.job_queue import JobQueue  # noqa: E402
+from shared_module.scheduler import Scheduler  # noqa: E402
+
+KIND = "bench_post"
+
+
+class Engine:
+    """One process's worth of job queue and scheduler recording every run"""
+
+    def __init__(self, collection_name, runs, **scheduler_kwargs):
+        self.queue = JobQueue(collection_name, concurrency=32)
+        self.queue.register(KIND, self.handle)
+        scheduler_kwargs.setdefault("window", 60)
+        scheduler_kwargs.setdefault("load_interval", 1)
+        self.scheduler = Scheduler(self.queue, **scheduler_kwargs)
+        self.runs = runs
+
+    async def handle(self, job):
+        self.runs[job["_id"]].append((time.time(), job["payload"]["due"]))
+
+    async def start(self):
+        await self.queue.start()
+        await self.scheduler.start()
+        return self
+
+    async def stop(self):
+        await self.scheduler.stop()
+        await self.queue.stop()
+
+
+async def _schedule(scheduler, due_times):
+    ids = []
+    for due in due_times:
+        run_at = datetime.fromtimestamp(due, timezone.utc)
+        ids.append(await scheduler.schedule(KIND, {"due": due}, run_at))
+    return ids
+
+
+async def _wait_for(runs, ids, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and any(not runs[job_id] for job_id in ids):
+        await asyncio.sleep(0.05)
+    return all(runs[job_id] for job_id in ids)
+
+
+def _check_runs(runs, ids):
+    counts = Counter(len(runs[job_id]) for job_id in ids)
+    early = sum(1 for job_id in ids for ran, due in runs[job_id] if ran < due)
+    lateness = sorted(ran - due for job_id in ids for ran, due in runs[job_id][:1])
+    assert counts == {1: len(ids)}, counts
+    assert not early, f"{early} jobs ran early"
+    return lateness
+
+
+async def scale(total):
+    runs = defaultdict(list)
+    engine = Engine("bench_scheduler_scale", runs, dispatch_rate=1000, dispatch_burst=100)
+    now = time.time()
+    week = 7 * 24 * 3600
+    started = time.perf_counter()
+    await _schedule(engine.scheduler, (now + 120 + index * week / total for index in range(total)))
+    scheduled = time.perf_counter() - started
+    due_ids = await _schedule(engine.scheduler, (time.time() + 2 + index / 500 for index in range(1000)))
+    await engine.start()
+    largest = 0
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and any(not runs[job_id] for job_id in due_ids):
+        largest = max(largest, len(engine.scheduler._heap))
+        await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await engine.scheduler._load()
+    load = time.perf_counter() - started
+    await engine.stop()
+    lateness = _check_runs(runs, due_ids)
+    assert len(runs) == len(due_ids), "a post ran before its time"
+    print(f"scale    {total + 1000} scheduled in {scheduled:.1f}s ({(total + 1000) / scheduled:.0f}/s), "
+          f"load {load * 1000:.0f} ms, largest heap {largest}, "
+          f"1000 due posts late by p50 {lateness[500] * 1000:.0f} ms, max {lateness[-1] * 1000:.0f} ms")
+
+
+async def burst():
+    runs = defaultdict(list)
+    engine = await Engine("bench_scheduler_burst", runs, dispatch_rate=500, dispatch_burst=50).start()
+    due = time.time() + 2
+    ids = await _schedule(engine.scheduler, [due] * 2000)
+    assert await _wait_for(runs, ids, 30)
+    await engine.stop()
+    _check_runs(runs, ids)
+    per_second = Counter(int(ran - due) for job_id in ids for ran, _ in runs[job_id])
+    spread = max(ran for job_id in ids for ran, _ in runs[job_id]) - due
+    print(f"burst    2000 posts due at once released over {spread:.1f}s, "
+          f"per second: {', '.join(str(per_second[second]) for second in sorted(per_second))}")
+
+
+async def restart():
+    runs = defaultdict(list)
+    collection = "bench_scheduler_restart"
+    engine = await Engine(collection, runs, dispatch_rate=100).start()
+    now = time.time()
+    ids = await _schedule(engine.scheduler, (now + 0.5 + index * 4 / 300 for index in range(300)))
+    await asyncio.sleep(2)
+    await engine.stop()
+    before = sum(1 for job_id in ids if runs[job_id])
+    await asyncio.sleep(3)
+    restarted = time.time()
+    engine = await Engine(collection, runs, dispatch_rate=100).start()
+    assert await _wait_for(runs, ids, 30)
+    await engine.stop()
+    _check_runs(runs, ids)
+    caught_up = max(ran for job_id in ids for ran, _ in runs[job_id]) - restarted
+    print(f"restart  {before} of 300 ran before the stop, the {300 - before} overdue ones "
+          f"{caught_up:.2f}s after the restart, each exactly once and none early")
+
+
+async def workers():
+    runs = defaultdict(list)
+    collection = "bench_scheduler_workers"
+    first = await Engine(collection, runs, dispatch_rate=250).start()
+    second = await Engine(collection, runs, dispatch_rate=250).start()
+    now = time.time()
+    ids = await _schedule(first.scheduler, (now + 1 + index / 500 for index in range(500)))
+    ids += await _schedule(second.scheduler, (now + 1 + index / 500 for index in range(500)))
+    assert await _wait_for(runs, ids, 30)
+    await first.stop()
+    await second.stop()
+    _check_runs(runs, ids)
+    print(f"workers  1000 posts, each run once; released {first.scheduler.released} "
+          f"by one worker and {second.scheduler.released} by the other")
+
+
+async def main(total):
+    await connect.start()
+    try:
+        await scale(total)
+        await burst()
+        await restart()
+        await workers()
+    finally:
+        await connect.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,80 @@
+"""Cost of returning a large video list from a route, FastAPI's default paths against the orjson fast path.
+
+Three routes return the same page, called in-process through the ASGI app:
+  response_model  returns a dict with a response model: validated, then serialized by FastAPI
+  plain_dict      returns a dict without a model: jsonable_encoder plus stdlib json
+  json_response   returns the trusted dict through shared_module.responses.json_response
+
+Usage: python -m benchmarks.bench_serialization [videos ...]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from schema.Video import VideoPage
+from shared_module.responses import json_response
+
+
+def _page(videos):
+    return {
+        "videos": [
+            {
+                "id": str(7000000000000000000 + index),
+                "title": f"Video {index}",
+                "video_description": f"Stub video number {index} #fyp #tiktok",
+                "duration": 15 + index % 45,
+                "cover_image_url": f"https://example.com/cover/{index}.jpg",
+                "create_time": 1700000000 - index * 3600,
+            }
+            for index in range(videos)
+        ],
+        "cursor": videos,
+        "has_more": True,
+    }
+
+
+def _app(page):
+    app = FastAPI()
+
+    @app.get("/response_model", response_model=VideoPage)
+    async def response_model():
+        return page
+
+    @app.get("/plain_dict", response_class=JSONResponse)
+    async def plain_dict():
+        return page
+
+    @app.get("/json_response", response_model=VideoPage)
+    async def fast():
+        return json_response(page)
+
+    return app
+
+
+async def _per_call_ms(client, path, budget=1.0):
+    calls, started = 0, time.perf_counter()
+    while time.perf_counter() - started < budget:
+        (await client.get(path)).raise_for_status()
+        calls += 1
+    return (time.perf_counter() - started) / calls * 1e3
+
+
+async def main(sizes):
+    routes = ("response_model", "plain_dict", "json_response")
+    print(f"{'videos':>8} " + " ".join(f"{route + ' ms':>17}" for route in routes) + f" {'speedup':>8}")
+    for size in sizes:
+        page = _page(size)
+        transport = httpx.ASGITransport(app=_app(page))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            bodies = [(await client.get(f"/{route}")).json() for route in routes]
+            assert all(body == page for body in bodies)
+            timings = [await _per_call_ms(client, f"/{route}") for route in routes]
+        print(f"{size:>8} " + " ".join(f"{ms:>17.3f}" for ms in timings) + f" {timings[0] / timings[-1]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(size) for size in sys.argv[1:]] or [20, 200, 2000, 20000]))
@@ -0,0 +1,93 @@
+"""Linked-account token lookup: full document scan vs indexed $elemMatch projection.
+
+Uses MONGODB_URI when reachable (in a throwaway ``tiktok_login_bench``
+database), otherwise the in-memory MockDB. The mock has no indexes, so
+only the bytes-returned column is meaningful without a real MongoDB.
+
+Usage: python -m benchmarks.bench_social_account_lookup [users] [accounts_per_user] [lookups]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import bson
+
+from shared_module.DB import DatabaseConnection, MockDB
+
+DATABASE_NAME = "tiktok_login_bench"
+
+
+def _user(index, accounts):
+    return {
+        "email": f"user{index}@example.com",
+        "social_account": [
+            {
+                "provider": "tiktok" if account % 2 == 0 else "youtube",
+                "provider_id": f"open_id_{index}_{account}",
+                "name": f"Account {account}",
+                "token": "act." + "x" * 120,
+                "avatar": f"https://example.com/avatar/{index}/{account}.jpg",
+            }
+            for account in range(accounts)
+        ],
+    }
+
+
+async def legacy_lookup(connection, email, provider, provider_id):
+    """What the service did before: fetch the whole user and scan in Python"""
+    check = await connection.adb["users"].find_one({"email": email})
+    if check and "social_account" in check:
+        for social_account in check["social_account"]:
+            if provider_id == social_account["provider_id"] and social_account["provider"] == provider:
+                return social_account, check
+    return None, check
+
+
+async def main(users, accounts, lookups):
+    connection = DatabaseConnection(DATABASE_NAME)
+    backend = "mongodb" if not isinstance(connection.db, MockDB) else "mock"
+    if backend == "mongodb":
+        connection.db["users"].drop()
+    for index in range(users):
+        connection.db["users"].insert_one(_user(index, accounts))
+    await connection.ensure_indexes()
+
+    rng = random.Random(7)
+    targets = [
+        (f"user{index}@example.com", f"open_id_{index}_{2 * rng.randrange(accounts // 2)}")
+        for index in (rng.randrange(users) for _ in range(lookups))
+    ]
+
+    started = time.perf_counter()
+    legacy_bytes = 0
+    for email, provider_id in targets:
+        found, document = await legacy_lookup(connection, email, "tiktok", provider_id)
+        assert found
+        legacy_bytes += len(bson.encode(document))
+    legacy_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed_bytes = 0
+    for email, provider_id in targets:
+        found = await connection.find_social_account(email, "tiktok", provider_id)
+        assert found and found["provider_id"] == provider_id
+        indexed_bytes += len(bson.encode({"social_account": [found]}))
+    indexed_elapsed = time.perf_counter() - started
+
+    print(f"backend={backend} users={users} accounts/user={accounts} lookups={lookups}")
+    for label, elapsed, size in (
+        ("full scan", legacy_elapsed, legacy_bytes),
+        ("$elemMatch", indexed_elapsed, indexed_bytes),
+    ):
+        print(
+            f"{label:<11} {lookups / elapsed:9.1f} lookups/s "
+            f"{elapsed / lookups * 1e6:8.1f}us/lookup {size / lookups / 1024:8.2f}KiB/lookup returned"
+        )
+    if backend == "mongodb":
+        connection.client.drop_database(DATABASE_NAME)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    asyncio.run(main(*(args + [200, 400, 2000][len(args):])))
@@ -0,0 +1,83 @@
+"""Cold-start cost: importing the app, and process start to first live and ready response.
+
+Each run starts a fresh ``python main.py`` and polls /health/live and
+/health/ready every 10 ms. The default MongoDB URI points at a closed local
+port, the case an unreachable database used to stall for pymongo's 30 s
+server selection timeout; the app then runs on the in-memory mock, so
+"ready" is when /health/ready reports startup finished.
+
+Usage: python -m benchmarks.bench_startup [runs] [mongodb_uri]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load import started
+from benchmarks.stubs import StubServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_seconds(env):
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, stderr=subprocess.DEVNULL, text=True
+    )
+    return float(output.strip().splitlines()[-1])
+
+
+def _wait_for(url, started_at, deadline, check=lambda url: httpx.get(url).status_code == 200):
+    while time.perf_counter() < deadline:
+        try:
+            if check(url):
+                return time.perf_counter() - started_at
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def _serve_seconds(env):
+    port = StubServer._free_port("127.0.0.1")
+    env = {**env, "HOST": "127.0.0.1", "PORT": str(port)}
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started_at + 60
+        live = _wait_for(f"http://127.0.0.1:{port}/health/live", started_at, deadline)
+        ready = _wait_for(f"http://127.0.0.1:{port}/health/ready", started_at, deadline, started)
+        return live, ready
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(runs, uri):
+    env = {**os.environ, "MONGODB_URI": uri, "SECRET_KEY": "bench", "LOG_LEVEL": "WARNING"}
+    imports, lives, readies = [], [], []
+    for _ in range(runs):
+        imports.append(_import_seconds(env))
+        live, ready = _serve_seconds(env)
+        lives.append(live)
+        readies.append(ready)
+
+    print(f"runs={runs} MONGODB_URI={uri}")
+    for label, samples in (("import main", imports), ("start -> live", lives), ("start -> ready", readies)):
+        if None in samples:
+            print(f"{label:<16} timed out")
+        else:
+            print(f"{label:<16} median {statistics.median(samples) * 1e3:8.1f} ms  max {max(samples) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        sys.argv[2] if len(sys.argv) > 2 else "mongodb://127.0.0.1:1/",
+    )
@@ -0,0 +1,130 @@
+"""Memory use of the multipart upload proxy with multi-GB synthetic videos.
+
+Starts the app the way production does, with TikTok and the upload
+endpoint replaced by local stubs, then streams a generated multipart body
+of each size to ``POST /api/tiktok/video/upload``. While a body is in
+flight the app's resident memory is sampled. Each run checks that the
+size and SHA-256 the app reports, and the bytes the upload stub received,
+match what the client sent, and that the publish job then completes.
+Peak memory should stay flat as the video grows, at about one chunk above
+the idle process. A body that ends before ``video_size`` must be rejected.
+
+Usage: python -m benchmarks.bench_upload_proxy [size_mib ...]
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import time
+
+import httpx
+
+from benchmarks.load import AppProcess, _memory_mb
+from benchmarks.stubs import StubProcess, StubServer, fetch_json, media_app, tiktok_app
+
+BOUNDARY = "benchproxyboundary"
+BLOCK = os.urandom(1024 * 1024)
+MEDIA_PORT = StubServer._free_port("127.0.0.1")
+
+
+def _multipart(fields, video_size, sent_size, digest):
+    """A multipart body streaming ``sent_size`` synthetic bytes after the form fields"""
+    head = "".join(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in {**fields, "video_size": video_size}.items()
+    )
+    head += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="video"; filename="video.mp4"\r\n'
+             f"Content-Type: video/mp4\r\n\r\n")
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+    async def body():
+        yield head.encode()
+        remaining = sent_size
+        while remaining:
+            block = BLOCK[:min(remaining, len(BLOCK))]
+            digest.update(block)
+            remaining -= len(block)
+            yield block
+        yield tail
+
+    return body(), len(head) + sent_size + len(tail)
+
+
+async def _sample_rss(pid, peaks):
+    while True:
+        peaks.append(_memory_mb(pid)[0])
+        await asyncio.sleep(0.05)
+
+
+async def _upload(client, app, video_size, sent_size=None):
+    digest = hashlib.sha256()
+    body, length = _multipart(
+        {"provider_id": "test_tiktok_id", "description": "Proxy benchmark"},
+        video_size, video_size if sent_size is None else sent_size, digest,
+    )
+    samples = []
+    sampler = asyncio.create_task(_sample_rss(app.process.pid, samples))
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{app.url}/api/tiktok/video/upload",
+            content=body,
+            headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", "Content-Length": str(length)},
+        )
+    finally:
+        sampler.cancel()
+    return response.json(), digest.hexdigest(), max(samples), time.perf_counter() - started
+
+
+async def _wait_for_job(client, app, job_id):
+    while True:
+        job = (await client.get(f"{app.url}/api/tiktok/video/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(0.1)
+
+
+async def main(sizes_mib):
+    media_url = f"http://127.0.0.1:{MEDIA_PORT}"
+    tiktok = StubProcess(tiktok_app, upload_url=f"{media_url}/upload/").start()
+    app = AppProcess(
+        TIKTOK_API_BASE_URL=tiktok.url,
+        LOG_LEVEL="WARNING",
+        TIKTOK_PUBLISH_STATUS_POLL_INTERVAL="0.2",
+    ).start()
+    try:
+        idle = _memory_mb(app.process.pid)[0]
+        print(f"app idle rss {idle:.1f} MiB")
+        print(f"{'video MiB':>9} {'chunks':>6} {'seconds':>8} {'MiB/s':>7} {'peak rss MiB':>12} {'above idle':>10}")
+        async with httpx.AsyncClient(timeout=600) as client:
+            for size_mib in sizes_mib:
+                video_size = int(size_mib * 1024 * 1024)
+                media = StubProcess(media_app, port=MEDIA_PORT, video_size=None).start()
+                try:
+                    result, sha256, peak, elapsed = await _upload(client, app, video_size)
+                    stats = fetch_json(f"{media_url}/upload/stats")
+                finally:
+                    media.stop()
+                assert result.get("job_id"), result
+                assert result["video_size"] == video_size and result["sha256"] == sha256, result
+                assert stats["bytes"] == video_size and stats["sha256"] == sha256, stats
+                job = await _wait_for_job(client, app, result["job_id"])
+                assert job["status"] == "completed" and job["publish_id"] == result["publish_id"], job
+                print(f"{size_mib:>9.0f} {stats['chunks']:>6} {elapsed:>8.2f} {size_mib / elapsed:>7.0f} "
+                      f"{peak:>12.1f} {peak - idle:>10.1f}")
+
+            media = StubProcess(media_app, port=MEDIA_PORT, video_size=None).start()
+            try:
+                short = 64 * 1024 * 1024
+                result, _, _, _ = await _upload(client, app, short, sent_size=short - 1)
+            finally:
+                media.stop()
+            assert "error" in result, result
+            print(f"body one byte short of video_size: {result['error']}")
+    finally:
+        app.stop()
+        tiktok.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main([float(size) for size in sys.argv[1:]] or [256, 1024, 4096]))
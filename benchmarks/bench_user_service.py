@@ -0,0 +1,76 @@
+"""create_oauth_user under bursty logins: one POST per login vs micro-batched bulk upserts.
+
+Each burst is ``burst`` logins arriving at once, a few of them the same
+account logging in twice. The stub serves at most 16 requests at a time, so
+one POST per login queues behind itself.
+
+Usage: python -m benchmarks.bench_user_service [bursts] [burst]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from benchmarks.stubs import StubProcess, fetch_json, user_service_app
+from shared_module.http_client import http_clients
+from src.oauth_service.user_service import UserServiceClient
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _payload(index):
+    # Every tenth login repeats the previous account, e.g. a double-clicked button
+    account = index - 1 if index % 10 == 9 else index
+    return {
+        "user": {"email": f"user{account}@example.com", "name": None},
+        "name": f"User {account}",
+        "provider_id": f"open_id_{account}",
+        "provider": "tiktok",
+        "token": f"act.{index}",
+        "avatar": "https://example.com/avatar.jpg",
+    }
+
+
+async def _run(client, bursts, burst):
+    samples, errors = [], 0
+
+    async def login(index):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            await client.create_oauth_user(_payload(index))
+        except Exception:
+            errors += 1
+        samples.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    tasks = []
+    for number in range(bursts):
+        tasks += [asyncio.create_task(login(number * burst + index)) for index in range(burst)]
+        await asyncio.sleep(0.25)
+    await asyncio.gather(*tasks)
+    return samples, errors, time.perf_counter() - started
+
+
+async def main(bursts, burst):
+    for label, window, bulk in (("single", 0, True), ("batched", 0.02, True), ("no-bulk", 0.02, False)):
+        with StubProcess(user_service_app, bulk=bulk) as server:
+            client = UserServiceClient(server.url, batch_window=window)
+            samples, errors, wall = await _run(client, bursts, burst)
+            await client.aclose()
+            stats = fetch_json(f"{server.url}/stats")
+        print(
+            f"{label:<8} logins={len(samples)} errors={errors} upstream_requests={stats['requests']:>4} "
+            f"upserts={stats['users']:>4} p50={_percentile(samples, 50):7.1f}ms "
+            f"p99={_percentile(samples, 99):7.1f}ms wall={wall:5.2f}s"
+        )
+    await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*(args + [5, 100][len(args):])))
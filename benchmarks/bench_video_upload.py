@@ -0,0 +1,72 @@
+"""Stream a large synthetic video through the chunked upload pipeline and report peak RSS.
+
+Usage: python -m benchmarks.bench_video_upload [size_mb] [chunk_mb] [parallelism] [ranges|stream]
+"""
+import asyncio
+import logging
+import resource
+import sys
+import time
+
+from benchmarks.stubs import StubProcess, fetch_json, media_app
+from shared_module.http_client import http_clients
+from src.oauth_service import video_upload
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _check_plans(chunk_size):
+    """Every plan must cover the video exactly, in at least one chunk, within TikTok's limits"""
+    for size in (1, video_upload.MIN_CHUNK_SIZE - 1, video_upload.MIN_CHUNK_SIZE, 7 * 1024 * 1024,
+                 chunk_size - 1, chunk_size, chunk_size + 1, 2 * chunk_size - 1, 1000 * chunk_size + 1):
+        plan = video_upload.plan_chunks(size, chunk_size)
+        ranges = list(plan.ranges())
+        assert len(ranges) == plan.total_chunk_count >= 1, (size, plan.source_info())
+        assert ranges[0][1] == 0 and ranges[-1][2] == size - 1, (size, ranges)
+        assert all(last - first + 1 == plan.chunk_size for _, first, last in ranges[:-1]), size
+        assert ranges[-1][2] - ranges[-1][1] + 1 <= video_upload.MAX_FINAL_CHUNK_SIZE, size
+
+
+async def main(size_mb, chunk_mb, parallelism, mode):
+    _check_plans(chunk_mb * 1024 * 1024)
+    video_size = size_mb * 1024 * 1024 + 12345  # uneven tail exercises the final-chunk rule
+    with StubProcess(media_app, video_size=video_size, ranges=(mode == "ranges")) as server:
+        baseline = _peak_rss_mb()
+        started = time.perf_counter()
+
+        size, accepts_ranges = await video_upload.probe_source(f"{server.url}/video.mp4")
+        plan = video_upload.plan_chunks(size, chunk_mb * 1024 * 1024)
+        await video_upload.upload_video(
+            f"{server.url}/video.mp4", f"{server.url}/upload/", plan, accepts_ranges, parallelism
+        )
+
+        elapsed = time.perf_counter() - started
+        stats = fetch_json(f"{server.url}/upload/stats")
+        await http_clients.aclose()
+
+    assert stats["bytes"] == video_size, stats
+    assert stats["chunks"] == plan.total_chunk_count, stats
+    print(
+        f"mode={mode} size={size / 2**20:.1f}MiB chunks={plan.total_chunk_count} "
+        f"chunk={plan.chunk_size / 2**20:.0f}MiB parallelism={parallelism} "
+        f"time={elapsed:.2f}s throughput={size / 2**20 / elapsed:.1f}MiB/s"
+    )
+    print(
+        f"peak RSS {_peak_rss_mb():.1f}MiB (baseline {baseline:.1f}MiB, "
+        f"growth {_peak_rss_mb() - baseline:.1f}MiB, "
+        f"chunk_size x parallelism = {plan.chunk_size * parallelism / 2**20:.0f}MiB)"
+    )
+
+
+if __name__ == "__main__":
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 512,
+        int(args[1]) if len(args) > 1 else 10,
+        int(args[2]) if len(args) > 2 else 2,
+        args[3] if len(args) > 3 else "ranges",
+    ))
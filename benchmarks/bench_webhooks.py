@@ -0,0 +1,192 @@
+"""TikTok webhook ingestion: deliveries per second and posts settled without polling.
+
+  capacity  Calls the ASGI app in this process with signed deliveries, one
+            after another, through every middleware and the real route.
+            With no sockets or client in the way, this is the rate one
+            worker can acknowledge. Then reports how long the inbox takes to
+            apply what it accepted.
+  publish   Starts the app with TIKTOK_WEBHOOK_ENABLED against stubs whose
+            status API never reports a final status. Links N accounts, queues
+            a post on each and waits until every one is uploaded and waiting
+            for TikTok. Forged copies
+            of the posts' events must all be refused and settle nothing. Then
+            it fires a burst at /webhooks/tiktok over HTTP: one event per
+            post, a share of them failures, plus thousands for unknown posts,
+            a fifth of them sent twice. Every post must end as its event says,
+            each event must be applied once, and the status API must never be
+            called. Client and app share this machine, so the HTTP rate is a
+            lower bound.
+
+Usage: python -m benchmarks.bench_webhooks [posts] [events]
+"""
+import asyncio
+import os
+import sys
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+os.environ.setdefault("TIKTOK_CLIENT_SECRET", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+from benchmarks import replay_webhooks  # noqa: E402
+from benchmarks.load import AppProcess, _link_accounts  # noqa: E402
+from benchmarks.stubs import StubProcess, fetch_json, media_app, tiktok_app, user_service_app  # noqa: E402
+
+SECRET = os.environ["TIKTOK_CLIENT_SECRET"]
+FINAL = ("completed", "failed")
+
+
+async def _asgi_post(app, path, body, headers):
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }, receive, send)
+    return sent[0]["status"]
+
+
+async def capacity(events):
+    import main
+    from shared_module.DB import connect
+    from shared_module.webhooks import webhook_inbox
+
+    await connect.start()
+    try:
+        bodies, _ = replay_webhooks.build_burst([], events, duplicates=0.2)
+        headers = [{"content-type": "application/json", "tiktok-signature": replay_webhooks.sign(SECRET, body)}
+                   for body in bodies]
+        started = time.perf_counter()
+        statuses = [await _asgi_post(main.app, "/webhooks/tiktok", body, header)
+                    for body, header in zip(bodies, headers)]
+        elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        await webhook_inbox.stop()
+        drained = time.perf_counter() - started
+    finally:
+        await connect.stop()
+    assert statuses.count(200) == len(bodies), set(statuses)
+    print(f"capacity {len(bodies)} deliveries acknowledged in process at {len(bodies) / elapsed:.0f}/s "
+          f"({elapsed / len(bodies) * 1e6:.0f} us each), inbox drained {drained * 1000:.0f} ms later")
+
+
+async def _create_posts(client, app, video_url, accounts):
+    # One post per account: TikTok allows each account only a few publish.init calls a minute
+    async def create(provider_id):
+        response = await client.post(f"{app.url}/api/tiktok/video/create", json={
+            "provider_id": provider_id,
+            "content": {"video_url": video_url, "description": "Webhook post"},
+        })
+        return response.json()["job_id"]
+
+    return await asyncio.gather(*(create(provider_id) for provider_id in accounts))
+
+
+async def _jobs(client, app, job_ids):
+    return await asyncio.gather(*(
+        client.get(f"{app.url}/api/tiktok/video/jobs/{job_id}") for job_id in job_ids
+    ))
+
+
+async def _wait(client, app, job_ids, done, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [response.json() for response in await _jobs(client, app, job_ids)]
+        if all(done(job) for job in jobs):
+            return jobs
+        await asyncio.sleep(0.1)
+    raise TimeoutError("jobs did not get there in time")
+
+
+def _metric(text, outcome):
+    prefix = f'webhook_events_total{{source="tiktok",outcome="{outcome}"}} '
+    return next((int(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix)), 0)
+
+
+async def publish(posts, events):
+    media = StubProcess(media_app, video_size=1024 * 1024).start()
+    tiktok = StubProcess(tiktok_app, upload_url=f"{media.url}/upload/", publish_status="PROCESSING_UPLOAD").start()
+    users = StubProcess(user_service_app).start()
+    app = AppProcess(
+        TIKTOK_API_BASE_URL=tiktok.url,
+        USER_SERVICE_URL=users.url,
+        TIKTOK_CLIENT_ID="bench",
+        SECRET_KEY="bench",
+        TIKTOK_WEBHOOK_ENABLED="true",
+        TIKTOK_PUBLISH_STATUS_POLL_INTERVAL="1",
+        TIKTOK_PUBLISH_STATUS_FALLBACK_INTERVAL="600",
+        PUBLISH_WORKER_CONCURRENCY=str(posts),
+    ).start()
+    try:
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        async with httpx.AsyncClient(timeout=60, cookies=no_cookies) as client:
+            accounts = await _link_accounts(client, app.url, tiktok.url, posts)
+            job_ids = await _create_posts(client, app, f"{media.url}/video.mp4", accounts)
+            jobs = await _wait(client, app, job_ids, lambda job: job["stage"] == "uploaded")
+            publish_ids = {job["publish_id"]: job["job_id"] for job in jobs}
+
+            bodies, expected = replay_webhooks.build_burst(
+                list(publish_ids), events, fail_rate=0.1, duplicates=0.2, seed=1
+            )
+            forged = [replay_webhooks.event_body("post.publish.complete", publish_id) for publish_id in publish_ids]
+            refused, _, _ = await replay_webhooks.fire(
+                f"{app.url}/webhooks/tiktok", SECRET, forged, concurrency=32, bad_signatures=1.0
+            )
+            await asyncio.sleep(0.5)
+            jobs = [response.json() for response in await _jobs(client, app, job_ids)]
+            assert refused == {401: posts} and not any(job["status"] in FINAL for job in jobs), refused
+
+            started = time.perf_counter()
+            statuses, latencies, elapsed = await replay_webhooks.fire(
+                f"{app.url}/webhooks/tiktok", SECRET, bodies, concurrency=32
+            )
+            jobs = await _wait(client, app, job_ids, lambda job: job["status"] in FINAL)
+            settled = time.perf_counter() - started
+            text = (await client.get(f"{app.url}/metrics")).text
+        stats = fetch_json(f"{tiktok.url}/v2/post/publish/stats")
+    finally:
+        app.stop()
+        for stub in (users, tiktok, media):
+            stub.stop()
+
+    for job in jobs:
+        failed = expected[job["publish_id"]] == "post.publish.failed"
+        assert job["status"] == ("failed" if failed else "completed"), job
+        assert job["publish_status"] == ("FAILED" if failed else "PUBLISH_COMPLETE"), job
+        if failed:
+            assert replay_webhooks.FAIL_REASON in job["error"], job
+    accepted, applied = _metric(text, "accepted"), _metric(text, "applied")
+    coalesced, duplicate = _metric(text, "coalesced"), _metric(text, "duplicate")
+    duplicates = coalesced + duplicate
+    assert statuses == {200: len(bodies)}, statuses
+    assert accepted + coalesced == len(bodies) and applied + duplicate == accepted, text
+    assert applied == len(set(bodies)), (applied, len(set(bodies)))
+    assert stats["status_calls"] == 0, stats
+    print(f"publish  {posts} posts waiting, {posts} forged events refused; "
+          f"{replay_webhooks.report(statuses, latencies, elapsed)}")
+    print(f"         {applied} events applied, {duplicates} duplicates dropped; every post settled "
+          f"{(settled - elapsed) * 1000:.0f} ms after the last delivery "
+          f"({sum(job['status'] == 'failed' for job in jobs)} failed as sent), status API calls: {stats['status_calls']}")
+
+
+async def main(posts, events):
+    await capacity(events)
+    await publish(posts, events)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+    ))
@@ -0,0 +1,301 @@
+"""Scenario load tests of the whole service against local TikTok, user-service and media stubs.
+
+The app runs in its own process with TIKTOK_API_BASE_URL and USER_SERVICE_URL
+pointed at the stubs, so every request goes through the real middleware,
+OAuth client, caches, job queue and upload path. For each scenario the
+driver reports throughput, latency percentiles and the app process's memory.
+Results can be saved as JSON and compared with an earlier run.
+
+Scenarios:
+  login     GET /auth/tiktok/login then the callback, as one login flow
+  accounts  GET /api/tiktok/accounts
+  videos    GET /api/tiktok/videos/{provider_id}, first few pages
+  publish   POST /api/tiktok/video/create, then poll the job until it ends
+
+Usage:
+  python -m benchmarks.load [scenario ...] [--requests N] [--concurrency C]
+      [--latency SECONDS] [--error-rate RATE] [--workers N]
+      [--json results.json] [--compare baseline.json]
+
+Set MONGODB_URI to a test database; without MongoDB the app uses its in-memory mock.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from benchmarks.stubs import StubProcess, media_app, tiktok_app, user_service_app
+
+SCENARIOS = ("login", "accounts", "videos", "publish")
+VIDEO_SIZE = 6 * 1024 * 1024
+
+
+def _process_tree(pid):
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as children:
+                pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _memory_mb(pid):
+    """Current and peak resident memory of ``pid`` and its workers in MiB (Linux only)"""
+    rss = peak = 0.0
+    for process in _process_tree(pid):
+        try:
+            with open(f"/proc/{process}/status") as status:
+                for line in status:
+                    key, _, value = line.partition(":")
+                    if key == "VmRSS":
+                        rss += int(value.split()[0]) / 1024
+                    elif key == "VmHWM":
+                        peak += int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return rss, peak
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(math.ceil(pct / 100 * len(ordered))) - 1)]
+
+
+def _cookie_header(response):
+    return "; ".join(f"{name}={value}" for name, value in response.cookies.items())
+
+
+async def login(client, base_url, index, context):
+    response = await client.get(f"{base_url}/auth/tiktok/login", follow_redirects=False)
+    state = parse_qs(urlparse(response.headers["location"]).query)["state"][0]
+    callback = await client.get(
+        f"{base_url}/auth/tiktok/callback",
+        params={"code": f"code-{index}", "state": state},
+        headers={"Cookie": _cookie_header(response)},
+        follow_redirects=False,
+    )
+    return callback.status_code == 302
+
+
+async def accounts(client, base_url, index, context):
+    response = await client.get(f"{base_url}/api/tiktok/accounts")
+    return response.status_code == 200 and isinstance(response.json(), list)
+
+
+async def videos(client, base_url, index, context):
+    params = {"max_count": 20}
+    if index % 3:
+        params["cursor"] = 20 * (index % 3)
+    response = await client.get(f"{base_url}/api/tiktok/videos/test_tiktok_id", params=params)
+    return response.status_code == 200 and "videos" in response.json()
+
+
+async def publish(client, base_url, index, context):
+    accounts = context["accounts"]
+    response = await client.post(f"{base_url}/api/tiktok/video/create", json={
+        "provider_id": accounts[index % len(accounts)],
+        "content": {"video_url": context["video_url"], "description": f"Load test {index}"},
+    })
+    job_id = response.json().get("job_id")
+    if not job_id:
+        return False
+    while True:
+        await asyncio.sleep(0.1)
+        job = (await client.get(f"{base_url}/api/tiktok/video/jobs/{job_id}")).json()
+        if job.get("status") in ("completed", "failed"):
+            return job["status"] == "completed"
+
+
+async def _run(scenario, client, base_url, total, concurrency, context):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, errors = [], 0
+
+    async def one(index):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await scenario(client, base_url, index, context)
+            except Exception:
+                ok = False
+            samples.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    return samples, errors, time.perf_counter() - started
+
+
+def started(ready_url):
+    """Whether the app finished starting; on the in-memory mock it never reports ready"""
+    response = httpx.get(ready_url)
+    return response.status_code == 200 or response.json()["checks"]["startup"]
+
+
+class AppProcess:
+    """The service started the way production starts it, ``python main.py``"""
+
+    def __init__(self, workers=1, **env):
+        self.port = StubProcess._free_port("127.0.0.1")
+        self.env = {**os.environ, "HOST": "127.0.0.1", "PORT": str(self.port),
+                    "WEB_CONCURRENCY": str(workers), **env}
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=root, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if started(f"{self.url}/health/ready"):
+                    return self
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise RuntimeError("App did not start")
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _link_accounts(client, base_url, tiktok_url, count):
+    """Log in ``count`` times; each stub token links a new account, returned by provider_id"""
+    first = httpx.get(f"{tiktok_url}/v2/oauth/token/stats").json()["tokens"] + 1
+    await _run(login, client, base_url, count, 20, {})
+    last = httpx.get(f"{tiktok_url}/v2/oauth/token/stats").json()["tokens"]
+    return [f"stub_open_id_{number}" for number in range(first, last + 1)]
+
+
+def _print_results(results, baseline=None):
+    print(f"{'scenario':<10} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'rss MiB':>8} {'peak MiB':>8}")
+    for name, result in results.items():
+        line = (f"{name:<10} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                f"{result['rss_mb']:>8.1f} {result['peak_rss_mb']:>8.1f}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            changes = [
+                f"{key.split('_')[0]} {100 * (result[key] - previous[key]) / previous[key]:+.0f}%"
+                for key in ("rps", "p99_ms", "peak_rss_mb") if previous.get(key)
+            ]
+            line += "   vs baseline: " + ", ".join(changes)
+        print(line)
+
+
+async def main(args):
+    media = StubProcess(media_app, video_size=VIDEO_SIZE).start()
+    tiktok = StubProcess(
+        tiktok_app, latency=args.latency, error_rate=args.error_rate, seed=1,
+        upload_url=f"{media.url}/upload/",
+    ).start()
+    users = StubProcess(user_service_app, latency=args.latency).start()
+    app = AppProcess(
+        workers=args.workers,
+        TIKTOK_API_BASE_URL=tiktok.url,
+        USER_SERVICE_URL=users.url,
+        TIKTOK_CLIENT_ID="load-test",
+        TIKTOK_CLIENT_SECRET="load-test",
+        SECRET_KEY="load-test",
+        LOG_LEVEL="WARNING",
+        TIKTOK_PUBLISH_STATUS_POLL_INTERVAL="0.2",
+        # Several workers only agree on logins and jobs through MongoDB
+        **({"STATE_BACKEND": "mongo"} if args.workers > 1 else {}),
+    ).start()
+    results = {}
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        # Concurrent logins each carry their own session cookie, so the shared client must not keep any
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        async with httpx.AsyncClient(limits=limits, timeout=120, cookies=no_cookies) as client:
+            for name in args.scenarios:
+                total = args.requests if name != "publish" else min(args.requests, 50)
+                context = {}
+                if name == "publish":
+                    # TikTok allows 6 publish inits per minute per token; spread jobs over accounts
+                    context["accounts"] = await _link_accounts(
+                        client, app.url, tiktok.url, max(1, math.ceil(total / 5))
+                    )
+                    context["video_url"] = f"{media.url}/video.mp4"
+                samples, errors, wall = await _run(
+                    globals()[name], client, app.url, total, args.concurrency, context
+                )
+                rss, peak = _memory_mb(app.process.pid)
+                results[name] = {
+                    "requests": total,
+                    "errors": errors,
+                    "rps": round(total / wall, 2),
+                    "p50_ms": round(_percentile(samples, 50), 2),
+                    "p95_ms": round(_percentile(samples, 95), 2),
+                    "p99_ms": round(_percentile(samples, 99), 2),
+                    "rss_mb": round(rss, 1),
+                    "peak_rss_mb": round(peak, 1),
+                }
+    finally:
+        app.stop()
+        for stub in (users, tiktok, media):
+            stub.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = json.load(previous)["results"]
+    _print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({
+                "commit": _git_commit(),
+                "settings": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+                "results": results,
+            }, output, indent=2)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Load test the service against local stubs")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help=f"any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per call in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of TikTok calls failing with 503")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="show changes against a results file from an earlier run")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    return args
+
+
+if __name__ == "__main__":
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(main(_parse_args(sys.argv[1:])))
@@ -0,0 +1,146 @@
+"""Fire bursts of signed synthetic TikTok webhook events at a running service.
+
+Builds ``post.publish.*`` events shaped like TikTok's, signs each one with
+the app's client secret, and POSTs them to ``/webhooks/tiktok`` over many
+connections at once. A share of the events can be sent twice, as TikTok
+does when it retries a delivery, or sent with a wrong signature. Reports
+how many deliveries were acknowledged, at what rate, and the latency of
+each acknowledgement.
+
+Usage:
+  python -m benchmarks.replay_webhooks [--url URL] [--secret SECRET] [--events N]
+      [--publish-id ID ...] [--event NAME] [--fail-rate RATE] [--duplicates RATE]
+      [--bad-signatures RATE] [--concurrency C] [--rate PER_SECOND] [--seed N]
+
+Every --publish-id gets one event. The remaining events name synthetic posts
+that match no job. The secret defaults to TIKTOK_CLIENT_SECRET.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.load import _percentile
+
+FAIL_REASON = "file_format_check_failed"
+
+
+def event_body(event, publish_id, user_openid="replay_open_id", reason=None, create_time=None):
+    """A webhook body as TikTok sends it, with the details as a JSON string in ``content``"""
+    content = {"publish_id": publish_id, "publish_type": "DIRECT_PUBLISH"}
+    if reason:
+        content["reason"] = reason
+    return json.dumps({
+        "client_key": "replay",
+        "event": event,
+        "create_time": create_time or int(time.time()),
+        "user_openid": user_openid,
+        "content": json.dumps(content),
+    }).encode()
+
+
+def sign(secret, body, timestamp=None):
+    """The ``TikTok-Signature`` header for ``body``"""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},s={signature}"
+
+
+def build_burst(publish_ids, events, event="post.publish.complete", fail_rate=0.0, duplicates=0.0, seed=0):
+    """Return the bodies to send, shuffled, and the event each of ``publish_ids`` gets"""
+    rng = random.Random(seed)
+    targets = list(publish_ids) + [f"replay_publish_id_{index}" for index in range(events - len(publish_ids))]
+    expected = {}
+    bodies = []
+    for publish_id in targets:
+        name = "post.publish.failed" if rng.random() < fail_rate else event
+        bodies.append(event_body(name, publish_id, reason=FAIL_REASON if name == "post.publish.failed" else None))
+        expected[publish_id] = name
+    bodies += rng.sample(bodies, int(len(bodies) * duplicates))
+    rng.shuffle(bodies)
+    return bodies, {publish_id: expected[publish_id] for publish_id in publish_ids}
+
+
+async def fire(url, secret, bodies, concurrency=64, rate=0.0, bad_signatures=0.0, seed=0):
+    """POST every body, signed when it is sent; returns status counts, latencies and elapsed seconds"""
+    rng = random.Random(seed)
+    statuses = Counter()
+    latencies = []
+    items = iter(enumerate(bodies))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        started = time.perf_counter()
+
+        async def worker():
+            for index, body in items:
+                if rate:
+                    # Hold each event until its slot, so a set rate stays even across workers
+                    delay = started + index / rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                signature = sign("not-the-secret" if rng.random() < bad_signatures else secret, body)
+                sent = time.perf_counter()
+                try:
+                    response = await client.post(
+                        url, content=body,
+                        headers={"Content-Type": "application/json", "TikTok-Signature": signature},
+                    )
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - sent)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return statuses, latencies, elapsed
+
+
+def report(statuses, latencies, elapsed):
+    sent = sum(statuses.values())
+    return (f"{sent} deliveries in {elapsed:.2f}s ({sent / elapsed:.0f}/s), "
+            f"status {dict(sorted(statuses.items(), key=str))}, ack latency "
+            f"p50 {_percentile(latencies, 50) * 1000:.1f} ms, p95 {_percentile(latencies, 95) * 1000:.1f} ms, "
+            f"p99 {_percentile(latencies, 99) * 1000:.1f} ms")
+
+
+async def main(args):
+    bodies, _ = build_burst(
+        args.publish_id, max(args.events, len(args.publish_id)), args.event, args.fail_rate, args.duplicates,
+        args.seed,
+    )
+    statuses, latencies, elapsed = await fire(
+        args.url, args.secret, bodies, args.concurrency, args.rate, args.bad_signatures, args.seed,
+    )
+    print(report(statuses, latencies, elapsed))
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Send signed synthetic TikTok webhook events")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/webhooks/tiktok")
+    parser.add_argument("--secret", default=os.getenv("TIKTOK_CLIENT_SECRET"))
+    parser.add_argument("--events", type=int, default=1000, help="distinct events, before duplicates")
+    parser.add_argument("--publish-id", action="append", default=[], help="a real post to settle; repeatable")
+    parser.add_argument("--event", default="post.publish.complete")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of post.publish.failed events")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="share of events delivered twice")
+    parser.add_argument("--bad-signatures", type=float, default=0.0, help="share signed with a wrong secret")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rate", type=float, default=0.0, help="deliveries per second; 0 sends as fast as possible")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not args.secret:
+        parser.error("set --secret or TIKTOK_CLIENT_SECRET")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(_parse_args(sys.argv[1:])))
@@ -0,0 +1,402 @@
+"""Local stand-ins for the upstream services used by the benchmarks"""
+import asyncio
+import hashlib
+import multiprocessing
+import random
+import re
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+class StubServer:
+    """Run an ASGI app with uvicorn on a free local port in a background thread"""
+
+    def __init__(self, app, host="127.0.0.1", port=None):
+        self.app = app
+        self.host = host
+        self.port = port or self._free_port(host)
+        self._server = None
+        self._thread = None
+
+    @staticmethod
+    def _free_port(host):
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            threading.Event().wait(0.01)
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve(factory, kwargs, host, port):
+    uvicorn.run(factory(**kwargs), host=host, port=port, log_level="warning")
+
+
+class StubProcess(StubServer):
+    """Like StubServer, but in a child process so it does not share memory or the GIL"""
+
+    def __init__(self, factory, host="127.0.0.1", port=None, **kwargs):
+        super().__init__(None, host, port)
+        self.factory = factory
+        self.kwargs = kwargs
+        self._process = None
+
+    def start(self):
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.factory, self.kwargs, self.host, self.port), daemon=True
+        )
+        self._process.start()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.1):
+                    return self
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("Stub server did not start")
+
+    def stop(self):
+        if self._process:
+            self._process.terminate()
+            self._process.join(timeout=5)
+
+
+class FaultInjector:
+    """ASGI middleware that fails a share of requests like a throttled or flaky upstream.
+
+    ``error_rate`` of requests get ``error_status`` (429 responses carry
+    ``Retry-After`` when ``retry_after`` is set); ``GET /__faults__`` reports counts.
+    """
+
+    def __init__(self, app, error_rate=0.0, error_status=503, retry_after=None, seed=None):
+        self.app = app
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counts = {"requests": 0, "injected": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope["path"] == "/__faults__":
+            return await JSONResponse(self.counts)(scope, receive, send)
+        self.counts["requests"] += 1
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.counts["injected"] += 1
+            headers = {}
+            if self.retry_after is not None and self.error_status == 429:
+                headers["Retry-After"] = str(self.retry_after)
+            response = JSONResponse(
+                {"error": {"code": "injected_fault", "message": "Injected by stub"}},
+                status_code=self.error_status,
+                headers=headers,
+            )
+            return await response(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+
+class ConnectionDropper:
+    """ASGI middleware that drops the connection halfway through chosen requests.
+
+    The ``n``-th ``method`` request to ``path`` (counting from 1) is cut off for
+    every ``n`` in ``drop``: half of its body is read, then the server starts a
+    response and aborts, so the client sees the peer close the connection.
+    """
+
+    def __init__(self, app, path, method="PUT", drop=()):
+        self.app = app
+        self.path = path
+        self.method = method
+        self.drop = set(drop)
+        self.seen = 0
+        self.dropped = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path or scope["method"] != self.method:
+            return await self.app(scope, receive, send)
+        self.seen += 1
+        if self.seen not in self.drop:
+            return await self.app(scope, receive, send)
+        length = int(dict(scope["headers"]).get(b"content-length", b"0"))
+        received = 0
+        while received < length // 2:
+            message = await receive()
+            received += len(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        self.dropped += 1
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"1")]})
+        raise ConnectionAbortedError("Connection dropped by stub")
+
+
+def tiktok_app(latency=0.0, videos=45, error_rate=0.0, error_status=503, retry_after=None, seed=None,
+               upload_url=None, publish_status="PUBLISH_COMPLETE"):
+    """Minimal TikTok Open API stub: token, user info, video list, publish init and status.
+
+    Every status fetch answers ``publish_status``; ``GET /v2/post/publish/stats``
+    counts init and status calls and ``GET /v2/video/stats`` video list calls.
+    """
+
+    async def user_info(request):
+        await asyncio.sleep(latency)
+        # Each issued token belongs to its own account, so every login links a new one
+        token = request.headers.get("Authorization", "").rpartition(".")[2]
+        open_id = f"stub_open_id_{token}" if token.isdigit() else "stub_open_id"
+        return JSONResponse({
+            "data": {"user": {
+                "open_id": open_id,
+                "union_id": "stub_union_id",
+                "display_name": "Stub User",
+                "avatar_url": "https://example.com/avatar.jpg",
+            }},
+            "error": {"code": "ok", "message": ""},
+        })
+
+    listed = {"video_list_calls": 0}
+
+    async def video_list(request):
+        listed["video_list_calls"] += 1
+        await asyncio.sleep(latency)
+        body = await request.json() if request.method == "POST" else {}
+        cursor = int(body.get("cursor") or 0)
+        max_count = int(body.get("max_count") or 20)
+        page = [
+            {
+                "id": str(7000000000000000000 + index),
+                "title": f"Video {index}",
+                "video_description": f"Stub video number {index}",
+                "duration": 15 + index % 45,
+                "cover_image_url": f"https://example.com/cover/{index}.jpg",
+                "create_time": 1700000000 - index * 3600,
+            }
+            for index in range(cursor, min(cursor + max_count, videos))
+        ]
+        next_cursor = cursor + len(page)
+        return JSONResponse({
+            "data": {"videos": page, "cursor": next_cursor, "has_more": next_cursor < videos},
+            "error": {"code": "ok", "message": ""},
+        })
+
+    publishes = {"inits": 0, "status_calls": 0}
+
+    async def publish_init(request):
+        await asyncio.sleep(latency)
+        publishes["inits"] += 1
+        return JSONResponse({
+            "data": {
+                "publish_id": f"stub_publish_id_{publishes['inits']}",
+                "upload_url": upload_url or f"{request.base_url}upload/",
+            },
+            "error": {"code": "ok", "message": ""},
+        })
+
+    async def fetch_publish_status(request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        publishes["status_calls"] += 1
+        return JSONResponse({
+            "data": {"status": publish_status, "publish_id": body.get("publish_id")},
+            "error": {"code": "ok", "message": ""},
+        })
+
+    issued = {"tokens": 0}
+
+    async def oauth_token(request):
+        await asyncio.sleep(latency)
+        form = await request.form()
+        if form.get("grant_type") == "refresh_token" and form.get("refresh_token") == "revoked":
+            return JSONResponse(
+                {"error": "invalid_grant", "error_description": "Refresh token is invalid"},
+                status_code=400,
+            )
+        issued["tokens"] += 1
+        return JSONResponse({
+            "access_token": f"act.stub.{issued['tokens']}",
+            "refresh_token": f"rft.stub.{issued['tokens']}",
+            "expires_in": 86400,
+            "refresh_expires_in": 31536000,
+            "open_id": f"stub_open_id_{issued['tokens']}",
+            "scope": "user.info.basic,video.publish,video.upload",
+            "token_type": "Bearer",
+        })
+
+    async def oauth_token_stats(request):
+        return JSONResponse(issued)
+
+    async def publish_stats(request):
+        return JSONResponse(publishes)
+
+    async def video_stats(request):
+        return JSONResponse(listed)
+
+    app = Starlette(routes=[
+        Route("/v2/oauth/token/", oauth_token, methods=["POST"]),
+        Route("/v2/oauth/token/stats", oauth_token_stats, methods=["GET"]),
+        Route("/v2/user/info/", user_info, methods=["GET"]),
+        Route("/v2/video/list/", video_list, methods=["GET", "POST"]),
+        Route("/v2/video/stats", video_stats, methods=["GET"]),
+        Route("/v2/post/publish/video/init/", publish_init, methods=["POST"]),
+        Route("/v2/post/publish/status/fetch/", fetch_publish_status, methods=["POST"]),
+        Route("/v2/post/publish/stats", publish_stats, methods=["GET"]),
+    ])
+    return FaultInjector(app, error_rate, error_status, retry_after, seed)
+
+
+def user_service_app(latency=0.02, per_user=0.001, workers=16, bulk=True):
+    """User service stub with single and bulk ``create_oauth_user`` upserts.
+
+    Every request costs ``latency`` plus ``per_user`` per upserted account
+    and at most ``workers`` requests are served at once, like a small
+    service in front of a database. ``GET /stats`` reports request counts.
+    """
+    stats = {"requests": 0, "bulk_requests": 0, "users": 0}
+    users = {}
+    semaphore = None
+
+    async def upsert(payloads):
+        nonlocal semaphore
+        semaphore = semaphore or asyncio.Semaphore(workers)
+        async with semaphore:
+            await asyncio.sleep(latency + per_user * len(payloads))
+        results = []
+        for payload in payloads:
+            key = (payload["user"]["email"], payload["provider"], payload["provider_id"])
+            created = key not in users
+            users[key] = payload
+            stats["users"] += 1
+            results.append({"email": payload["user"]["email"], "created": created})
+        return results
+
+    async def create_oauth_user(request):
+        stats["requests"] += 1
+        return JSONResponse((await upsert([await request.json()]))[0])
+
+    async def create_oauth_users(request):
+        stats["requests"] += 1
+        stats["bulk_requests"] += 1
+        body = await request.json()
+        return JSONResponse({"results": await upsert(body["users"])})
+
+    async def user_stats(request):
+        return JSONResponse({**stats, "accounts": len(users)})
+
+    routes = [
+        Route("/api/user/create_oauth_user", create_oauth_user, methods=["POST"]),
+        Route("/stats", user_stats, methods=["GET"]),
+    ]
+    if bulk:
+        routes.append(Route("/api/user/create_oauth_users", create_oauth_users, methods=["POST"]))
+    return Starlette(routes=routes)
+
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)?")
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+_BLOCK = bytes(range(256)) * 256
+
+
+def _synthetic_bytes(first, last):
+    """Deterministic video bytes for ``[first, last]`` generated in 64 KiB blocks"""
+    position = first
+    while position <= last:
+        offset = position % len(_BLOCK)
+        size = min(len(_BLOCK) - offset, last - position + 1)
+        yield _BLOCK[offset:offset + size]
+        position += size
+
+
+def media_app(video_size, ranges=True, drop_puts=()):
+    """Source video server plus a TikTok-style chunk upload endpoint.
+
+    ``GET /video.mp4`` serves ``video_size`` synthetic bytes (honouring Range
+    headers when ``ranges`` is true). ``PUT /upload/`` checks Content-Range,
+    against ``video_size`` unless it is None, and streams the body without
+    buffering; ``GET /upload/stats`` reports source reads, upload totals and
+    the SHA-256 of the bytes in the order they arrived. The PUTs numbered in ``drop_puts`` lose
+    their connection mid-body.
+    """
+    stats = {"chunks": 0, "bytes": 0, "ranges": [], "source_requests": 0, "source_bytes": 0}
+    digest = hashlib.sha256()
+
+    async def video(request):
+        match = _RANGE_RE.match(request.headers.get("Range", "")) if ranges else None
+        stats["source_requests"] += 1
+        if not match:
+            stats["source_bytes"] += video_size
+            return StreamingResponse(
+                _synthetic_bytes(0, video_size - 1),
+                media_type="video/mp4",
+                headers={"Content-Length": str(video_size)},
+            )
+        first = int(match.group(1))
+        last = min(int(match.group(2) or video_size - 1), video_size - 1)
+        stats["source_bytes"] += last - first + 1
+        return StreamingResponse(
+            _synthetic_bytes(first, last),
+            status_code=206,
+            media_type="video/mp4",
+            headers={
+                "Content-Length": str(last - first + 1),
+                "Content-Range": f"bytes {first}-{last}/{video_size}",
+                "Accept-Ranges": "bytes",
+            },
+        )
+
+    async def upload(request):
+        match = _CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+        if not match:
+            return Response(status_code=400)
+        first, last, total = (int(value) for value in match.groups())
+        received = 0
+        async for block in request.stream():
+            received += len(block)
+            digest.update(block)
+        if received != last - first + 1 or total != (video_size or total):
+            return Response(status_code=416)
+        stats["chunks"] += 1
+        stats["bytes"] += received
+        stats["ranges"].append([first, last])
+        return Response(status_code=201 if last + 1 == total else 206)
+
+    async def upload_stats(request):
+        return JSONResponse({**stats, "sha256": digest.hexdigest(), "dropped": dropper.dropped})
+
+    dropper = ConnectionDropper(Starlette(routes=[
+        Route("/video.mp4", video, methods=["GET"]),
+        Route("/upload/", upload, methods=["PUT"]),
+        Route("/upload/stats", upload_stats, methods=["GET"]),
+    ]), "/upload/", drop=drop_puts)
+    return dropper
+
+
+def fetch_json(url):
+    """Synchronous helper for reading stub statistics"""
+    return httpx.get(url).json()
@@ -1,38 +1,85 @@
 from fastapi import FastAPI, Request, Depends
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 from authlib.integrations.starlette_client import OAuth
 from starlette.middleware.sessions import SessionMiddleware
+from contextlib import asynccontextmanager
 import os
-from typing import Optional
+from typing import List, Optional, Union
+
+# Load environment variables before importing modules that read them
+from dotenv import load_dotenv
+load_dotenv()
 
 import oauth_controller
+from schema.Account import Account
+from schema.Error import ErrorResponse
+from schema.Video import VideoPage
+from schema.VideoJob import VideoBatch, VideoJob, VideoJobCreated, VideoUploaded
+from shared_module.DB import connect
+from shared_module.http_client import http_clients
+from shared_module.job_queue import publish_jobs, user_service_outbox
+from shared_module.metrics import metrics, MetricsMiddleware
+from shared_module.responses import ORJSONResponse, conditional_response, json_response
+from shared_module.scheduler import publish_scheduler
+from shared_module.log import logging_config
+from shared_module.state import state_backend
+from shared_module.webhooks import webhook_inbox
+from src.oauth_service.providers import providers
+from src.oauth_service.token_manager import token_manager
+from src.oauth_service.user_service import user_service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown"""
+    await connect.start()
+    await state_backend.start()
+    await http_clients.startup()
+    await publish_jobs.start()
+    await publish_scheduler.start()
+    await user_service_outbox.start()
+    await token_manager.start()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        await token_manager.stop()
+        # Acknowledged events are only in memory; apply them while MongoDB is still connected
+        await webhook_inbox.stop()
+        await user_service_outbox.stop()
+        await publish_scheduler.stop()
+        await publish_jobs.stop()
+        await user_service.aclose()
+        await http_clients.aclose()
+        await state_backend.stop()
+        await connect.stop()
+
+logger = logging_config.get_logger("main")
+
+app = FastAPI(
+    title="TikTok Login API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
-app = FastAPI(title="TikTok Login API", version="1.0.0")
+# Every worker must sign sessions with the same key
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    logger.warning("SECRET_KEY is not set, using an insecure development key", log_type="app")
+    SECRET_KEY = "your-secret-key-change-in-production"
 
 # Add session middleware for OAuth state management
-app.add_middleware(SessionMiddleware, secret_key="your-secret-key-change-in-production")
+app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+# Outermost, so the latency it records includes every other middleware
+app.add_middleware(MetricsMiddleware, providers=providers)
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
+# OAuth configuration; the state of a login in progress lives in the shared state backend,
+# so the callback can land on any worker
+oauth = OAuth(cache=state_backend)
 
-# OAuth configuration
-oauth = OAuth()
-
-# TikTok OAuth configuration
-# Note: TikTok doesn't have a standard OAuth discovery endpoint like Google
-# You'll need to configure this manually with your TikTok app credentials
-oauth.register(
-    name='tiktok',
-    client_id=os.getenv('TIKTOK_CLIENT_ID'),
-    client_secret=os.getenv('TIKTOK_CLIENT_SECRET'),
-    authorization_endpoint='https://www.tiktok.com/v2/auth/authorize/',
-    token_endpoint='https://open.tiktokapis.com/v2/oauth/token/',
-    client_kwargs={
-        'scope': 'user.info.basic video.publish video.upload',
-        'response_type': 'code',
-    }
-)
+# Every registered provider adds its OAuth app and keeps the built client
+providers.register_oauth(oauth)
 
 # Mock user authentication for testing
 def get_current_user():
@@ -41,9 +88,39 @@ def get_current_user():
 
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Service banner; use /health/live and /health/ready for probes"""
     return {"message": "TikTok Login API is running", "status": "ok"}
 
+@app.get("/health/live", include_in_schema=False)
+async def liveness_endpoint():
+    """The process is up and serving; restart it only if this fails"""
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness_endpoint():
+    """Whether this worker should receive traffic: startup finished and MongoDB answers"""
+    checks = {
+        "startup": getattr(app.state, "ready", False),
+        # Data on the in-memory mock is private to this worker and lost on restart
+        "mongodb": connect.healthy and not connect.mock,
+    }
+    ready = all(checks.values())
+    body = {"status": "ready" if ready else "not_ready", "checks": checks}
+    if connect.mock:
+        body["mongodb"] = "mock"
+    return ORJSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Declared ahead of the other routes: it takes the most requests and routes are matched in order
+@app.post("/webhooks/{provider}", include_in_schema=False)
+async def webhook_endpoint(request: Request, provider: str):
+    """Acknowledge a signed webhook delivery at once; its event is applied in the background"""
+    return json_response(await oauth_controller.receive_webhook(request, provider))
+
 @app.get("/auth/{provider}/login")
 async def login_endpoint(
     request: Request,
@@ -58,7 +135,7 @@ async def login_endpoint(
     redirect_uri = str(request.url_for("callback_endpoint", provider=provider))
     
     return await oauth_controller.login(
-        request, provider, oauth, redirect_uri, email, platform
+        request, provider, redirect_uri, email, platform
     )
 
 @app.get("/auth/{provider}/callback")
@@ -73,35 +150,112 @@ async def callback_endpoint(
         email = "test@example.com"  # Default for testing
     
     return await oauth_controller.callback(
-        request, provider, oauth, email, platform
+        request, provider, email, platform
     )
 
-@app.get("/api/{provider}/accounts")
+@app.get("/api/{provider}/accounts", response_model=Union[List[Account], ErrorResponse])
 async def get_accounts_endpoint(
+    request: Request,
     provider: str,
     user: dict = Depends(get_current_user)
 ):
-    """Get user's TikTok accounts"""
-    return await oauth_controller.get_accounts(provider, user)
+    """Get user's TikTok accounts; send the ETag back in If-None-Match to get 304 while unchanged"""
+    return conditional_response(request, await oauth_controller.get_accounts(provider, user), cached=True)
 
-@app.get("/api/{provider}/videos/{provider_id}")
+@app.get("/api/{provider}/videos")
+async def get_all_videos_endpoint(
+    provider: str,
+    max_count: int = 20,
+    refresh: bool = False,
+    user: dict = Depends(get_current_user)
+):
+    """Stream the first page of videos of every linked TikTok account as NDJSON, one line per account"""
+    return await oauth_controller.get_all_videos(provider, user, max_count, refresh)
+
+@app.get("/api/{provider}/videos/{provider_id}", response_model=Union[VideoPage, ErrorResponse])
 async def get_videos_endpoint(
+    request: Request,
     provider: str,
     provider_id: str,
+    cursor: Optional[int] = None,
+    max_count: int = 20,
+    all: bool = False,
+    refresh: bool = False,
     user: dict = Depends(get_current_user)
 ):
-    """Get user's TikTok videos"""
-    return await oauth_controller.get_videos(provider, provider_id, oauth, user)
+    """Get a page of the user's TikTok videos, or stream every page as NDJSON with all=true.
+
+    Pages carry an ETag; send it back in If-None-Match to get 304 while the page is unchanged.
+    """
+    return conditional_response(request, await oauth_controller.get_videos(
+        provider, provider_id, user, cursor, max_count, all, refresh
+    ), cached=True)
 
-@app.post("/api/{provider}/video/create")
+@app.post("/api/{provider}/video/create", response_model=Union[VideoJobCreated, ErrorResponse])
 async def create_video_endpoint(
     request: Request,
     provider: str,
     user: dict = Depends(get_current_user)
 ):
-    """Create a new TikTok video post"""
-    return await oauth_controller.create_video_post(request, provider, oauth, user)
+    """Queue a new TikTok video post, or schedule it with publish_at, and return its job id"""
+    return json_response(await oauth_controller.create_video_post(request, provider, user))
+
+@app.post("/api/{provider}/video/upload", response_model=Union[VideoUploaded, ErrorResponse])
+async def upload_video_endpoint(
+    request: Request,
+    provider: str,
+    user: dict = Depends(get_current_user)
+):
+    """Stream a multipart/form-data video upload to TikTok and return the publish job id.
+
+    Send the provider_id and video_size fields before the file part.
+    """
+    return json_response(await oauth_controller.upload_video_post(request, provider, user))
+
+@app.get("/api/{provider}/video/jobs/{job_id}", response_model=Union[VideoJob, ErrorResponse])
+async def get_video_job_endpoint(
+    request: Request,
+    provider: str,
+    job_id: str,
+    user: dict = Depends(get_current_user)
+):
+    """Get progress and publish status of a queued TikTok video post"""
+    return conditional_response(request, await oauth_controller.get_video_job(provider, job_id, user))
+
+@app.post("/api/{provider}/video/batch", response_model=Union[VideoBatch, ErrorResponse])
+async def create_video_batch_endpoint(
+    request: Request,
+    provider: str,
+    user: dict = Depends(get_current_user)
+):
+    """Queue posts to many linked TikTok accounts at once and return the result of each item"""
+    return json_response(await oauth_controller.create_video_batch(request, provider, user))
+
+@app.get("/api/{provider}/video/batches/{batch_id}", response_model=Union[VideoBatch, ErrorResponse])
+async def get_video_batch_endpoint(
+    request: Request,
+    provider: str,
+    batch_id: str,
+    user: dict = Depends(get_current_user)
+):
+    """Get the status of every post in a batch"""
+    return conditional_response(request, await oauth_controller.get_video_batch(provider, batch_id, user))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", 8000))
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        if os.getenv("STATE_BACKEND", "memory").strip().lower() != "mongo":
+            logger.warning(
+                "Running several workers with STATE_BACKEND=memory: OAuth logins and caches are not shared",
+                log_type="app",
+            )
+        # Workers are separate processes, so uvicorn needs the import string
+        # loop/http "auto" use uvloop and httptools when they are installed (uvicorn[standard])
+        uvicorn.run("main:app", host=host, port=port, workers=workers, loop="auto", http="auto",
+                    proxy_headers=True)
+    else:
+        uvicorn.run(app, host=host, port=port, loop="auto", http="auto")
@@ -1,46 +1,90 @@
 from fastapi import Request
-from src.oauth_service import tiktok_service
-
-# TikTok OAuth
-async def login(request: Request, provider: str, oauth, redirect_uri, email, platform):
-    """Gọi đến hàm login của TikTok"""
-    if provider == "tiktok":
-        return await tiktok_service.login(
-            request, provider, oauth, redirect_uri, email, platform
-        )
-    else:
-        return {"error": "Unsupported provider"}
-
-async def callback(request: Request, provider, oauth, email, platform):
-    """Gọi đến hàm để handle callback từ TikTok"""
-    if provider == "tiktok":
-        return await tiktok_service.handle_callback(
-            request, provider, oauth, email, platform
-        )
-    else:
-        return {"error": "Unsupported provider"}
+from shared_module.log import logging_config
+from src.oauth_service import tiktok_service  # noqa: F401  registers the TikTok provider
+from src.oauth_service.providers import providers
+
+logger = logging_config.get_logger("oauth_controller")
+
+def _unsupported():
+    return {"error": "Unsupported provider"}
+
+async def login(request: Request, provider, redirect_uri, email, platform):
+    """Gọi đến hàm login của provider"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.login(request, redirect_uri, email, platform)
+
+async def callback(request: Request, provider, email, platform):
+    """Gọi đến hàm để handle callback từ provider"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.callback(request, email, platform)
 
 async def get_accounts(provider, user):
-    """Lấy danh sách tài khoản TikTok"""
-    if provider == "tiktok":
-        return await tiktok_service.get_tiktok_accounts(provider, user)
-    else:
-        return {"error": "Unsupported provider"}
-
-async def get_videos(provider, provider_id, oauth, user):
-    """Lấy danh sách video TikTok"""
+    """Lấy danh sách tài khoản đã liên kết"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.get_accounts(user)
+
+async def get_videos(provider, provider_id, user, cursor=None, max_count=20, all_pages=False, refresh=False):
+    """Lấy danh sách video"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
     try:
-        if provider == "tiktok":
-            return await tiktok_service.get_user_videos(provider, provider_id, oauth, user)
-        else:
-            return {"error": "Unsupported provider"}
+        return await handler.get_videos(provider_id, user, cursor, max_count, all_pages, refresh)
     except Exception as e:
-        print(f"Error getting videos: {e}")
+        logger.error(f"Error getting videos: {str(e)}", log_type="error")
         return {"error": str(e)}
 
-async def create_video_post(request: Request, provider, oauth, user):
-    """Gọi đến hàm tạo video TikTok"""
-    if provider == "tiktok":
-        return await tiktok_service.create_video_post(request, provider, oauth, user)
-    else:
-        return {"error": "Unsupported provider"}
+async def get_all_videos(provider, user, max_count=20, refresh=False):
+    """Lấy video của tất cả tài khoản đã liên kết"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.get_all_videos(user, max_count, refresh)
+
+async def create_video_post(request: Request, provider, user):
+    """Gọi đến hàm tạo video"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.create_video_post(request, user)
+
+async def upload_video_post(request: Request, provider, user):
+    """Gọi đến hàm tải video lên trực tiếp"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.upload_video_post(request, user)
+
+async def get_video_job(provider, job_id, user):
+    """Lấy trạng thái job đăng video"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.get_video_job(job_id, user)
+
+async def create_video_batch(request: Request, provider, user):
+    """Gọi đến hàm tạo nhiều video cho nhiều tài khoản"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.create_video_batch(request, user)
+
+async def get_video_batch(provider, batch_id, user):
+    """Lấy trạng thái từng video trong batch"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.get_video_batch(batch_id, user)
+
+async def receive_webhook(request: Request, provider):
+    """Nhận webhook từ provider"""
+    handler = providers.get(provider)
+    if handler is None:
+        return _unsupported()
+    return await handler.receive_webhook(request)
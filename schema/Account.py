@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class Account(BaseModel):
+    """A linked social account as returned by /api/{provider}/accounts"""
+    name: Optional[str] = None
+    account_id: str
+    avatar: Optional[str] = None
@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+class ErrorResponse(BaseModel):
+    """Body of a failed request"""
+    error: str
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class Video(BaseModel):
+    """One TikTok video with the fields requested from the video list API"""
+    id: str
+    title: Optional[str] = None
+    video_description: Optional[str] = None
+    duration: Optional[int] = None
+    cover_image_url: Optional[str] = None
+    create_time: Optional[int] = None
+
+class VideoPage(BaseModel):
+    """One page of videos; pass ``cursor`` back to get the next page"""
+    videos: List[Video] = []
+    cursor: Optional[int] = None
+    has_more: bool = False
+
+class AccountVideoPage(VideoPage):
+    """First page of videos of one linked account, one NDJSON line of /api/{provider}/videos"""
+    account_id: str
+    name: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,45 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import List, Optional
+
+class VideoJobCreated(BaseModel):
+    """A video post accepted into the publish queue, or scheduled for ``publish_at``"""
+    job_id: str
+    status: str
+    publish_at: Optional[datetime] = None
+
+class VideoUploaded(BaseModel):
+    """A video streamed to TikTok whose publish job is now following TikTok's processing"""
+    job_id: str
+    status: str
+    publish_id: Optional[str] = None
+    video_size: int
+    sha256: str
+
+class VideoJob(BaseModel):
+    """Progress and publish status of a queued or scheduled video post"""
+    job_id: str
+    status: str
+    publish_at: Optional[datetime] = None
+    stage: Optional[str] = None
+    progress: float = 0.0
+    publish_id: Optional[str] = None
+    publish_status: Optional[str] = None
+    error: Optional[str] = None
+
+class VideoBatchItem(BaseModel):
+    """One post of a batch; once uploaded it is followed by a publish job of its own"""
+    index: int
+    provider_id: Optional[str] = None
+    status: str
+    job_id: Optional[str] = None
+    publish_id: Optional[str] = None
+    publish_status: Optional[str] = None
+    error: Optional[str] = None
+
+class VideoBatch(BaseModel):
+    """Posts of many videos or accounts queued in one call"""
+    batch_id: Optional[str] = None
+    status: str
+    publish_at: Optional[datetime] = None
+    items: List[VideoBatchItem]
@@ -1,21 +1,300 @@
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import os
+import time
+import uuid
+from urllib.parse import urlparse
+
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+
+db_duration = metrics.histogram(
+    "db_operation_duration_seconds", "MongoDB call latency including the wait for a DB thread",
+    ("collection", "operation"),
+)
+
+# Short timeouts so an unreachable MongoDB costs seconds at startup, not pymongo's default 30 s
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 2000))
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 2000))
+HEALTH_CHECK_INTERVAL = float(os.getenv("MONGODB_HEALTH_CHECK_INTERVAL", 10))
+# Use the in-memory mock when MongoDB is unreachable at startup, for local runs only;
+# a worker on the mock keeps its data in memory and never reports ready
+MOCK_FALLBACK = os.getenv("MONGODB_MOCK_FALLBACK", "false").strip().lower() in ("1", "true", "yes")
+
+logger = logging_config.get_logger("db")
 
 class DatabaseConnection:
-    def __init__(self):
-        # For local testing, use a simple connection
-        # Replace with your actual MongoDB connection string
-        connection_string = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+    """MongoDB handles created on first use instead of at import.
+
+    The app lifespan calls ``start()``, which connects off the event loop with
+    short timeouts, creates the indexes and then pings in the background so
+    ``healthy`` tracks whether MongoDB answers. pymongo reconnects on its own;
+    when MongoDB comes back the indexes are ensured again. Scripts that use
+    ``db``/``adb`` without ``start()`` connect lazily on first access.
+    """
+    def __init__(self, database_name="tiktok_login"):
+        self.database_name = database_name
+        self.connection_string = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+        self.client = None
+        self.mock = False
+        self.healthy = False
+        self.last_error = None
+        self._db = None
+        self._adb = None
+        self._health_task = None
+        self._index_builders = []
+    
+    def _connect(self):
+        options = {
+            "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+        }
+        # Options set in the URI win over these defaults (pymongo prefers keyword arguments)
+        query = urlparse(self.connection_string).query.lower()
+        client = MongoClient(
+            self.connection_string,
+            **{key: value for key, value in options.items() if key.lower() not in query},
+        )
+        try:
+            client.admin.command('ping')
+            self.healthy = True
+            logger.info("Connected to MongoDB successfully", log_type="app")
+        except Exception as e:
+            self.last_error = str(e)
+            if MOCK_FALLBACK:
+                logger.warning(
+                    "Failed to connect to MongoDB, using the in-memory mock",
+                    log_type="app",
+                    extra_data={"error": str(e)},
+                )
+                client.close()
+                # For testing without MongoDB, create a mock
+                self.mock = True
+                self.healthy = True
+                self._db = MockDB()
+                self._adb = AsyncMockDB(self._db)
+                return
+            logger.error(f"Failed to connect to MongoDB, will keep retrying: {str(e)}", log_type="error")
+        self.client = client
+        self._db = client[self.database_name]
+        # Async handlers use this facade so DB round trips never block the event loop
+        self._adb = AsyncDatabase(self._db)
+    
+    @property
+    def db(self):
+        if self._db is None:
+            self._connect()
+        return self._db
+    
+    @property
+    def adb(self):
+        if self._adb is None:
+            self._connect()
+        return self._adb
+    
+    async def ping(self):
+        """Whether MongoDB answers right now"""
+        if self.mock:
+            return True
         try:
-            self.client = MongoClient(connection_string)
-            self.db = self.client["tiktok_login"]
-            # Test connection
-            self.client.admin.command('ping')
-            print("Connected to MongoDB successfully")
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self.client.admin.command, 'ping')
+            )
         except Exception as e:
-            print(f"Failed to connect to MongoDB: {e}")
-            # For testing without MongoDB, create a mock
-            self.db = MockDB()
+            self.last_error = str(e)
+            return False
+        return True
+    
+    def add_index_builder(self, builder):
+        """Also await ``builder()`` whenever the indexes are ensured, such as when MongoDB comes back"""
+        self._index_builders.append(builder)
+    
+    async def _ensure_indexes_logged(self):
+        for ensure in [self.ensure_indexes, *self._index_builders]:
+            try:
+                await ensure()
+            except Exception as e:
+                logger.error(f"Failed to create MongoDB indexes: {str(e)}", log_type="error")
+    
+    async def _check_health_forever(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            healthy = await self.ping()
+            if healthy != self.healthy:
+                logger.warning(
+                    "MongoDB is reachable again" if healthy else "MongoDB is unreachable",
+                    log_type="app",
+                    extra_data={"error": None if healthy else self.last_error},
+                )
+                self.healthy = healthy
+                if healthy:
+                    await self._ensure_indexes_logged()
+    
+    async def start(self):
+        """Connect without blocking the event loop, create indexes and start the health checks"""
+        if self._db is None:
+            await asyncio.get_running_loop().run_in_executor(None, self._connect)
+        if self.healthy:
+            await self._ensure_indexes_logged()
+        if not self.mock:
+            self._health_task = asyncio.create_task(self._check_health_forever())
+    
+    async def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+    
+    async def ensure_indexes(self):
+        """Create the indexes the lookups below rely on; safe to run on every startup"""
+        users = self.adb["users"]
+        await users.create_index("email")
+        # Multikey compound index so $elemMatch on one linked account is an index seek
+        await users.create_index([
+            ("email", 1),
+            ("social_account.provider", 1),
+            ("social_account.provider_id", 1),
+        ])
+        await self.adb["publish_jobs"].create_index("status")
+        # The scheduler reads the earliest due scheduled jobs straight off this index
+        await self.adb["publish_jobs"].create_index([("status", 1), ("run_after", 1)])
+        # Webhook events name the post by its TikTok publish_id
+        await self.adb["publish_jobs"].create_index("publish_id")
+        await self.adb["user_service_outbox"].create_index("status")
+        await self.adb["oauth_tokens"].create_index("expires_at")
+        # Upload checkpoints are useless once TikTok's upload URL has expired
+        await self.adb["upload_checkpoints"].create_index("expires_at", expireAfterSeconds=0)
+        # Event ids only need remembering while the sender may still redeliver the event
+        await self.adb["webhook_events"].create_index("received_at", expireAfterSeconds=7 * 24 * 3600)
+    
+    async def find_social_account(self, email, provider, provider_id):
+        """Return the single linked account subdocument, or None"""
+        check = await self.adb["users"].find_one(
+            {
+                "email": email,
+                "social_account": {"$elemMatch": {"provider": provider, "provider_id": provider_id}},
+            },
+            {"_id": 0, "social_account.$": 1},
+        )
+        if check and check.get("social_account"):
+            return check["social_account"][0]
+        return None
+    
+    async def find_social_accounts(self, email, provider, provider_ids):
+        """Return the linked account subdocuments among ``provider_ids`` with one query
+
+        MongoDB filters the array, so the other linked accounts and their
+        tokens never leave the server.
+        """
+        provider_ids = list(provider_ids)
+        found = await self.adb["users"].aggregate([
+            {"$match": {
+                "email": email,
+                "social_account": {"$elemMatch": {"provider": provider, "provider_id": {"$in": provider_ids}}},
+            }},
+            {"$limit": 1},
+            {"$project": {
+                "_id": 0,
+                "social_account": {"$filter": {
+                    "input": "$social_account",
+                    "as": "account",
+                    "cond": {"$and": [
+                        {"$eq": ["$$account.provider", provider]},
+                        {"$in": ["$$account.provider_id", provider_ids]},
+                    ]},
+                }},
+            }},
+        ])
+        return found[0]["social_account"] if found else []
+    
+    async def list_social_accounts(self, email, provider):
+        """Return the public fields of every account linked for ``provider``, without tokens"""
+        check = await self.adb["users"].find_one(
+            {"email": email},
+            {
+                "_id": 0,
+                "social_account.provider": 1,
+                "social_account.provider_id": 1,
+                "social_account.name": 1,
+                "social_account.avatar": 1,
+            },
+        )
+        if not check or "social_account" not in check:
+            return []
+        return [
+            social_account for social_account in check["social_account"]
+            if social_account.get("provider") == provider
+        ]
+
+class AsyncCollection:
+    """Awaitable twin of a pymongo collection; each call runs on the DB thread pool"""
+    def __init__(self, collection, executor):
+        self.collection = collection
+        self.executor = executor
+    
+    async def _run(self, operation, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                self.executor, functools.partial(method, *args, **kwargs)
+            )
+        finally:
+            db_duration.observe(time.perf_counter() - started, self.collection.name, operation)
+    
+    async def find_one(self, *args, **kwargs):
+        return await self._run("find_one", self.collection.find_one, *args, **kwargs)
+    
+    async def find(self, *args, **kwargs):
+        """Run the query and return the documents as a list"""
+        return await self._run("find", lambda: list(self.collection.find(*args, **kwargs)))
+    
+    async def aggregate(self, *args, **kwargs):
+        """Run the pipeline and return the documents as a list"""
+        return await self._run("aggregate", lambda: list(self.collection.aggregate(*args, **kwargs)))
+    
+    async def insert_one(self, *args, **kwargs):
+        return await self._run("insert_one", self.collection.insert_one, *args, **kwargs)
+    
+    async def insert_many(self, *args, **kwargs):
+        return await self._run("insert_many", self.collection.insert_many, *args, **kwargs)
+    
+    async def update_one(self, *args, **kwargs):
+        return await self._run("update_one", self.collection.update_one, *args, **kwargs)
+    
+    async def update_many(self, *args, **kwargs):
+        return await self._run("update_many", self.collection.update_many, *args, **kwargs)
+    
+    async def find_one_and_update(self, *args, **kwargs):
+        return await self._run("find_one_and_update", self.collection.find_one_and_update, *args, **kwargs)
+    
+    async def delete_one(self, *args, **kwargs):
+        return await self._run("delete_one", self.collection.delete_one, *args, **kwargs)
+    
+    async def delete_many(self, *args, **kwargs):
+        return await self._run("delete_many", self.collection.delete_many, *args, **kwargs)
+    
+    async def create_index(self, *args, **kwargs):
+        return await self._run("create_index", self.collection.create_index, *args, **kwargs)
+
+class AsyncDatabase:
+    """Awaitable twin of a pymongo database backed by a bounded thread pool"""
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("MONGODB_THREADS", 32)),
+            thread_name_prefix="mongo",
+        )
+        metrics.gauge(
+            "db_executor_queued", "MongoDB calls waiting for a DB thread",
+            collect=lambda: [((), self.executor._work_queue.qsize())],
+        )
+    
+    def __getitem__(self, collection_name):
+        return AsyncCollection(self.db[collection_name], self.executor)
 
 class MockDB:
     """Mock database for testing without MongoDB"""
@@ -24,18 +303,162 @@ class MockDB:
     
     def __getitem__(self, collection_name):
         if collection_name not in self.collections:
-            self.collections[collection_name] = MockCollection()
+            self.collections[collection_name] = MockCollection(collection_name)
         return self.collections[collection_name]
 
+def _get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _matches(doc, query):
+    """Evaluate the subset of the Mongo query language the services use"""
+    for key, condition in query.items():
+        value = _get_path(doc, key)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$exists" and (value is not None) != operand:
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$lte" and not (value is not None and value <= operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$not" and _matches({"value": value}, {"value": operand}):
+                    return False
+                if op == "$elemMatch" and not any(
+                    isinstance(item, dict) and _matches(item, operand) for item in value or []
+                ):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def _project(doc, query, projection):
+    """Apply inclusion, positional (``field.$``) and ``$elemMatch`` projections"""
+    if not projection:
+        return dict(doc)
+    result = {} if any(projection.get(key) for key in projection if key != "_id") else dict(doc)
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    elif "_id" in result:
+        del result["_id"]
+    for key, rule in projection.items():
+        if key == "_id":
+            continue
+        if key.endswith(".$"):
+            field = key[:-2]
+            condition = query.get(field, {}).get("$elemMatch", {})
+            matched = [item for item in doc.get(field, []) if _matches(item, condition)]
+            result[field] = matched[:1]
+        elif isinstance(rule, dict) and "$elemMatch" in rule:
+            matched = [item for item in doc.get(key, []) if _matches(item, rule["$elemMatch"])]
+            result[key] = matched[:1]
+        elif rule and "." in key:
+            field, subfield = key.split(".", 1)
+            items = doc.get(field)
+            if isinstance(items, list):
+                projected = result.setdefault(field, [{} for _ in items])
+                for target, item in zip(projected, items):
+                    if subfield in item:
+                        target[subfield] = item[subfield]
+        elif rule and key in doc:
+            result[key] = doc[key]
+        elif not rule:
+            result.pop(key, None)
+    return result
+
+def _evaluate(expression, doc, variables):
+    """Evaluate the aggregation expressions the pipelines use (``$$var.path``, ``$and``, ``$eq``, ``$in``)"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, _, path = expression[2:].partition(".")
+        return _get_path(variables[name], path) if path else variables[name]
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get_path(doc, expression[1:])
+    if isinstance(expression, dict) and len(expression) == 1:
+        op, operand = next(iter(expression.items()))
+        if op == "$and":
+            return all(_evaluate(item, doc, variables) for item in operand)
+        if op == "$eq":
+            left, right = (_evaluate(item, doc, variables) for item in operand)
+            return left == right
+        if op == "$in":
+            value, values = (_evaluate(item, doc, variables) for item in operand)
+            return value in values
+        if op == "$filter":
+            name = operand.get("as", "this")
+            return [
+                item for item in _evaluate(operand["input"], doc, variables) or []
+                if _evaluate(operand["cond"], doc, {**variables, name: item})
+            ]
+    return expression
+
+def _apply_update(doc, update):
+    for key, value in update.get("$set", {}).items():
+        doc[key] = value
+    for key, value in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + value
+    for key, value in update.get("$push", {}).items():
+        doc.setdefault(key, []).append(value)
+    for key, value in update.get("$addToSet", {}).items():
+        if value not in doc.setdefault(key, []):
+            doc[key].append(value)
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+
+class MockInsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+class MockInsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+class MockUpdateResult:
+    def __init__(self, matched_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = matched_count
+        self.upserted_id = upserted_id
+
+class MockDeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
 class MockCollection:
-    """Mock collection for testing"""
-    def __init__(self):
+    """Mock collection for testing; lookups by ``_id`` skip the scan"""
+    def __init__(self, name=None):
+        self.name = name
         self.data = []
+        self._ids = {}
     
-    def find_one(self, query):
+    def _candidates(self, query):
+        doc_id = query.get("_id")
+        if isinstance(doc_id, dict) and set(doc_id) == {"$in"}:
+            return [self._ids[value] for value in doc_id["$in"] if value in self._ids]
+        if doc_id is None or isinstance(doc_id, dict):
+            return self.data
+        doc = self._ids.get(doc_id)
+        return [doc] if doc is not None else []
+    
+    def find_one(self, query, projection=None):
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                return _project(doc, query, projection)
         # Mock user data for testing
-        if query.get("email"):
-            return {
+        if self.name in (None, "users") and query.get("email"):
+            doc = {
                 "_id": "test_user_id",
                 "email": query["email"],
                 "social_account": [
@@ -48,6 +471,157 @@ class MockCollection:
                     }
                 ]
             }
+            if _matches(doc, query):
+                return _project(doc, query, projection)
         return None
+    
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        docs = [doc for doc in self._candidates(query or {}) if _matches(doc, query or {})]
+        for key, direction in reversed(sort or []):
+            docs.sort(key=lambda doc: (_get_path(doc, key) is not None, _get_path(doc, key)), reverse=direction < 0)
+        if limit:
+            docs = docs[:limit]
+        return [_project(doc, query or {}, projection) for doc in docs]
+    
+    def aggregate(self, pipeline):
+        """Support ``$match``, ``$limit`` and ``$project`` with inclusions and expressions"""
+        docs = [dict(doc) for doc in self.data]
+        for stage in pipeline:
+            (op, operand), = stage.items()
+            if op == "$match":
+                docs = [doc for doc in docs if _matches(doc, operand)]
+            elif op == "$limit":
+                docs = docs[:operand]
+            elif op == "$project":
+                docs = [
+                    {
+                        key: _evaluate(rule, doc, {}) if isinstance(rule, dict) else doc[key]
+                        for key, rule in operand.items()
+                        if rule and key in doc or isinstance(rule, dict)
+                    }
+                    for doc in docs
+                ]
+        return docs
+    
+    def create_index(self, keys, **kwargs):
+        if isinstance(keys, str):
+            return f"{keys}_1"
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+    
+    def insert_one(self, document):
+        document.setdefault("_id", str(uuid.uuid4()))
+        if document["_id"] in self._ids:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {document['_id']}")
+        doc = dict(document)
+        self.data.append(doc)
+        self._ids[doc["_id"]] = doc
+        return MockInsertResult(document["_id"])
+    
+    def insert_many(self, documents, ordered=True):
+        """Like pymongo, duplicates raise BulkWriteError; with ``ordered=False`` the others are still inserted"""
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append(self.insert_one(document).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return MockInsertManyResult(inserted)
+    
+    def update_one(self, query, update, upsert=False):
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                _apply_update(doc, update)
+                return MockUpdateResult(1)
+        if upsert:
+            doc = {key: value for key, value in query.items() if not isinstance(value, dict)}
+            doc.update(update.get("$setOnInsert", {}))
+            _apply_update(doc, update)
+            return MockUpdateResult(0, self.insert_one(doc).inserted_id)
+        return MockUpdateResult(0)
+    
+    def update_many(self, query, update):
+        matched = 0
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                _apply_update(doc, update)
+                matched += 1
+        return MockUpdateResult(matched)
+    
+    def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False, return_document=False):
+        """``return_document=True`` (pymongo's ReturnDocument.AFTER) returns the updated document"""
+        docs = self.find(query, sort=sort, limit=1)
+        if not docs:
+            if upsert:
+                self.update_one(query, update, upsert=True)
+                return _project(self.data[-1], query, projection) if return_document else None
+            return None
+        doc = self._ids[docs[0]["_id"]]
+        before = _project(doc, query, projection)
+        _apply_update(doc, update)
+        return _project(doc, query, projection) if return_document else before
+    
+    def delete_one(self, query):
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                self.data.remove(doc)
+                del self._ids[doc["_id"]]
+                return MockDeleteResult(1)
+        return MockDeleteResult(0)
+    
+    def delete_many(self, query):
+        before = len(self.data)
+        self.data = [doc for doc in self.data if not _matches(doc, query)]
+        self._ids = {doc["_id"]: doc for doc in self.data}
+        return MockDeleteResult(before - len(self.data))
+
+class AsyncMockCollection:
+    """Async twin of MockCollection; in-memory calls need no thread pool"""
+    def __init__(self, collection):
+        self.collection = collection
+    
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+    
+    async def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+    
+    async def aggregate(self, *args, **kwargs):
+        return self.collection.aggregate(*args, **kwargs)
+    
+    async def insert_one(self, *args, **kwargs):
+        return self.collection.insert_one(*args, **kwargs)
+    
+    async def insert_many(self, *args, **kwargs):
+        return self.collection.insert_many(*args, **kwargs)
+    
+    async def update_one(self, *args, **kwargs):
+        return self.collection.update_one(*args, **kwargs)
+    
+    async def update_many(self, *args, **kwargs):
+        return self.collection.update_many(*args, **kwargs)
+    
+    async def find_one_and_update(self, *args, **kwargs):
+        return self.collection.find_one_and_update(*args, **kwargs)
+    
+    async def delete_one(self, *args, **kwargs):
+        return self.collection.delete_one(*args, **kwargs)
+    
+    async def delete_many(self, *args, **kwargs):
+        return self.collection.delete_many(*args, **kwargs)
+    
+    async def create_index(self, *args, **kwargs):
+        return self.collection.create_index(*args, **kwargs)
+
+class AsyncMockDB:
+    """Async twin of MockDB sharing the same in-memory collections"""
+    def __init__(self, db=None):
+        self.db = db or MockDB()
+    
+    def __getitem__(self, collection_name):
+        return AsyncMockCollection(self.db[collection_name])
 
 connect = DatabaseConnection()
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from shared_module.metrics import metrics
+from shared_module.state import state_backend
+
+# Every cache registers itself here so its metrics can be reported
+caches = {}
+
+INVALIDATION_CHANNEL = "cache.invalidate"
+
+
+class AsyncTTLCache:
+    """Bounded in-process cache with per-entry TTL, LRU eviction and single-flight loads.
+
+    ``get_or_load(key, loader)`` returns a fresh cached value or awaits
+    ``loader()`` once, however many coroutines miss the same key at the same
+    time. With ``stale_ttl`` set, entries that expired less than ``stale_ttl``
+    seconds ago are still served while a single background load refreshes
+    them. Values loaded while an invalidation happened are returned to their
+    callers but not stored, so a stale read can never overwrite a newer write.
+    With a shared ``state_backend`` invalidations are also sent to the other
+    workers, which apply them within the backend's poll interval.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60.0, stale_ttl=0.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._background = set()
+        self._epoch = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        caches[name] = self
+
+    def _lookup(self, key):
+        """Return ``(value, fresh)`` for a servable entry, or ``(None, False)``"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None, False
+        expires_at, stale_until, value = entry
+        now = time.monotonic()
+        if now < stale_until:
+            self._data.move_to_end(key)
+            return value, now < expires_at
+        del self._data[key]
+        self.expirations += 1
+        return None, False
+
+    def get(self, key):
+        """Return the fresh cached value for ``key`` or None, counting hits and misses"""
+        value, fresh = self._lookup(key)
+        if fresh:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, expires_at + self.stale_ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader, ttl=None, refresh=False):
+        """Return the cached value for ``key``, loading it on a miss or when ``refresh`` is set"""
+        if not refresh:
+            value, fresh = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                if not fresh:
+                    self.stale_hits += 1
+                    self._refresh_in_background(key, loader, ttl)
+                return value
+        self.misses += 1
+        return await self._load(key, loader, ttl)
+
+    def _refresh_in_background(self, key, loader, ttl):
+        if key in self._inflight:
+            return
+        task = asyncio.create_task(self._load(key, loader, ttl))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        # A failed refresh keeps serving the stale value; the error is not re-raised
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def _load(self, key, loader, ttl):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on the future; mark failures as retrieved
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = future
+        epoch = self._epoch
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if value is not None and epoch == self._epoch:
+            self.set(key, value, ttl)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key):
+        self._invalidate(key)
+        self._broadcast("key", key)
+
+    def invalidate_prefix(self, *prefix):
+        """Drop every tuple key that starts with ``prefix``"""
+        self._invalidate_prefix(prefix)
+        self._broadcast("prefix", prefix)
+
+    def clear(self):
+        self._invalidate_prefix(())
+        self._broadcast("prefix", ())
+
+    def _invalidate(self, key):
+        self._epoch += 1
+        self._data.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def _invalidate_prefix(self, prefix):
+        self._epoch += 1
+        size = len(prefix)
+        for key in [key for key in self._data if key[:size] == prefix]:
+            del self._data[key]
+        for key in [key for key in self._inflight if key[:size] == prefix]:
+            del self._inflight[key]
+
+    def _broadcast(self, kind, key):
+        if not state_backend.shared:
+            return
+        message = {"cache": self.name, "kind": kind, "key": list(key)}
+        task = asyncio.get_running_loop().create_task(state_backend.publish(INVALIDATION_CHANNEL, message))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _apply_invalidation(message):
+    """Apply an invalidation published by another worker"""
+    cache = caches.get(message["cache"])
+    if cache is None:
+        return
+    key = tuple(message["key"])
+    if message["kind"] == "key":
+        cache._invalidate(key)
+    else:
+        cache._invalidate_prefix(key)
+
+
+state_backend.subscribe(INVALIDATION_CHANNEL, _apply_invalidation)
+
+
+def _cache_sizes():
+    for name, cache in caches.items():
+        yield (name,), len(cache._data)
+
+
+def _cache_lookups():
+    for name, cache in caches.items():
+        yield (name, "hit"), cache.hits - cache.stale_hits
+        yield (name, "stale_hit"), cache.stale_hits
+        yield (name, "miss"), cache.misses
+        yield (name, "coalesced"), cache.coalesced
+
+
+metrics.gauge("cache_entries", "Entries held by each in-process cache", ("cache",), collect=_cache_sizes)
+metrics.counter(
+    "cache_lookups_total", "In-process cache lookups by result", ("cache", "result"), collect=_cache_lookups
+)
+
+account_cache = AsyncTTLCache(
+    "accounts",
+    maxsize=int(os.getenv("ACCOUNT_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("ACCOUNT_CACHE_TTL", 60)),
+)
+
+video_cache = AsyncTTLCache(
+    "videos",
+    maxsize=int(os.getenv("VIDEO_CACHE_SIZE", 5000)),
+    ttl=float(os.getenv("VIDEO_CACHE_TTL", 60)),
+    stale_ttl=float(os.getenv("VIDEO_CACHE_STALE_TTL", 600)),
+)
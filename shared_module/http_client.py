@@ -0,0 +1,118 @@
+import os
+import httpx
+
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+
+logger = logging_config.get_logger("http_client")
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class HTTPClientRegistry:
+    """App-lifetime registry of pooled httpx.AsyncClient instances, one per upstream host.
+
+    Each named pool (``tiktok``, ``user_service``, ...) gets its own connection
+    limits so a slow upstream cannot starve the others. Settings are read from
+    the environment; ``HTTP_CLIENT_<NAME>_<SETTING>`` overrides the global
+    ``HTTP_CLIENT_<SETTING>`` for a single pool.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._ssl_contexts = {}
+
+    def _setting(self, name, key, default, cast=_env_float):
+        return cast(f"HTTP_CLIENT_{name.upper()}_{key}", cast(f"HTTP_CLIENT_{key}", default))
+
+    def _http2_enabled(self, name):
+        if not self._setting(name, "HTTP2", False, cast=_env_bool):
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning(
+                "HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1",
+                log_type="app",
+                extra_data={"pool": name},
+            )
+            return False
+        return True
+
+    def ssl_context(self, http2=False):
+        """Shared TLS context for clients built outside the pools, such as authlib's"""
+        # Loading the CA bundle takes tens of milliseconds, so pools share a context.
+        # HTTP/2 pools set ALPN on theirs and get a separate one
+        context = self._ssl_contexts.get(http2)
+        if context is None:
+            context = self._ssl_contexts[http2] = httpx.create_ssl_context()
+        return context
+
+    def _build(self, name):
+        limits = httpx.Limits(
+            max_connections=self._setting(name, "MAX_CONNECTIONS", 100, cast=_env_int),
+            max_keepalive_connections=self._setting(name, "MAX_KEEPALIVE", 20, cast=_env_int),
+            keepalive_expiry=self._setting(name, "KEEPALIVE_EXPIRY", 30.0),
+        )
+        timeout = httpx.Timeout(
+            connect=self._setting(name, "CONNECT_TIMEOUT", 5.0),
+            read=self._setting(name, "READ_TIMEOUT", 30.0),
+            write=self._setting(name, "WRITE_TIMEOUT", 30.0),
+            pool=self._setting(name, "POOL_TIMEOUT", 5.0),
+        )
+        http2 = self._http2_enabled(name)
+        return httpx.AsyncClient(
+            limits=limits, timeout=timeout, http2=http2, verify=self.ssl_context(http2)
+        )
+
+    def get(self, name="default"):
+        """Return the shared client for ``name``, creating it on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._build(name)
+        return client
+
+    async def startup(self, names=("tiktok", "user_service", "upload")):
+        """Pre-build the pools used on the request path"""
+        for name in names:
+            self.get(name)
+        logger.info("HTTP client pools ready", log_type="app", extra_data={"pools": list(names)})
+
+    def connection_counts(self):
+        """Yield ``((pool, state), count)`` for the active and idle connections of each pool"""
+        for name, client in self._clients.items():
+            # httpx does not expose its pool publicly; skip clients built with a custom transport
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = getattr(pool, "connections", None) or []
+            idle = sum(1 for connection in connections if connection.is_idle())
+            yield (name, "active"), len(connections) - idle
+            yield (name, "idle"), idle
+
+    async def aclose(self):
+        """Close every pool, draining keep-alive connections"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HTTPClientRegistry()
+
+metrics.gauge(
+    "http_client_connections", "Open upstream connections per pool",
+    ("pool", "state"), collect=http_clients.connection_counts,
+)
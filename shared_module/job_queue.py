@@ -0,0 +1,333 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from shared_module.DB import connect
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+from shared_module.state import WORKER_ID
+
+logger = logging_config.get_logger("job_queue")
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+# Stored for later; the scheduler moves it to queued when it comes due
+SCHEDULED = "scheduled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# A running job is renewed every third of its lease; if its worker dies another one takes it over
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+# How often each process looks for jobs enqueued, released or abandoned by other workers
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 5))
+
+# Every queue registers itself here so its depth can be reported
+job_queues = {}
+
+job_duration = metrics.histogram(
+    "job_duration_seconds", "Run time of background jobs by outcome",
+    ("queue", "kind", "status"), buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+def _as_utc(value):
+    # pymongo returns naive datetimes in UTC unless tz_aware is set
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class JobQueue:
+    """Mongo-backed background job queue processed by a pool of asyncio workers.
+
+    Every job is persisted in ``connect.adb[collection_name]`` before it is
+    queued in memory. Workers claim a job with one atomic update that also
+    sets a lease, so with several processes or nodes each job runs on exactly
+    one worker; every process also polls for jobs it did not enqueue itself
+    and for running jobs whose lease ran out. A handler whose lease cannot be
+    renewed in time is cancelled, so it never runs alongside the worker that
+    takes the job over. Handlers are registered per
+    job ``kind`` and receive the stored job document; they can record
+    progress with ``update()`` and return extra fields to store on success.
+    With ``max_attempts`` above 1 a failed job is queued again after an
+    exponential delay starting at ``retry_delay`` seconds and capped at
+    ``max_retry_delay``. With ``max_attempts=None`` it is retried until the
+    handler succeeds, which gives at-least-once delivery for outbox-style jobs.
+    """
+
+    def __init__(self, collection_name, concurrency=None, max_attempts=1, retry_delay=5.0, max_retry_delay=None):
+        self.collection_name = collection_name
+        self.concurrency = concurrency or int(os.getenv("JOB_WORKER_CONCURRENCY", 4))
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.handlers = {}
+        self._queue = None
+        self._queued = set()
+        self._workers = []
+        self._scanner = None
+        self.running = 0
+        job_queues[collection_name] = self
+
+    @property
+    def collection(self):
+        return connect.adb[self.collection_name]
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def build(self, kind, payload, **fields):
+        """Return a new job document, without storing or queueing it"""
+        now = datetime.now(timezone.utc)
+        return {
+            "_id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": QUEUED,
+            "progress": 0.0,
+            "payload": payload,
+            "error": None,
+            "attempts": 0,
+            "run_after": now,
+            "owner": None,
+            "lease_until": None,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+
+    async def enqueue(self, kind, payload, **fields):
+        """Persist a new job and schedule it; returns the job id"""
+        job = self.build(kind, payload, **fields)
+        await self.collection.insert_one(job)
+        self._put(job["_id"])
+        return job["_id"]
+
+    async def get(self, job_id):
+        return await self.collection.find_one({"_id": job_id})
+
+    async def get_many(self, job_ids):
+        """Return the stored jobs among ``job_ids`` with one query"""
+        return await self.collection.find({"_id": {"$in": list(job_ids)}})
+
+    async def update(self, job_id, **fields):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        await self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def update_many(self, query, **fields):
+        """Set ``fields`` on every job matching ``query`` with one write; returns how many matched"""
+        fields["updated_at"] = datetime.now(timezone.utc)
+        result = await self.collection.update_many(query, {"$set": fields})
+        return result.matched_count
+
+    def wake(self, job_id):
+        """Queue a stored job that became due, such as one released by the scheduler"""
+        self._put(job_id)
+
+    def _put(self, job_id):
+        if self._queue is not None and job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _claim(self, job_id):
+        """Atomically take a job that is due, or running with an expired lease"""
+        now = datetime.now(timezone.utc)
+        update = {
+            "$set": {"status": RUNNING, "owner": WORKER_ID,
+                     "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now},
+            "$inc": {"attempts": 1},
+        }
+        for query in (
+            {"_id": job_id, "status": QUEUED, "run_after": {"$not": {"$gt": now}}},
+            {"_id": job_id, "status": RUNNING, "lease_until": {"$not": {"$gt": now}}},
+        ):
+            job = await self.collection.find_one_and_update(
+                query, update, return_document=ReturnDocument.AFTER
+            )
+            if job:
+                return job
+        return None
+
+    async def _scan(self):
+        """Queue every job that is due or abandoned; returns how many were found"""
+        now = datetime.now(timezone.utc)
+        due = await self.collection.find(
+            {"status": QUEUED, "run_after": {"$not": {"$gt": now}}}, limit=100
+        )
+        abandoned = await self.collection.find(
+            {"status": RUNNING, "lease_until": {"$not": {"$gt": now}}}, limit=100
+        )
+        for job in due + abandoned:
+            self._put(job["_id"])
+        return len(due) + len(abandoned)
+
+    async def _scan_forever(self):
+        while True:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            try:
+                await self._scan()
+            except Exception as e:
+                logger.error(f"Job scan failed: {str(e)}", log_type="error")
+
+    async def start(self):
+        """Start the worker pool and pick up jobs left over from a previous run"""
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        # With MongoDB down at startup the periodic scan picks the jobs up once it is back
+        resumed = 0
+        if connect.healthy:
+            try:
+                resumed = await self._scan()
+            except Exception as e:
+                logger.error(f"Job scan failed: {str(e)}", log_type="error")
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        self._scanner = asyncio.create_task(self._scan_forever())
+        logger.info(
+            "Job workers started",
+            log_type="app",
+            extra_data={"collection": self.collection_name, "workers": self.concurrency,
+                        "resumed": resumed, "worker_id": WORKER_ID},
+        )
+
+    async def stop(self):
+        """Stop the workers; their running jobs are released for other workers or the next start"""
+        tasks = self._workers + ([self._scanner] if self._scanner else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._scanner = None
+        self._queue = None
+
+    def _retry_later(self, job_id, delay):
+        def requeue():
+            # After a stop the job is still queued in Mongo and any worker picks it up
+            self._put(job_id)
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} could not be run: {str(e)}", log_type="error")
+            finally:
+                self._queue.task_done()
+
+    async def _renew_lease(self, job_id, work, lease_until):
+        """Extend the lease every third of its length; returns True after cancelling ``work``
+        because the lease could not be kept and another worker may take the job over"""
+        interval = JOB_LEASE_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            renewed_until = datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)
+            try:
+                result = await self.collection.update_one(
+                    {"_id": job_id, "owner": WORKER_ID}, {"$set": {"lease_until": renewed_until}}
+                )
+            except Exception as e:
+                logger.error(f"Job {job_id} lease renewal failed: {str(e)}", log_type="error")
+                # Keep trying while the lease still outlasts the next attempt
+                if datetime.now(timezone.utc) + timedelta(seconds=interval) < lease_until:
+                    continue
+            else:
+                if result.matched_count:
+                    lease_until = renewed_until
+                    continue
+            logger.error(
+                f"Job {job_id} lost its lease, stopping it",
+                log_type="error",
+                extra_data={"lease_until": lease_until.isoformat()},
+            )
+            work.cancel()
+            return True
+
+    async def _run(self, job_id):
+        job = await self._claim(job_id)
+        if not job:
+            # Already taken by another worker, finished, or not due yet
+            return
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self.update(job_id, status=FAILED, error=f"No handler for job kind {job['kind']}")
+            return
+
+        attempts = job["attempts"]
+        self.running += 1
+        started = time.perf_counter()
+        work = asyncio.create_task(handler(job))
+        lease = asyncio.create_task(self._renew_lease(job_id, work, _as_utc(job["lease_until"])))
+        try:
+            result = await work or {}
+        except asyncio.CancelledError:
+            if lease.done() and not lease.cancelled() and lease.result():
+                # Whoever claims the expired lease resumes the job; it is no longer ours to update
+                job_duration.observe(time.perf_counter() - started, self.collection_name, job["kind"], "lost")
+                return
+            # Hand the job back so another worker, or this one after a restart, resumes it
+            await asyncio.shield(self.update(job_id, status=QUEUED, owner=None, lease_until=None))
+            raise
+        except Exception as e:
+            retry = self.max_attempts is None or attempts < self.max_attempts
+            job_duration.observe(
+                time.perf_counter() - started, self.collection_name, job["kind"], "retry" if retry else FAILED
+            )
+            logger.error(
+                f"Job {job_id} failed: {str(e)}",
+                log_type="error",
+                extra_data={"kind": job["kind"], "attempts": attempts, "retry": retry},
+            )
+            if retry:
+                delay = self.retry_delay * 2 ** min(attempts - 1, 30)
+                if self.max_retry_delay is not None:
+                    delay = min(delay, self.max_retry_delay)
+                await self.update(
+                    job_id, status=QUEUED, error=str(e), owner=None, lease_until=None,
+                    run_after=datetime.now(timezone.utc) + timedelta(seconds=delay),
+                )
+                self._retry_later(job_id, delay)
+            else:
+                await self.update(job_id, status=FAILED, error=str(e), owner=None, lease_until=None)
+            return
+        finally:
+            lease.cancel()
+            self.running -= 1
+        result.setdefault("status", COMPLETED)
+        job_duration.observe(time.perf_counter() - started, self.collection_name, job["kind"], result["status"])
+        await self.update(job_id, owner=None, lease_until=None, **result)
+
+
+def _queue_depths():
+    for name, job_queue in job_queues.items():
+        yield (name, "queued"), job_queue._queue.qsize() if job_queue._queue is not None else 0
+        yield (name, "running"), job_queue.running
+
+
+metrics.gauge(
+    "job_queue_jobs", "Jobs waiting and running in each in-process queue",
+    ("queue", "state"), collect=_queue_depths,
+)
+
+# Retries resume an interrupted upload from its checkpoint instead of starting over
+publish_jobs = JobQueue(
+    "publish_jobs",
+    concurrency=int(os.getenv("PUBLISH_WORKER_CONCURRENCY", 4)),
+    max_attempts=int(os.getenv("PUBLISH_JOB_MAX_ATTEMPTS", 3)),
+    retry_delay=float(os.getenv("PUBLISH_JOB_RETRY_DELAY", 10)),
+)
+
+# Deferred calls to the user service, retried until delivered unless a limit is set (0 = none)
+user_service_outbox = JobQueue(
+    "user_service_outbox",
+    concurrency=int(os.getenv("USER_SERVICE_OUTBOX_CONCURRENCY", 2)),
+    max_attempts=int(os.getenv("USER_SERVICE_OUTBOX_MAX_ATTEMPTS", 0)) or None,
+    retry_delay=float(os.getenv("USER_SERVICE_OUTBOX_RETRY_DELAY", 5)),
+    max_retry_delay=float(os.getenv("USER_SERVICE_OUTBOX_MAX_RETRY_DELAY", 300)),
+)
@@ -1,36 +1,179 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+from datetime import datetime, timezone
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines; ``extra_data`` is appended only when a record is emitted"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        extra_data = getattr(record, "extra_data", None)
+        if extra_data:
+            message = f"{message} | Extra: {extra_data}"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with ``log_type`` and ``extra_data`` as fields"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        log_type = getattr(record, "log_type", None)
+        if log_type:
+            entry["log_type"] = log_type
+        extra_data = getattr(record, "extra_data", None)
+        if extra_data:
+            entry["extra_data"] = extra_data
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class BatchingHandler(logging.handlers.MemoryHandler):
+    """Buffers records and writes them to ``target`` in batches.
+
+    A batch is flushed when it reaches ``capacity`` records or every
+    ``flush_interval`` seconds, whichever comes first.
+    """
+
+    def __init__(self, target, capacity=100, flush_interval=1.0):
+        super().__init__(capacity, flushLevel=logging.CRITICAL, target=target, flushOnClose=True)
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, args=(flush_interval,), name="audit-log-flush", daemon=True
+        )
+        self._flusher.start()
+
+    def _flush_periodically(self, flush_interval):
+        while not self._stopped.wait(flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        super().close()
+
+
+class AppLogger:
+    """Logger facade keeping the ``info(message, log_type=..., extra_data=...)`` call style.
+
+    Nothing is formatted on the caller's side: disabled levels return
+    immediately and ``log_type``/``extra_data`` travel on the record until a
+    formatter on the logging thread renders them.
+    """
+
+    def __init__(self, logger, audit_logger):
+        self.logger = logger
+        self.audit_logger = audit_logger
+        self.name = logger.name
+
+    def _log(self, logger, level, message, args, log_type, extra_data, exc_info=None):
+        if logger.isEnabledFor(level):
+            logger._log(
+                level, message, args, exc_info=exc_info,
+                extra={"log_type": log_type, "extra_data": extra_data},
+            )
+
+    def debug(self, message, *args, log_type=None, extra_data=None):
+        self._log(self.logger, logging.DEBUG, message, args, log_type, extra_data)
+
+    def info(self, message, *args, log_type=None, extra_data=None):
+        self._log(self.logger, logging.INFO, message, args, log_type, extra_data)
+
+    def warning(self, message, *args, log_type=None, extra_data=None):
+        self._log(self.logger, logging.WARNING, message, args, log_type, extra_data)
+
+    def error(self, message, *args, log_type=None, extra_data=None, exc_info=None):
+        self._log(self.logger, logging.ERROR, message, args, log_type, extra_data, exc_info)
+
+    def audit_log(self, message, *args, log_type="audit", extra_data=None):
+        self._log(self.audit_logger, logging.INFO, f"[AUDIT] {message}", args, log_type, extra_data)
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
 
 class LoggingConfig:
+    """Configures logging once per process.
+
+    Records are put on an in-memory queue by a ``QueueHandler`` and written
+    by a ``QueueListener`` thread, so no stdout or file I/O happens on the
+    event loop. ``LOG_FORMAT=json`` switches to structured output. Audit
+    records go to their own sink (``AUDIT_LOG_FILE`` or stdout) and are
+    written in batches.
+    """
+
     def __init__(self):
-        self.logger = logging.getLogger()
+        formatter = JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter()
+
         handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.INFO)
+
+        audit_file = os.getenv("AUDIT_LOG_FILE")
+        audit_target = logging.FileHandler(audit_file, encoding="utf-8") if audit_file else logging.StreamHandler(sys.stdout)
+        audit_target.setFormatter(formatter)
+        self.audit_handler = BatchingHandler(
+            audit_target,
+            capacity=int(os.getenv("AUDIT_LOG_BATCH_SIZE", 100)),
+            flush_interval=float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", 1.0)),
+        )
+
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, handler, respect_handler_level=True)
+        self.audit_queue = queue.SimpleQueue()
+        self.audit_listener = logging.handlers.QueueListener(self.audit_queue, self.audit_handler)
+
+        self.logger = logging.getLogger()
+        self.logger.addHandler(_LazyQueueHandler(self.queue))
+        self.logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+        self.audit = logging.getLogger("audit")
+        self.audit.addHandler(_LazyQueueHandler(self.audit_queue))
+        self.audit.setLevel(logging.INFO)
+        self.audit.propagate = False
+
+        self.listener.start()
+        self.audit_listener.start()
+        atexit.register(self.stop)
 
     def get_logger(self, name: str):
-        logger = logging.getLogger(name)
-        logger.info = self._log_wrapper(logger.info)
-        logger.warning = self._log_wrapper(logger.warning)
-        logger.error = self._log_wrapper(logger.error)
-        logger.audit_log = self._audit_log_wrapper(logger.info)
-        return logger
-
-    def _log_wrapper(self, original_method):
-        def wrapper(message, log_type=None, extra_data=None):
-            if extra_data:
-                message = f"{message} | Extra: {extra_data}"
-            original_method(message)
-        return wrapper
-
-    def _audit_log_wrapper(self, original_method):
-        def wrapper(message, log_type=None, extra_data=None):
-            audit_message = f"[AUDIT] {message}"
-            if extra_data:
-                audit_message = f"{audit_message} | Extra: {extra_data}"
-            original_method(audit_message)
-        return wrapper
+        return AppLogger(logging.getLogger(name), self.audit)
+
+    def stop(self):
+        """Drain the queues and flush pending audit batches"""
+        for listener in (self.listener, self.audit_listener):
+            if listener._thread is not None:
+                listener.stop()
+        self.audit_handler.close()
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that hands the record over untouched.
+
+    The stock ``prepare()`` formats the message on the calling thread; here
+    formatting is left to the listener thread. Args are merged only when they
+    are not plain values, so objects are not mutated after being logged.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args and (isinstance(args, dict) or not all(isinstance(arg, (str, int, float, bool, type(None))) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
 
 logging_config = LoggingConfig()
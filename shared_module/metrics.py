@@ -0,0 +1,218 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers in-process cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination.
+
+    Components that already keep their own totals can pass ``collect``,
+    returning ``(labelvalues, value)`` pairs read at scrape time.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        values = self.collect() if self.collect else self._values.items()
+        for labelvalues, value in values:
+            yield self.name, _labels(self.labelnames, labelvalues), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination.
+
+    ``observe`` costs one dict lookup and one bisect; the cumulative counts
+    Prometheus expects are only built when ``/metrics`` is scraped.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, *labelvalues):
+        state = self._values.get(labelvalues)
+        if state is None:
+            # Per-bucket counts (plus +Inf), sum
+            state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """Observe the wall time of the ``with`` block, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def samples(self):
+        for labelvalues, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _labels(self.labelnames, labelvalues, (("le", _number(bound)),)), cumulative)
+            yield f"{self.name}_sum", _labels(self.labelnames, labelvalues), total
+            yield f"{self.name}_count", _labels(self.labelnames, labelvalues), cumulative
+
+
+class Gauge:
+    """Point-in-time values, either set directly or read from ``collect`` at scrape time.
+
+    ``collect`` returns ``(labelvalues, value)`` pairs so pool sizes, queue
+    depths and the like cost nothing until someone asks for them.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._values = {}
+
+    def set(self, value, *labelvalues):
+        self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def samples(self):
+        values = self.collect() if self.collect else self._values.items()
+        for labelvalues, value in values:
+            yield self.name, _labels(self.labelnames, labelvalues), value
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), collect=None):
+        return self._register(Counter(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and count of every HTTP request.
+
+    Requests are labelled by route template (``/api/{provider}/accounts``),
+    never the raw path, so label cardinality stays bounded. The provider
+    label is kept only for names in ``providers`` and is ``other`` for
+    anything else a client puts in the path. Streaming responses are timed
+    until their last chunk is sent.
+    """
+
+    def __init__(self, app, registry=None, providers=()):
+        self.app = app
+        self.providers = providers
+        registry = registry or metrics
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "HTTP request latency by route",
+            ("method", "route", "provider", "status"),
+        )
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec()
+            route = scope.get("route")
+            provider = scope.get("path_params", {}).get("provider", "")
+            if provider and provider not in self.providers:
+                provider = "other"
+            self.duration.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                provider,
+                status,
+            )
+
+
+metrics = MetricsRegistry()
+
+# Shared by every module that times a step of a request or job
+stage_duration = metrics.histogram(
+    "stage_duration_seconds", "Duration of named steps inside handlers and jobs", ("stage",)
+)
+errors_total = metrics.counter(
+    "errors_total", "Handled errors by provider and operation", ("provider", "operation")
+)
@@ -0,0 +1,141 @@
+from collections import deque
+
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Form fields are small; anything larger has to be sent as a file part
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class MultipartError(Exception):
+    """Raised when a multipart/form-data body is malformed or ends early"""
+
+
+class Part:
+    """One part of a multipart body, read block by block as it arrives"""
+
+    def __init__(self, reader, headers):
+        self._reader = reader
+        self._done = False
+        self.headers = headers
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        self.name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self.filename = filename.decode("utf-8", "replace") if filename is not None else None
+        self.content_type = headers.get(b"content-type", b"").decode("latin-1") or None
+
+    def __aiter__(self):
+        return self._reader._blocks(self)
+
+    async def read(self, limit=MAX_FIELD_SIZE):
+        """Read a small part whole"""
+        data = bytearray()
+        async for block in self:
+            if len(data) + len(block) > limit:
+                raise MultipartError(f"Field {self.name!r} is larger than {limit} bytes")
+            data += block
+        return bytes(data)
+
+
+class StreamingMultipart:
+    """Read a multipart/form-data request body part by part as it is received.
+
+    Unlike ``Request.form()``, file parts are neither spooled to a temporary
+    file nor buffered: each block is handed over as soon as it is parsed from
+    the request stream, so memory stays at one network read whatever the size
+    of the upload. Parts have to be consumed in order; moving to the next part
+    skips what is left of the current one.
+    """
+
+    def __init__(self, headers, stream):
+        content_type, params = parse_options_header(headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise MultipartError("Expected a multipart/form-data body")
+        self._stream = stream.__aiter__()
+        self._events = deque()
+        self._current = None
+        self._received_all = False
+        self._done = False
+        self._headers = {}
+        self._header_name = b""
+        self._header_value = b""
+        try:
+            self._parser = MultipartParser(params[b"boundary"], {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_end": self._on_end,
+            })
+        except FormParserError as e:
+            raise MultipartError(str(e)) from e
+
+    # Parser callbacks only queue events; the async readers below consume them
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        self._events.append(("part", self._headers))
+
+    def _on_part_data(self, data, start, end):
+        self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        self._events.append(("end", None))
+
+    def _on_end(self):
+        self._events.append(("done", None))
+
+    async def _next_event(self):
+        while not self._events:
+            if self._received_all:
+                raise MultipartError("Multipart body ended before its closing boundary")
+            try:
+                chunk = await self._stream.__anext__()
+            except StopAsyncIteration:
+                self._received_all = True
+                continue
+            if chunk:
+                try:
+                    self._parser.write(chunk)
+                except FormParserError as e:
+                    raise MultipartError(str(e)) from e
+        return self._events.popleft()
+
+    async def _blocks(self, part):
+        while not part._done:
+            kind, value = await self._next_event()
+            if kind == "data":
+                yield value
+            elif kind == "end":
+                part._done = True
+
+    async def next_part(self):
+        """Return the next part, or None after the last one"""
+        if self._current is not None:
+            async for _ in self._current:
+                pass
+            self._current = None
+        while not self._done:
+            kind, value = await self._next_event()
+            if kind == "part":
+                self._current = Part(self, value)
+                return self._current
+            if kind == "done":
+                self._done = True
+        return None
@@ -0,0 +1,280 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from shared_module.http_client import http_clients
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+
+logger = logging_config.get_logger("outbound")
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+outbound_duration = metrics.histogram(
+    "outbound_request_duration_seconds", "Latency of each outbound API attempt",
+    ("client", "endpoint", "status"),
+)
+outbound_errors = metrics.counter(
+    "outbound_errors_total", "Failed outbound API attempts by reason",
+    ("client", "endpoint", "reason"),
+)
+outbound_retries = metrics.counter(
+    "outbound_retries_total", "Outbound API attempts that were retried", ("client", "endpoint")
+)
+
+# Every client registers itself here so its breaker states can be reported
+outbound_clients = {}
+
+
+def _breaker_states():
+    for client in outbound_clients.values():
+        for endpoint, breaker in client.breakers.items():
+            state = breaker.state
+            for candidate in ("closed", "half_open", "open"):
+                yield (client.pool, endpoint, candidate), int(state == candidate)
+
+
+metrics.gauge(
+    "outbound_circuit_state", "1 for the current circuit breaker state of each endpoint",
+    ("client", "endpoint", "state"), collect=_breaker_states,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while an endpoint's circuit breaker is open"""
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, bursts up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and lets one trial call through
+    every ``reset_timeout`` seconds until a call succeeds again"""
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial):
+            raise CircuitOpenError("Circuit open, upstream is failing")
+        if state == "half_open":
+            self._trial = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def release_trial(self):
+        """Let another call try a half-open circuit; the abandoned one says nothing about upstream"""
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class EndpointPolicy:
+    """Quota and retry settings for one logical upstream endpoint.
+
+    ``token_rate`` is the requests per second allowed per access token;
+    ``idempotent`` endpoints are also retried on 5xx and read errors, others
+    only when the request was refused before being processed (429 or a
+    failed connect).
+    """
+
+    def __init__(self, token_rate=None, token_burst=None, idempotent=True):
+        self.token_rate = token_rate
+        self.token_burst = token_burst
+        self.idempotent = idempotent
+
+
+def _retry_after(response):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class OutboundClient:
+    """Shared layer for outbound API calls: rate limits, retries and circuit breakers.
+
+    Every call names a logical ``endpoint`` with an ``EndpointPolicy``. Calls
+    wait for the per-token bucket and for one ``app_rate`` bucket shared by
+    every endpoint of the client, are retried with jittered
+    exponential backoff that honours ``Retry-After``, and fail fast with
+    ``CircuitOpenError`` while the endpoint's breaker is open. The final
+    ``httpx.Response`` is returned so callers keep their own error handling.
+    """
+
+    def __init__(self, pool, policies, app_rate=None, max_retries=3, backoff_base=0.5, backoff_max=20.0,
+                 breaker_threshold=5, breaker_reset=30.0, max_token_buckets=10000):
+        self.pool = pool
+        self.policies = policies
+        self._app_bucket = TokenBucket(app_rate) if app_rate else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.max_token_buckets = max_token_buckets
+        self._token_buckets = OrderedDict()
+        self.breakers = {}
+        outbound_clients[pool] = self
+
+    def _policy(self, endpoint):
+        return self.policies.get(endpoint) or EndpointPolicy()
+
+    def _breaker(self, endpoint):
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(
+                self.breaker_threshold, self.breaker_reset
+            )
+        return breaker
+
+    async def _acquire(self, endpoint, policy, token):
+        if self._app_bucket is not None:
+            await self._app_bucket.acquire()
+        if policy.token_rate and token:
+            key = (endpoint, token)
+            bucket = self._token_buckets.get(key)
+            if bucket is None:
+                bucket = self._token_buckets[key] = TokenBucket(policy.token_rate, policy.token_burst)
+                if len(self._token_buckets) > self.max_token_buckets:
+                    self._token_buckets.popitem(last=False)
+            else:
+                self._token_buckets.move_to_end(key)
+            await bucket.acquire()
+
+    def _backoff(self, attempt, response=None):
+        if response is not None:
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def request(self, endpoint, method, url, token=None, **kwargs):
+        """Send one API call, retrying transient failures according to ``endpoint``'s policy"""
+        policy = self._policy(endpoint)
+        breaker = self._breaker(endpoint)
+        if token:
+            headers = dict(kwargs.pop("headers", None) or {})
+            headers.setdefault("Authorization", f"Bearer {token}")
+            kwargs["headers"] = headers
+
+        attempt = 0
+        while True:
+            await self._acquire(endpoint, policy, token)
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                outbound_errors.inc(self.pool, endpoint, "circuit_open")
+                raise
+            started = time.perf_counter()
+            try:
+                response = await http_clients.get(self.pool).request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                outbound_duration.observe(time.perf_counter() - started, self.pool, endpoint, "error")
+                outbound_errors.inc(self.pool, endpoint, type(e).__name__)
+                breaker.record_failure()
+                # Connect failures never reached upstream, so they are always safe to retry
+                retryable = policy.idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(
+                    "Retrying outbound call after transport error",
+                    log_type="app",
+                    extra_data={"endpoint": endpoint, "attempt": attempt + 1, "error": repr(e)},
+                )
+            except BaseException:
+                # Cancelled, such as by a client going away, or failed here; not an upstream failure
+                breaker.release_trial()
+                raise
+            else:
+                outbound_duration.observe(
+                    time.perf_counter() - started, self.pool, endpoint, response.status_code
+                )
+                if response.status_code >= 400:
+                    outbound_errors.inc(self.pool, endpoint, response.status_code)
+                if response.status_code < 500:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                retryable = response.status_code == 429 or (
+                    policy.idempotent and response.status_code in RETRYABLE_STATUSES
+                )
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                if delay > self.backoff_max:
+                    # Upstream asked us to wait longer than we are willing to hold a caller
+                    return response
+                logger.warning(
+                    "Retrying outbound call",
+                    log_type="app",
+                    extra_data={"endpoint": endpoint, "attempt": attempt + 1,
+                                "status": response.status_code, "delay": round(delay, 3)},
+                )
+            outbound_retries.inc(self.pool, endpoint)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get(self, endpoint, url, **kwargs):
+        return await self.request(endpoint, "GET", url, **kwargs)
+
+    async def post(self, endpoint, url, **kwargs):
+        return await self.request(endpoint, "POST", url, **kwargs)
+
+    def stats(self):
+        return {endpoint: breaker.state for endpoint, breaker in self.breakers.items()}
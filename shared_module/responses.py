@@ -0,0 +1,118 @@
+import hashlib
+import os
+from collections import OrderedDict
+from email.utils import formatdate
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+from shared_module.metrics import metrics
+
+# Rendered bodies of cached payloads, so a page polled by many clients is serialized once
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", 4096))
+
+json_renders = metrics.counter(
+    "json_renders_total", "Conditional JSON bodies serialized or reused from the render cache", ("outcome",)
+)
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+    """Serialize to JSON bytes with orjson"""
+    return orjson.dumps(content, default=_default)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, several times faster than the stdlib on large lists"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(content):
+    """Send trusted service output as is.
+
+    Returning a Response makes FastAPI skip validating it against the route's
+    response model and running it through ``jsonable_encoder``, which dominate
+    the cost of large video lists. The response models still describe the
+    route in the OpenAPI schema. Responses built by the service itself, such
+    as redirects and NDJSON streams, pass through unchanged.
+    """
+    if isinstance(content, Response):
+        return content
+    return ORJSONResponse(content)
+
+
+class RenderCache:
+    """Body, ETag and Last-Modified of payloads that are sent again as the same object.
+
+    Values served from an ``AsyncTTLCache`` are the same object on every hit,
+    so their body is serialized and hashed on the first request only. Entries
+    are keyed by ``id()`` and keep the payload alive, so the id cannot be
+    reused while the entry exists; payloads must not be changed once sent.
+    Last-Modified is when this process first rendered a body with that ETag,
+    so reloading unchanged content keeps the same value.
+    """
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._bodies = OrderedDict()
+        self._first_seen = OrderedDict()
+
+    def render(self, content, reuse=True):
+        """Return ``(body, etag, last_modified)`` for ``content``"""
+        key = id(content)
+        entry = self._bodies.get(key)
+        if entry is not None and entry[0] is content:
+            self._bodies.move_to_end(key)
+            json_renders.inc("reused")
+            return entry[1:]
+        json_renders.inc("rendered")
+        body = dumps(content)
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        last_modified = self._first_seen.pop(etag, None) or formatdate(usegmt=True)
+        self._first_seen[etag] = last_modified
+        if len(self._first_seen) > self.maxsize:
+            self._first_seen.popitem(last=False)
+        if reuse:
+            self._bodies[key] = (content, body, etag, last_modified)
+            if len(self._bodies) > self.maxsize:
+                self._bodies.popitem(last=False)
+        return body, etag, last_modified
+
+
+render_cache = RenderCache()
+
+
+def _etag_matches(if_none_match, etag):
+    """Weak comparison, as RFC 9110 requires for If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def conditional_response(request, content, cached=False):
+    """Send JSON with an ETag, answering 304 when the client already has that body.
+
+    The ETag is a hash of the serialized body and ``Cache-Control: no-cache``
+    makes browsers revalidate on every poll, so an unchanged payload costs
+    the client a header round trip instead of the whole body. Pass
+    ``cached=True`` for payloads served from a cache to reuse their rendered
+    body. Only If-None-Match is checked: it takes precedence over
+    If-Modified-Since, and Last-Modified differs between workers.
+    """
+    if isinstance(content, Response):
+        return content
+    body, etag, last_modified = render_cache.render(content, reuse=cached)
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
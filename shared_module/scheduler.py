@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import os
+from datetime import datetime, timedelta, timezone
+
+from shared_module.job_queue import QUEUED, SCHEDULED, _as_utc, publish_jobs
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+from shared_module.outbound import TokenBucket
+
+logger = logging_config.get_logger("scheduler")
+
+# Only jobs due within this many seconds are held in memory
+SCHEDULER_WINDOW = float(os.getenv("SCHEDULER_WINDOW", 300))
+# Most jobs held in memory at once; when more are due the earliest are kept
+SCHEDULER_MAX_LOADED = int(os.getenv("SCHEDULER_MAX_LOADED", 5000))
+# How often each process reloads, which also picks up jobs scheduled by other workers
+SCHEDULER_LOAD_INTERVAL = float(os.getenv("SCHEDULER_LOAD_INTERVAL", 5))
+# Due jobs are released at most this fast, so posts scheduled for the same minute are spread out
+SCHEDULER_DISPATCH_RATE = float(os.getenv("SCHEDULER_DISPATCH_RATE", 20))
+SCHEDULER_DISPATCH_BURST = int(os.getenv("SCHEDULER_DISPATCH_BURST", 20))
+
+# Every scheduler registers itself here so its heap size can be reported
+schedulers = {}
+
+dispatch_lag = metrics.histogram(
+    "scheduler_dispatch_lag_seconds", "Delay between a scheduled job's due time and its release",
+    ("queue",), buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600),
+)
+
+
+class Scheduler:
+    """Releases the jobs of a JobQueue at their due time.
+
+    Scheduled jobs are stored in the queue's collection with status
+    ``scheduled`` and ``run_after`` set to their due time. An index on both
+    fields means jobs cost nothing until they come due, however many are
+    waiting. Each process holds only the earliest ``max_loaded`` jobs due
+    within ``window`` seconds, in a heap rebuilt from the index every
+    ``load_interval`` seconds or as soon as a full heap has half drained.
+    One atomic update moves a due job from ``scheduled`` to ``queued`` and
+    hands it to the queue's workers, so with several processes every job is
+    released once. Releases pass through a token bucket, which spreads a
+    burst scheduled for the same instant at ``dispatch_rate`` per second and
+    per process.
+    After a restart, jobs that came due in between are released first.
+    """
+
+    def __init__(self, job_queue, window=SCHEDULER_WINDOW, max_loaded=SCHEDULER_MAX_LOADED,
+                 load_interval=SCHEDULER_LOAD_INTERVAL, dispatch_rate=SCHEDULER_DISPATCH_RATE,
+                 dispatch_burst=SCHEDULER_DISPATCH_BURST):
+        self.job_queue = job_queue
+        self.window = window
+        self.max_loaded = max_loaded
+        self.load_interval = load_interval
+        self.dispatch_rate = dispatch_rate
+        self.dispatch_burst = dispatch_burst
+        self.released = 0
+        self._heap = []
+        self._full = False
+        self._wakeup = None
+        self._drained = None
+        self._bucket = None
+        self._tasks = []
+        schedulers[job_queue.collection_name] = self
+
+    @property
+    def collection(self):
+        return self.job_queue.collection
+
+    async def schedule(self, kind, payload, run_at, **fields):
+        """Persist a job to run at ``run_at``, a timezone-aware datetime; returns the job id"""
+        job = self.job_queue.build(kind, payload, status=SCHEDULED, run_after=run_at, **fields)
+        await self.collection.insert_one(job)
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=self.window)
+        if self._wakeup is not None and run_at <= horizon:
+            heapq.heappush(self._heap, (run_at, job["_id"]))
+            self._wakeup.set()
+        return job["_id"]
+
+    async def _load(self):
+        """Replace the heap with the earliest scheduled jobs due within the window"""
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=self.window)
+        jobs = await self.collection.find(
+            {"status": SCHEDULED, "run_after": {"$lte": horizon}},
+            {"_id": 1, "run_after": 1},
+            sort=[("run_after", 1)],
+            limit=self.max_loaded,
+        )
+        # Sorted by due time, so the list already is a valid heap
+        self._heap = [(_as_utc(job["run_after"]), job["_id"]) for job in jobs]
+        self._full = len(jobs) >= self.max_loaded
+        self._wakeup.set()
+        return len(jobs)
+
+    async def _load_forever(self):
+        while True:
+            try:
+                await self._load()
+            except Exception as e:
+                logger.error(f"Scheduler load failed: {str(e)}", log_type="error")
+            self._drained.clear()
+            try:
+                await asyncio.wait_for(self._drained.wait(), self.load_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _release(self, job_id, run_at):
+        """Move one due job to the queue; False if another worker released it first"""
+        now = datetime.now(timezone.utc)
+        job = await self.collection.find_one_and_update(
+            {"_id": job_id, "status": SCHEDULED},
+            {"$set": {"status": QUEUED, "updated_at": now}},
+            projection={"_id": 1},
+        )
+        if job is None:
+            return False
+        self.job_queue.wake(job_id)
+        self.released += 1
+        dispatch_lag.observe((now - run_at).total_seconds(), self.job_queue.collection_name)
+        return True
+
+    async def _dispatch_forever(self):
+        while True:
+            if self._full and len(self._heap) < self.max_loaded // 2:
+                # More jobs were due than fit in memory; fetch the next ones now
+                self._drained.set()
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            run_at, job_id = self._heap[0]
+            delay = (run_at - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                # Sleep until the earliest job is due, or until an earlier one arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            try:
+                released = await self._release(job_id, run_at)
+            except Exception as e:
+                # The job is still scheduled, so the next load picks it up again
+                logger.error(f"Scheduled job {job_id} could not be released: {str(e)}", log_type="error")
+                continue
+            if released:
+                # Only jobs this process released count against its pace
+                await self._bucket.acquire()
+
+    async def start(self):
+        """Load due jobs, including those that came due while no scheduler was running"""
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._bucket = TokenBucket(self.dispatch_rate, self.dispatch_burst)
+        self._tasks = [
+            asyncio.create_task(self._load_forever()),
+            asyncio.create_task(self._dispatch_forever()),
+        ]
+        logger.info(
+            "Scheduler started",
+            log_type="app",
+            extra_data={"collection": self.job_queue.collection_name, "window": self.window,
+                        "max_loaded": self.max_loaded, "dispatch_rate": self.dispatch_rate},
+        )
+
+    async def stop(self):
+        """Stop releasing jobs; whatever is still scheduled stays in the database"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        self._heap = []
+
+
+def _loaded_jobs():
+    for name, scheduler in schedulers.items():
+        yield (name,), len(scheduler._heap)
+
+
+metrics.gauge(
+    "scheduler_loaded_jobs", "Scheduled jobs held in memory, due within the window",
+    ("queue",), collect=_loaded_jobs,
+)
+
+# Posts with a publish_at time wait here until they are due
+publish_scheduler = Scheduler(publish_jobs)
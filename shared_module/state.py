@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+from shared_module.DB import connect
+from shared_module.log import logging_config
+
+logger = logging_config.get_logger("state")
+
+# Identifies this process in locks and broadcast events
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class MemoryStateBackend:
+    """Process-local key/value state with expiry; only correct for a single worker.
+
+    Implements the async ``get``/``set``/``delete`` interface authlib expects
+    from ``OAuth(cache=...)``, plus ``add`` (set if absent, used as a lock)
+    and ``publish``/``subscribe`` for messages between workers.
+    """
+
+    # Subscribers never hear from other processes, so nobody needs to publish
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+        self._subscribers = {}
+        self._purge_at = 1024
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, expires_in=None):
+        expires_at = time.monotonic() + expires_in if expires_in else None
+        self._data[key] = (value, expires_at)
+        if len(self._data) > self._purge_at:
+            # Abandoned OAuth states are never read again; drop expired entries now and then
+            for stale in [stale for stale in self._data if not self._live(stale)]:
+                self._data.pop(stale, None)
+            self._purge_at = max(1024, 2 * len(self._data))
+
+    async def add(self, key, value, expires_in=None):
+        """Set ``key`` only if it is not set yet; returns whether it was set"""
+        if self._live(key):
+            return False
+        await self.set(key, value, expires_in)
+        return True
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    def subscribe(self, channel, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    async def publish(self, channel, message):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class MongoStateBackend(MemoryStateBackend):
+    """Key/value state and broadcasts shared by every worker through MongoDB.
+
+    Values live in ``app_state`` with a TTL index on ``expires_at``. Published
+    messages are written to ``state_events`` and every process polls for
+    messages from other workers each ``poll_interval`` seconds, so a cache
+    invalidated on one worker is dropped everywhere shortly after.
+    """
+
+    shared = True
+
+    def __init__(self, collection_name="app_state", events_name="state_events", poll_interval=1.0,
+                 event_ttl=300):
+        super().__init__()
+        self.collection_name = collection_name
+        self.events_name = events_name
+        self.poll_interval = poll_interval
+        self.event_ttl = event_ttl
+        self._poller = None
+        self._seen = {}
+
+    @property
+    def collection(self):
+        return connect.adb[self.collection_name]
+
+    @property
+    def events(self):
+        return connect.adb[self.events_name]
+
+    @staticmethod
+    def _expiry(expires_in):
+        return datetime.now(timezone.utc) + timedelta(seconds=expires_in) if expires_in else None
+
+    async def get(self, key):
+        doc = await self.collection.find_one({"_id": key})
+        if not doc:
+            return None
+        expires_at = doc.get("expires_at")
+        # The TTL monitor only runs once a minute
+        if expires_at is not None:
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            if expires_at <= datetime.now(timezone.utc):
+                return None
+        return doc["value"]
+
+    async def set(self, key, value, expires_in=None):
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"value": value, "expires_at": self._expiry(expires_in)}},
+            upsert=True,
+        )
+
+    async def add(self, key, value, expires_in=None):
+        # Matches only an expired entry; a live one makes the upsert collide on _id
+        try:
+            await self.collection.update_one(
+                {"_id": key, "expires_at": {"$lt": datetime.now(timezone.utc)}},
+                {"$set": {"value": value, "expires_at": self._expiry(expires_in)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def delete(self, key):
+        await self.collection.delete_one({"_id": key})
+
+    async def publish(self, channel, message):
+        now = datetime.now(timezone.utc)
+        await self.events.insert_one({
+            "_id": uuid.uuid4().hex,
+            "channel": channel,
+            "message": message,
+            "origin": WORKER_ID,
+            "at": now,
+            "expires_at": now + timedelta(seconds=self.event_ttl),
+        })
+
+    async def _poll(self):
+        since = datetime.now(timezone.utc)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # Clocks of writers differ a little; look back and skip what was already handled
+                events = await self.events.find(
+                    {"at": {"$gte": since - timedelta(seconds=5)}, "origin": {"$ne": WORKER_ID}},
+                    sort=[("at", 1)],
+                )
+                for event in events:
+                    if event["_id"] in self._seen:
+                        continue
+                    self._seen[event["_id"]] = event["at"]
+                    for callback in self._subscribers.get(event["channel"], []):
+                        callback(event["message"])
+                if events:
+                    since = max(since, events[-1]["at"].replace(tzinfo=timezone.utc))
+                horizon = since - timedelta(seconds=10)
+                for event_id in [key for key, at in self._seen.items() if at.replace(tzinfo=timezone.utc) < horizon]:
+                    del self._seen[event_id]
+            except Exception as e:
+                logger.error(f"State event poll failed: {str(e)}", log_type="error")
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        await self.events.create_index("at")
+        await self.events.create_index("expires_at", expireAfterSeconds=0)
+
+    async def start(self):
+        # With MongoDB down at startup the indexes are created once it is back
+        connect.add_index_builder(self.ensure_indexes)
+        if connect.healthy:
+            try:
+                await self.ensure_indexes()
+            except Exception as e:
+                logger.error(f"Failed to create state indexes: {str(e)}", log_type="error")
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+
+
+def _build_backend():
+    backend = os.getenv("STATE_BACKEND", "memory").strip().lower()
+    if backend == "mongo":
+        return MongoStateBackend(poll_interval=float(os.getenv("STATE_POLL_INTERVAL", 1.0)))
+    return MemoryStateBackend()
+
+
+state_backend = _build_backend()
@@ -0,0 +1,169 @@
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from pymongo.errors import BulkWriteError
+
+from shared_module.DB import connect
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+
+logger = logging_config.get_logger("webhooks")
+
+# Events received within this many seconds are applied as one batch
+WEBHOOK_BATCH_WINDOW = float(os.getenv("WEBHOOK_BATCH_WINDOW", 0.05))
+WEBHOOK_BATCH_MAX_SIZE = int(os.getenv("WEBHOOK_BATCH_MAX_SIZE", 500))
+# Accepted events not applied yet; past this, deliveries are refused so the sender retries them later
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", 20000))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 3))
+WEBHOOK_RETRY_DELAY = float(os.getenv("WEBHOOK_RETRY_DELAY", 1.0))
+
+DUPLICATE_KEY = 11000
+
+webhook_events = metrics.counter(
+    "webhook_events_total", "Webhook events by source and outcome", ("source", "outcome")
+)
+webhook_batch_size = metrics.histogram(
+    "webhook_batch_size", "New events applied per batch", ("source",),
+    buckets=(1, 10, 50, 100, 250, 500, 1000),
+)
+
+
+class WebhookInbox:
+    """Acknowledge webhook events at once, then apply them in batches, once per event id.
+
+    ``put`` only holds the event in memory, so the HTTP handler can answer
+    before anything is written. Events received within ``batch_window``
+    seconds, up to ``batch_max_size`` of them, are applied together:
+    ids already recorded in ``collection_name`` are dropped with one query,
+    the handler registered for the event's source gets the rest as one list,
+    and their ids are recorded afterwards. An event the sender delivers again
+    is therefore applied once. A copy arriving while the first is still being
+    applied can run twice, so handlers must be idempotent. A failed batch is
+    retried after an exponential delay starting at ``retry_delay`` seconds.
+    Accepted events are only in memory until applied, so anything that acts
+    on them needs a fallback for events lost in a crash.
+    """
+
+    def __init__(self, collection_name, batch_window=WEBHOOK_BATCH_WINDOW, batch_max_size=WEBHOOK_BATCH_MAX_SIZE,
+                 max_pending=WEBHOOK_MAX_PENDING, max_attempts=WEBHOOK_MAX_ATTEMPTS, retry_delay=WEBHOOK_RETRY_DELAY):
+        self.collection_name = collection_name
+        self.batch_window = batch_window
+        self.batch_max_size = batch_max_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.handlers = {}
+        self.in_flight = 0
+        self._pending = {}
+        self._flush_handle = None
+        self._batches = set()
+
+    @property
+    def collection(self):
+        return connect.adb[self.collection_name]
+
+    def register(self, source, handler):
+        self.handlers[source] = handler
+
+    def put(self, source, event_id, event):
+        """Accept an event for processing; False when too many are pending and the sender should retry"""
+        key = f"{source}:{event_id}"
+        if key in self._pending:
+            # Redelivered before the first copy was even applied
+            webhook_events.inc(source, "coalesced")
+            return True
+        if len(self._pending) + self.in_flight >= self.max_pending:
+            webhook_events.inc(source, "refused")
+            return False
+        self._pending[key] = (source, event)
+        webhook_events.inc(source, "accepted")
+        if len(self._pending) >= self.batch_max_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return True
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            self.in_flight += len(pending)
+            task = asyncio.create_task(self._process(pending))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _process(self, pending):
+        # _apply drops duplicates from the batch as it finds them
+        count = len(pending)
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    await self._apply(pending)
+                    return
+                except Exception as e:
+                    retry = attempt < self.max_attempts
+                    logger.error(
+                        f"Webhook batch failed: {str(e)}",
+                        log_type="error",
+                        extra_data={"events": len(pending), "attempts": attempt, "retry": retry},
+                    )
+                    if retry:
+                        await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            for source, _ in pending.values():
+                webhook_events.inc(source, "dropped")
+        finally:
+            self.in_flight -= count
+
+    async def _apply(self, pending):
+        seen = await self.collection.find({"_id": {"$in": list(pending)}}, {"_id": 1})
+        for doc in seen:
+            source, _ = pending.pop(doc["_id"])
+            webhook_events.inc(source, "duplicate")
+        if not pending:
+            return
+
+        by_source = defaultdict(list)
+        for source, event in pending.values():
+            by_source[source].append(event)
+        for source, events in by_source.items():
+            handler = self.handlers.get(source)
+            if handler is None:
+                logger.warning("No handler for webhook source", log_type="app", extra_data={"source": source})
+                continue
+            webhook_batch_size.observe(len(events), source)
+            await handler(events)
+
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_many(
+                [{"_id": key, "source": source, "event": event, "received_at": now}
+                 for key, (source, event) in pending.items()],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            # Another process applied a copy of the same event at the same time
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+        for source, _ in pending.values():
+            webhook_events.inc(source, "applied")
+
+    async def stop(self):
+        """Apply whatever is still waiting for its batch window"""
+        self._flush()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+
+def _pending_events():
+    yield (), len(webhook_inbox._pending) + webhook_inbox.in_flight
+
+
+metrics.gauge(
+    "webhook_pending_events", "Webhook events accepted but not applied yet", collect=_pending_events,
+)
+
+# Deliveries from every provider; each registers the handler that applies its events
+webhook_inbox = WebhookInbox("webhook_events")
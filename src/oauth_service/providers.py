@@ -0,0 +1,87 @@
+from shared_module.log import logging_config
+
+logger = logging_config.get_logger("providers")
+
+
+class Provider:
+    """Interface of a social login provider.
+
+    A provider registers its OAuth client once through ``register_oauth`` and
+    keeps the built client, then serves every route for its ``name``. Methods
+    it does not support may be left as they are and report so.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.oauth_client = None
+
+    def register_oauth(self, oauth):
+        """Register this provider's OAuth app with ``oauth`` and keep the built client"""
+        raise NotImplementedError
+
+    async def login(self, request, redirect_uri, email, platform):
+        raise NotImplementedError
+
+    async def callback(self, request, email, platform):
+        raise NotImplementedError
+
+    async def get_accounts(self, user):
+        return {"error": f"{self.name} does not support listing accounts"}
+
+    async def get_videos(self, provider_id, user, cursor=None, max_count=20, all_pages=False, refresh=False):
+        return {"error": f"{self.name} does not support listing videos"}
+
+    async def get_all_videos(self, user, max_count=20, refresh=False):
+        return {"error": f"{self.name} does not support listing videos"}
+
+    async def create_video_post(self, request, user):
+        return {"error": f"{self.name} does not support publishing videos"}
+
+    async def upload_video_post(self, request, user):
+        return {"error": f"{self.name} does not support publishing videos"}
+
+    async def get_video_job(self, job_id, user):
+        return {"error": f"{self.name} does not support publishing videos"}
+
+    async def create_video_batch(self, request, user):
+        return {"error": f"{self.name} does not support publishing videos"}
+
+    async def get_video_batch(self, batch_id, user):
+        return {"error": f"{self.name} does not support publishing videos"}
+
+    async def receive_webhook(self, request):
+        return {"error": f"{self.name} does not support webhooks"}
+
+
+class ProviderRegistry:
+    """Providers by route name; resolving one is a single dict lookup however many are registered"""
+
+    def __init__(self):
+        self._providers = {}
+
+    def register(self, provider):
+        self._providers[provider.name] = provider
+        return provider
+
+    def __contains__(self, name):
+        return name in self._providers
+
+    def get(self, name):
+        """Return the provider for ``name``, or None when it is not supported"""
+        provider = self._providers.get(name)
+        if provider is None:
+            logger.warning(
+                "Unsupported provider - Hiện phương thức đăng nhập này chưa hỗ trợ",
+                log_type="app",
+                extra_data={"provider": name},
+            )
+        return provider
+
+    def register_oauth(self, oauth):
+        """Register the OAuth app of every provider; call once at startup"""
+        for provider in self._providers.values():
+            provider.register_oauth(oauth)
+
+
+providers = ProviderRegistry()
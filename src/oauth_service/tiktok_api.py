@@ -0,0 +1,30 @@
+import os
+
+from shared_module.outbound import EndpointPolicy, OutboundClient
+
+# Overridable so load tests can point the service at a local stub
+TIKTOK_API_BASE_URL = os.getenv("TIKTOK_API_BASE_URL", "https://open.tiktokapis.com").rstrip("/")
+
+# One ceiling shared by every endpoint (requests per second); empty, as .env.example ships it, means none
+APP_RATE = float(os.getenv("TIKTOK_APP_RATE") or 0) or None
+
+# Per access token quotas from TikTok's rate limit docs, converted from
+# requests per minute (1-minute sliding window) to a rate plus burst
+TIKTOK_POLICIES = {
+    "oauth.token": EndpointPolicy(idempotent=False),
+    "user.info": EndpointPolicy(token_rate=600 / 60, token_burst=20),
+    "video.list": EndpointPolicy(token_rate=600 / 60, token_burst=20),
+    "publish.init": EndpointPolicy(token_rate=6 / 60, token_burst=6, idempotent=False),
+    "publish.status": EndpointPolicy(token_rate=30 / 60, token_burst=5),
+}
+
+tiktok_api = OutboundClient(
+    "tiktok",
+    TIKTOK_POLICIES,
+    app_rate=APP_RATE,
+    max_retries=int(os.getenv("TIKTOK_MAX_RETRIES", 3)),
+    backoff_base=float(os.getenv("TIKTOK_BACKOFF_BASE", 0.5)),
+    backoff_max=float(os.getenv("TIKTOK_BACKOFF_MAX", 20)),
+    breaker_threshold=int(os.getenv("TIKTOK_BREAKER_THRESHOLD", 5)),
+    breaker_reset=float(os.getenv("TIKTOK_BREAKER_RESET", 30)),
+)
@@ -1,74 +1,152 @@
+import asyncio
+import contextlib
 import json
 import base64
-import httpx
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from authlib.integrations.starlette_client import OAuthError, StarletteOAuth2App
 from fastapi import Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+import orjson
 
 from schema.User import User
 from shared_module.log import logging_config
 from shared_module.DB import connect
+from shared_module.http_client import http_clients
+from shared_module.cache import account_cache, video_cache
+from shared_module.job_queue import FAILED, QUEUED, publish_jobs, user_service_outbox
+from shared_module.metrics import errors_total, stage_duration
+from shared_module.multipart import MultipartError, StreamingMultipart
+from shared_module.responses import ORJSONResponse, dumps
+from shared_module.scheduler import publish_scheduler
+from shared_module.webhooks import webhook_events, webhook_inbox
+from src.oauth_service import video_upload
+from src.oauth_service.video_upload import upload_checkpoints
+from src.oauth_service.providers import Provider, providers
+from src.oauth_service.tiktok_api import TIKTOK_API_BASE_URL, tiktok_api
+from src.oauth_service.token_manager import token_manager
+from src.oauth_service.user_service import user_service
 
 logger = logging_config.get_logger("tiktok_service")
 
 # TikTok OAuth endpoints
 TIKTOK_AUTHORIZE_URL = "https://www.tiktok.com/v2/auth/authorize/"
-TIKTOK_TOKEN_URL = "https://open.tiktokapis.com/v2/oauth/token/"
-TIKTOK_USER_INFO_URL = "https://open.tiktokapis.com/v2/user/info/"
-TIKTOK_VIDEO_UPLOAD_URL = "https://open.tiktokapis.com/v2/post/publish/video/init/"
+TIKTOK_TOKEN_URL = f"{TIKTOK_API_BASE_URL}/v2/oauth/token/"
+TIKTOK_USER_INFO_URL = f"{TIKTOK_API_BASE_URL}/v2/user/info/"
+TIKTOK_VIDEO_UPLOAD_URL = f"{TIKTOK_API_BASE_URL}/v2/post/publish/video/init/"
+TIKTOK_PUBLISH_STATUS_URL = f"{TIKTOK_API_BASE_URL}/v2/post/publish/status/fetch/"
+TIKTOK_VIDEO_LIST_URL = f"{TIKTOK_API_BASE_URL}/v2/video/list/"
+TIKTOK_VIDEO_FIELDS = "id,title,video_description,duration,cover_image_url,create_time"
+TIKTOK_VIDEO_LIST_MAX_COUNT = 20
+TIKTOK_VIDEO_LIST_MAX_PAGES = int(os.getenv("TIKTOK_VIDEO_LIST_MAX_PAGES", 50))
+# How many linked accounts the multi-account video list fetches at once
+TIKTOK_VIDEO_FANOUT_CONCURRENCY = int(os.getenv("TIKTOK_VIDEO_FANOUT_CONCURRENCY", 5))
 
-async def login(request: Request, provider, oauth, redirect_uri, email, platform):
-    """Handle TikTok OAuth login"""
-    if provider != "tiktok":
-        logger.warning(
-            "Unsupported provider - Hiện phương thức đăng nhập này chưa hỗ trợ",
-            log_type="app",
-            extra_data={},
+PUBLISH_JOB_KIND = "tiktok_publish"
+PUBLISH_FINAL_STATUSES = ("PUBLISH_COMPLETE", "SEND_TO_USER_INBOX", "FAILED")
+PUBLISH_STATUS_POLL_INTERVAL = float(os.getenv("TIKTOK_PUBLISH_STATUS_POLL_INTERVAL", 5))
+PUBLISH_STATUS_TIMEOUT = float(os.getenv("TIKTOK_PUBLISH_STATUS_TIMEOUT", 1800))
+# With webhooks configured on the TikTok app, the status API is only a fallback for events that never arrive
+TIKTOK_WEBHOOK_ENABLED = os.getenv("TIKTOK_WEBHOOK_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+PUBLISH_STATUS_FALLBACK_INTERVAL = float(os.getenv("TIKTOK_PUBLISH_STATUS_FALLBACK_INTERVAL", 120))
+# Deliveries signed longer ago than this (seconds) are refused as replays
+TIKTOK_WEBHOOK_TOLERANCE = float(os.getenv("TIKTOK_WEBHOOK_TOLERANCE", 300))
+
+# Webhook events that settle a post, with the publish status they stand for
+PUBLISH_WEBHOOK_STATUSES = {
+    "post.publish.complete": "PUBLISH_COMPLETE",
+    "post.publish.publicly_available": "PUBLISH_COMPLETE",
+    "post.publish.inbox_delivered": "SEND_TO_USER_INBOX",
+    "post.publish.failed": "FAILED",
+}
+
+BATCH_JOB_KIND = "tiktok_publish_batch"
+BATCH_MAX_ITEMS = int(os.getenv("TIKTOK_BATCH_MAX_ITEMS", 100))
+# publish.init calls and chunk uploads in flight for one batch, overall and per account
+BATCH_CONCURRENCY = int(os.getenv("TIKTOK_BATCH_CONCURRENCY", 8))
+BATCH_ACCOUNT_CONCURRENCY = int(os.getenv("TIKTOK_BATCH_ACCOUNT_CONCURRENCY", 1))
+
+USER_SYNC_JOB_KIND = "create_oauth_user"
+# Answer the callback before the user service has been called; delivery is retried from the outbox
+USER_SERVICE_DEFER = os.getenv("USER_SERVICE_DEFER", "false").strip().lower() in ("1", "true", "yes", "on")
+
+class TikTokOAuthApp(StarletteOAuth2App):
+    """Authlib's Starlette app with the code exchange sent through ``tiktok_api``.
+
+    Authlib still checks the callback's state, but the exchange reuses the
+    shared connection pool and gets the outbound retries and breaker instead
+    of a new HTTP client, and TLS handshake, for every login.
+    """
+
+    async def fetch_access_token(self, redirect_uri=None, code=None, state=None, code_verifier=None, **kwargs):
+        data = {
+            "client_key": self.client_id,
+            "client_secret": self.client_secret,
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": redirect_uri,
+        }
+        if code_verifier:
+            data["code_verifier"] = code_verifier
+        response = await tiktok_api.post(
+            "oauth.token",
+            TIKTOK_TOKEN_URL,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data=data,
         )
-        return {"error": "Unsupported provider"}
-    
+        token = response.json() if response.content else {}
+        if response.status_code >= 400 or "access_token" not in token:
+            raise OAuthError(
+                error=token.get("error") or str(response.status_code),
+                description=token.get("error_description"),
+            )
+        return token
+
+async def login(request: Request, provider, oauth_client, redirect_uri, email, platform):
+    """Handle TikTok OAuth login"""
     logger.info("Điều hướng sang trang xác thực TikTok OAuth", log_type="app")
-    oauth_provider = oauth.create_client(provider)
     
-    state_data = {"email": email, "platform": platform}
+    # The nonce keeps each login's state unique, so parallel logins of one user don't consume each other's state
+    state_data = {"email": email, "platform": platform, "nonce": secrets.token_urlsafe(8)}
     encoded_state = base64.urlsafe_b64encode(json.dumps(state_data).encode()).decode()
     
     # TikTok requires specific scopes for video publishing
     scopes = ["user.info.basic", "video.publish", "video.upload"]
     
-    return await oauth_provider.authorize_redirect(
+    return await oauth_client.authorize_redirect(
         request, 
         redirect_uri, 
         state=encoded_state,
         scope=" ".join(scopes)
     )
 
-async def handle_callback(request: Request, provider, oauth, email, platform):
+async def handle_callback(request: Request, provider, oauth_client, email, platform):
     """Handle TikTok OAuth callback"""
     try:
-        if provider != "tiktok":
-            logger.warning(
-                "Unsupported provider - Hiện phương thức đăng nhập này chưa hỗ trợ",
-                log_type="app",
-                extra_data={},
-            )
-            return {"error": "Unsupported provider"}
-        
-        oauth_provider = oauth.create_client(provider)
-        token = await oauth_provider.authorize_access_token(request)
-        print("TikTok token:", token)
+        with stage_duration.time("tiktok.token_exchange"):
+            token = await oauth_client.authorize_access_token(request)
+        logger.info(
+            "Nhận token TikTok thành công",
+            log_type="app",
+            extra_data={"scope": token.get("scope"), "expires_in": token.get("expires_in")},
+        )
         
         # Get user info from TikTok
-        async with httpx.AsyncClient() as client:
-            user_response = await client.get(
+        with stage_duration.time("tiktok.user_info"):
+            user_response = await tiktok_api.get(
+                "user.info",
                 TIKTOK_USER_INFO_URL,
-                headers={
-                    "Authorization": f"Bearer {token['access_token']}",
-                    "Content-Type": "application/json"
-                },
+                token=token["access_token"],
+                headers={"Content-Type": "application/json"},
                 params={"fields": "open_id,union_id,avatar_url,display_name"}
             )
-            user_response.raise_for_status()
-            user_data = user_response.json()
+        user_response.raise_for_status()
+        user_data = user_response.json()
             
         logger.info(
             f"OAuth callback from {provider} | User ID: {user_data['data']['user']['open_id']}",
@@ -76,24 +154,25 @@ async def handle_callback(request: Request, provider, oauth, email, platform):
         )
         
         user_info = User(email=email)
+        payload = {
+            "user": user_info.model_dump(),
+            "name": user_data['data']['user']['display_name'],
+            "provider_id": user_data['data']['user']['open_id'],
+            "provider": provider,
+            "token": token["access_token"],
+            "avatar": user_data['data']['user']['avatar_url'],
+        }
         
-        # Create user if not exists
-        async with httpx.AsyncClient() as client:
-            create = await client.post(
-                "http://user_service.railway.internal:8080/api/user/create_oauth_user",
-                json={
-                    "user": user_info.dict(),
-                    "name": user_data['data']['user']['display_name'],
-                    "provider_id": user_data['data']['user']['open_id'],
-                    "provider": provider,
-                    "token": token["access_token"],
-                    "avatar": user_data['data']['user']['avatar_url'],
-                },
-            )
-            create.raise_for_status()
-            create = create.json()
-        
-        print(create)
+        # Saving the token set and creating the user only need the identity, so run them together.
+        # With USER_SERVICE_DEFER the user service call goes through the outbox instead.
+        if USER_SERVICE_DEFER:
+            create_user = user_service_outbox.enqueue(USER_SYNC_JOB_KIND, payload)
+        else:
+            create_user = _create_oauth_user(payload)
+        _, create = await asyncio.gather(
+            _save_token(email, provider, user_data['data']['user']['open_id'], token),
+            create_user,
+        )
         
         if create:
             if platform == "app":
@@ -118,6 +197,7 @@ async def handle_callback(request: Request, provider, oauth, email, platform):
             return response
             
     except Exception as e:
+        errors_total.inc(provider, "callback")
         logger.error(
             f"Authentication failed. Please try again: {str(e)}", log_type="error"
         )
@@ -128,152 +208,807 @@ async def handle_callback(request: Request, provider, oauth, email, platform):
             )
         return {"error": f"Authentication failed. Please try again: {str(e)}"}
 
+async def _save_token(email, provider, provider_id, token):
+    """Keep the refresh token and expiry so the access token can be renewed later"""
+    with stage_duration.time("db.save_token"):
+        await token_manager.save(email, provider, provider_id, token)
+
+async def _create_oauth_user(payload):
+    """Create the user if needed and link the TikTok account in the user service"""
+    with stage_duration.time("user_service.create_oauth_user"):
+        create = await user_service.create_oauth_user(payload)
+    # The user service has linked or refreshed this account; drop cached copies
+    account_cache.invalidate_prefix(payload["user"]["email"], payload["provider"])
+    video_cache.invalidate_prefix(payload["user"]["email"], payload["provider"])
+    logger.info("Đã đồng bộ tài khoản TikTok sang user service", log_type="app")
+    return create
+
+async def run_user_sync_job(job):
+    """Deliver one deferred ``create_oauth_user`` call; failures are retried by the outbox"""
+    await _create_oauth_user(job["payload"])
+
+user_service_outbox.register(USER_SYNC_JOB_KIND, run_user_sync_job)
+
+async def _list_social_accounts(email, provider):
+    """Linked accounts for ``provider`` through the per-user account cache"""
+    with stage_duration.time("db.list_social_accounts"):
+        return await account_cache.get_or_load(
+            (email, provider, None),
+            lambda: connect.list_social_accounts(email, provider),
+        )
+
 async def get_tiktok_accounts(provider, user):
-    """Get TikTok accounts for user"""
+    """Get TikTok accounts for user; the list is cached, so repeated polls send the same object"""
+    async def load():
+        social_accounts = await _list_social_accounts(user["email"], provider)
+        return [
+            {"name": account["name"], "account_id": account["provider_id"], "avatar": account["avatar"]}
+            for account in social_accounts
+        ]
+    
     try:
-        check = connect.db["users"].find_one({"email": user["email"]})
-        list_accounts = []
-        
-        if check and "social_account" in check:
-            for social_account in check["social_account"]:
-                if social_account["provider"] == provider:
-                    info = {
-                        "name": social_account["name"],
-                        "account_id": social_account["provider_id"],
-                        "avatar": social_account["avatar"],
-                    }
-                    list_accounts.append(info)
-        return list_accounts
+        # Dropped with the rest of the user's accounts when one is linked
+        return await account_cache.get_or_load((user["email"], provider, None, "public"), load)
     except Exception as e:
+        errors_total.inc(provider, "accounts")
         raise e
 
-async def create_video_post(request: Request, provider, oauth, user):
-    """Create TikTok video post"""
-    print("create TikTok video post------------")
+async def _find_tiktok_token(email, provider_id):
+    """Return a fresh access token for one linked TikTok account"""
+    with stage_duration.time("db.find_token"):
+        return await token_manager.get_access_token(email, "tiktok", provider_id)
+
+def _parse_publish_at(value):
+    """Read ``publish_at`` as an ISO 8601 time or Unix seconds; times without a zone are UTC"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc)
+    publish_at = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if publish_at.tzinfo is None:
+        publish_at = publish_at.replace(tzinfo=timezone.utc)
+    return publish_at
+
+async def _enqueue_or_schedule(kind, payload, publish_at, **fields):
+    """Queue a job now, or store it for the scheduler when ``publish_at`` is still ahead"""
+    if publish_at and publish_at > datetime.now(timezone.utc):
+        job_id = await publish_scheduler.schedule(kind, payload, publish_at, publish_at=publish_at, **fields)
+        return job_id, "scheduled"
+    return await publish_jobs.enqueue(kind, payload, **fields), QUEUED
+
+async def create_video_post(request: Request, provider, user):
+    """Queue a TikTok video post and return the job id right away; with ``publish_at`` it waits until then"""
     try:
-        if provider != "tiktok":
-            logger.warning(
-                "Unsupported provider - Hiện phương thức đăng nhập này chưa hỗ trợ",
-                log_type="app",
-                extra_data={},
-            )
-            return {"error": "Unsupported provider"}
-        
         logger.info("Tiến hành tạo video TikTok", log_type="app")
         logger.audit_log("Tiến hành tạo video TikTok", log_type="audit")
         
+        data = await request.json()
+        if not await _find_tiktok_token(user["email"], data.get("provider_id")):
+            return {"error": "TikTok account not found"}
+        
+        content = data.get("content", {})
+        if not content.get("video_url"):
+            return {"error": "Video URL is required for TikTok posts"}
         try:
-            data = await request.json()
-            check = connect.db["users"].find_one({"email": user["email"]})
-            
-            # Find TikTok account
-            tiktok_token = None
-            if check and "social_account" in check:
-                for social_account in check["social_account"]:
-                    if data.get("provider_id") == social_account["provider_id"] and social_account["provider"] == "tiktok":
-                        tiktok_token = social_account["token"]
-                        break
-            
-            if not tiktok_token:
-                return {"error": "TikTok account not found"}
-            
-            content = data.get("content", {})
-            video_url = content.get("video_url")
-            description = content.get("description", "")
-            
-            if not video_url:
-                return {"error": "Video URL is required for TikTok posts"}
-            
-            # Step 1: Initialize video upload
-            async with httpx.AsyncClient() as client:
-                init_response = await client.post(
-                    TIKTOK_VIDEO_UPLOAD_URL,
-                    headers={
-                        "Authorization": f"Bearer {tiktok_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "post_info": {
-                            "title": description,
-                            "privacy_level": "SELF_ONLY",  # or "PUBLIC_TO_EVERYONE"
-                            "disable_duet": False,
-                            "disable_comment": False,
-                            "disable_stitch": False,
-                            "video_cover_timestamp_ms": 1000
-                        },
-                        "source_info": {
-                            "source": "FILE_UPLOAD",
-                            "video_size": 50000000,  # Placeholder size
-                            "chunk_size": 10000000,
-                            "total_chunk_count": 5
-                        }
-                    }
-                )
-                init_response.raise_for_status()
-                upload_data = init_response.json()
-            
-            print("TikTok upload initialization:", upload_data)
-            
-            # Step 2: Upload video chunks (simplified for example)
-            # In a real implementation, you would need to:
-            # 1. Download the video from video_url
-            # 2. Split it into chunks
-            # 3. Upload each chunk
-            # 4. Publish the video
-            
-            logger.info(
-                "Tạo video TikTok thành công",
-                log_type="app",
-                extra_data={"publish_id": upload_data.get("data", {}).get("publish_id")},
-            )
-            logger.audit_log(
-                "Tạo video TikTok thành công",
-                log_type="audit",
-                extra_data={"publish_id": upload_data.get("data", {}).get("publish_id")},
-            )
-            
-            return upload_data
-            
-        except Exception as e:
-            raise e
-            
+            publish_at = _parse_publish_at(data.get("publish_at"))
+        except (TypeError, ValueError, OverflowError, OSError):
+            return {"error": "publish_at must be an ISO 8601 time or a Unix timestamp"}
+        
+        job_id, status = await _enqueue_or_schedule(
+            PUBLISH_JOB_KIND,
+            content,
+            publish_at,
+            email=user["email"],
+            provider=provider,
+            provider_id=data.get("provider_id"),
+            publish_id=None,
+        )
+        logger.audit_log(
+            "Đã lên lịch video TikTok" if status == "scheduled" else "Đã đưa video TikTok vào hàng đợi",
+            log_type="audit",
+            extra_data={"job_id": job_id, "publish_at": publish_at},
+        )
+        return {"job_id": job_id, "status": status, "publish_at": publish_at}
+        
     except Exception as e:
+        errors_total.inc(provider, "video.create")
         logger.error(f"Fail to create TikTok video: {str(e)}", log_type="error")
         return {"error": f"Fail to create TikTok video. Please try again: {str(e)}"}
 
-async def get_user_videos(provider, provider_id, oauth, user):
-    """Get user's TikTok videos"""
+async def upload_video_post(request: Request, provider, user):
+    """Stream a multipart video upload straight through to TikTok, then queue the publish job.
+
+    The form fields ``provider_id`` and ``video_size`` (bytes) and the optional
+    ``description``, ``privacy_level`` and ``chunk_size`` must come before the
+    file part, because TikTok needs the size and chunk plan before the first
+    byte is sent. The file is forwarded chunk by chunk as it is received and
+    never written to disk; its size and SHA-256 are computed on the way through.
+    """
     try:
-        check = connect.db["users"].find_one({"email": user["email"]})
+        logger.info("Tiến hành tải video TikTok trực tiếp", log_type="app")
+        logger.audit_log("Tiến hành tải video TikTok trực tiếp", log_type="audit")
         
-        # Find TikTok account
-        tiktok_token = None
-        if check and "social_account" in check:
-            for social_account in check["social_account"]:
-                if provider_id == social_account["provider_id"] and social_account["provider"] == "tiktok":
-                    tiktok_token = social_account["token"]
-                    break
+        form = StreamingMultipart(request.headers, request.stream())
+        fields = {}
+        part = await form.next_part()
+        while part is not None and part.filename is None:
+            fields[part.name] = (await part.read()).decode("utf-8", "replace")
+            part = await form.next_part()
+        if part is None:
+            return {"error": "Video file is required"}
         
+        provider_id = fields.get("provider_id")
+        tiktok_token = await _find_tiktok_token(user["email"], provider_id)
         if not tiktok_token:
             return {"error": "TikTok account not found"}
+        try:
+            video_size = int(fields.get("video_size", ""))
+            chunk_size = int(fields["chunk_size"]) if fields.get("chunk_size") else None
+        except ValueError:
+            return {"error": "video_size must be sent as a number before the video file"}
+        
+        content = {
+            "description": fields.get("description", ""),
+            "privacy_level": fields.get("privacy_level", "SELF_ONLY"),
+        }
+        plan = video_upload.plan_chunks(video_size, chunk_size)
+        publish_id, upload_url = await _init_publish(tiktok_token, content, plan)
+        
+        digest = hashlib.sha256()
+        
+        async def blocks():
+            async for block in part:
+                digest.update(block)
+                yield block
+        
+        with stage_duration.time("upload.proxy"):
+            await video_upload.upload_stream(blocks(), upload_url, plan)
+        content.update(video_size=video_size, sha256=digest.hexdigest())
+        
+        # Only TikTok's processing is left, so the job starts at the status step
+        job_id = await publish_jobs.enqueue(
+            PUBLISH_JOB_KIND,
+            content,
+            email=user["email"],
+            provider=provider,
+            provider_id=provider_id,
+            publish_id=publish_id,
+            stage="uploaded",
+            progress=1.0,
+        )
+        logger.audit_log(
+            "Đã tải video TikTok lên, đang chờ TikTok xử lý",
+            log_type="audit",
+            extra_data={"job_id": job_id, "publish_id": publish_id, "video_size": video_size},
+        )
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "publish_id": publish_id,
+            "video_size": video_size,
+            "sha256": content["sha256"],
+        }
+        
+    except (MultipartError, video_upload.UploadError) as e:
+        errors_total.inc(provider, "video.upload")
+        logger.error(f"Fail to upload TikTok video: {str(e)}", log_type="error")
+        return {"error": f"Invalid video upload: {str(e)}"}
+    except Exception as e:
+        errors_total.inc(provider, "video.upload")
+        logger.error(f"Fail to upload TikTok video: {str(e)}", log_type="error")
+        return {"error": f"Fail to upload TikTok video. Please try again: {str(e)}"}
+
+async def get_video_job(provider, job_id, user):
+    """Report progress, publish_id and status of a queued TikTok post"""
+    job = await publish_jobs.get(job_id)
+    if not job or job.get("email") != user["email"] or job.get("provider") != provider:
+        return {"error": "Job not found"}
+    return {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "progress": job.get("progress", 0.0),
+        "publish_id": job.get("publish_id"),
+        "publish_status": job.get("publish_status"),
+        "publish_at": job.get("publish_at"),
+        "error": job.get("error"),
+    }
+
+async def _fetch_publish_status(tiktok_token, publish_id):
+    response = await tiktok_api.post(
+        "publish.status",
+        TIKTOK_PUBLISH_STATUS_URL,
+        token=tiktok_token,
+        headers={"Content-Type": "application/json"},
+        json={"publish_id": publish_id},
+    )
+    response.raise_for_status()
+    return response.json().get("data", {})
+
+# Publish jobs of this process waiting for TikTok, woken as soon as a webhook settles their post
+publish_waiters = {}
+
+async def _wait_publish_status(job_id, tiktok_token, publish_id):
+    """Wait until the post reaches a final status or the wait times out.
+
+    Webhook events store the status on the job and wake the wait at once; the
+    job is also re-read every ``PUBLISH_STATUS_POLL_INTERVAL`` seconds for
+    events applied by another worker. TikTok's status API is polled at that
+    interval without webhooks, and only every
+    ``PUBLISH_STATUS_FALLBACK_INTERVAL`` seconds with them.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + PUBLISH_STATUS_TIMEOUT
+    fetch_interval = PUBLISH_STATUS_FALLBACK_INTERVAL if TIKTOK_WEBHOOK_ENABLED else PUBLISH_STATUS_POLL_INTERVAL
+    next_fetch = loop.time() + fetch_interval if TIKTOK_WEBHOOK_ENABLED else loop.time()
+    waiter = publish_waiters.setdefault(publish_id, asyncio.Event())
+    try:
+        while True:
+            # Cleared before reading, so an event applied meanwhile still wakes the next wait
+            waiter.clear()
+            job = await publish_jobs.get(job_id)
+            if job.get("publish_status") in PUBLISH_FINAL_STATUSES:
+                return {"status": job["publish_status"], "fail_reason": job.get("fail_reason")}
+            if loop.time() >= next_fetch:
+                data = await _fetch_publish_status(tiktok_token, publish_id)
+                status = data.get("status")
+                if status != job.get("publish_status"):
+                    # A final status from a webhook is never replaced by an older one
+                    await publish_jobs.update_many(
+                        {"_id": job_id, "publish_status": {"$nin": PUBLISH_FINAL_STATUSES}},
+                        publish_status=status, fail_reason=data.get("fail_reason"),
+                    )
+                if status in PUBLISH_FINAL_STATUSES:
+                    return data
+                next_fetch = loop.time() + fetch_interval
+            if loop.time() >= deadline:
+                raise TimeoutError(f"TikTok did not finish processing {publish_id} in time")
+            timeout = min(PUBLISH_STATUS_POLL_INTERVAL, next_fetch - loop.time(), deadline - loop.time())
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(waiter.wait(), max(timeout, 0))
+    finally:
+        publish_waiters.pop(publish_id, None)
+
+def _verify_webhook_signature(header, body):
+    """Check a ``TikTok-Signature: t=<unix time>,s=<hex HMAC-SHA256>`` header against the raw body"""
+    secret = os.getenv("TIKTOK_CLIENT_SECRET")
+    if not secret or not header:
+        return False
+    fields = dict(part.split("=", 1) for part in header.split(",") if "=" in part)
+    try:
+        timestamp = int(fields["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > TIKTOK_WEBHOOK_TOLERANCE:
+        return False
+    expected = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, fields.get("s", ""))
+
+async def receive_webhook(request: Request):
+    """Verify a TikTok webhook delivery and acknowledge it; the event is applied in the background"""
+    body = await request.body()
+    if not _verify_webhook_signature(request.headers.get("TikTok-Signature"), body):
+        webhook_events.inc("tiktok", "invalid_signature")
+        return ORJSONResponse({"error": "Invalid signature"}, status_code=401)
+    try:
+        event = orjson.loads(body)
+        # TikTok sends the event's details as a JSON string
+        content = orjson.loads(event.get("content") or "{}")
+    except (orjson.JSONDecodeError, AttributeError, TypeError):
+        webhook_events.inc("tiktok", "invalid_body")
+        return ORJSONResponse({"error": "Invalid webhook body"}, status_code=400)
+    
+    # TikTok events carry no id; a redelivery repeats the body byte for byte, so its hash serves as one
+    event_id = hashlib.sha256(body).hexdigest()
+    accepted = webhook_inbox.put("tiktok", event_id, {
+        "event": event.get("event"),
+        "user_openid": event.get("user_openid"),
+        "create_time": event.get("create_time"),
+        "content": content,
+    })
+    if not accepted:
+        return ORJSONResponse({"error": "Too many webhook events pending"}, status_code=503)
+    return {"status": "accepted"}
+
+async def apply_publish_events(events):
+    """Store the publish status reported by a batch of webhook events, with one write per status"""
+    updates = defaultdict(list)
+    for event in events:
+        status = PUBLISH_WEBHOOK_STATUSES.get(event["event"])
+        publish_id = event["content"].get("publish_id") if isinstance(event["content"], dict) else None
+        if status and publish_id:
+            updates[(status, event["content"].get("reason"))].append(publish_id)
+    for (status, reason), publish_ids in updates.items():
+        # A post that already has a final status keeps it, so late and repeated events change nothing
+        await publish_jobs.update_many(
+            {"publish_id": {"$in": publish_ids}, "publish_status": {"$nin": PUBLISH_FINAL_STATUSES}},
+            publish_status=status, fail_reason=reason,
+        )
+        for publish_id in publish_ids:
+            waiter = publish_waiters.get(publish_id)
+            if waiter is not None:
+                waiter.set()
+
+webhook_inbox.register("tiktok", apply_publish_events)
+
+async def _init_publish(tiktok_token, content, plan):
+    """Start a FILE_UPLOAD post on TikTok; returns ``(publish_id, upload_url)``"""
+    init_response = await tiktok_api.post(
+        "publish.init",
+        TIKTOK_VIDEO_UPLOAD_URL,
+        token=tiktok_token,
+        headers={"Content-Type": "application/json"},
+        json={
+            "post_info": {
+                "title": content.get("description", ""),
+                "privacy_level": content.get("privacy_level", "SELF_ONLY"),
+                "disable_duet": False,
+                "disable_comment": False,
+                "disable_stitch": False,
+                "video_cover_timestamp_ms": 1000
+            },
+            "source_info": plan.source_info()
+        }
+    )
+    init_response.raise_for_status()
+    upload_data = init_response.json().get("data", {})
+    upload_url = upload_data.get("upload_url")
+    if not upload_url:
+        raise ValueError("TikTok did not return an upload URL")
+    return upload_data.get("publish_id"), upload_url
+
+async def run_publish_job(job):
+    """Upload a queued video to TikTok, then follow it until TikTok reports a final status"""
+    job_id = job["_id"]
+    tiktok_token = await _find_tiktok_token(job["email"], job["provider_id"])
+    if not tiktok_token:
+        raise ValueError("TikTok account not found")
+    
+    publish_id = job.get("publish_id")
+    if job.get("stage") != "uploaded":
+        content = job["payload"]
+        video_url = content["video_url"]
+        
+        # Step 1: Work out the real size and chunk plan of the source video
+        with stage_duration.time("upload.probe_source"):
+            video_size, accepts_ranges = await video_upload.probe_source(video_url)
         
-        # Get user videos (if API supports it)
-        async with httpx.AsyncClient() as client:
-            videos_response = await client.get(
-                "https://open.tiktokapis.com/v2/video/list/",
-                headers={
-                    "Authorization": f"Bearer {tiktok_token}",
-                    "Content-Type": "application/json"
-                },
-                params={
-                    "fields": "id,title,video_description,duration,cover_image_url,create_time"
-                }
+        # An earlier attempt may have started this upload; carry on from its last acknowledged chunk
+        checkpoint = await upload_checkpoints.load(publish_id) if publish_id else None
+        if checkpoint and checkpoint[1].video_size == video_size:
+            upload_url, plan, acked = checkpoint
+            logger.info(
+                "Tiếp tục tải video TikTok từ checkpoint",
+                log_type="app",
+                extra_data={"publish_id": publish_id, "chunks_acked": len(acked),
+                            "total_chunk_count": plan.total_chunk_count},
             )
-            videos_response.raise_for_status()
-            videos_data = videos_response.json()
+        else:
+            plan = video_upload.plan_chunks(video_size, content.get("chunk_size"))
+            acked = set()
+            
+            # Step 2: Initialize video upload
+            publish_id, upload_url = await _init_publish(tiktok_token, content, plan)
+            await upload_checkpoints.create(publish_id, upload_url, plan)
+            await publish_jobs.update(job_id, stage="uploading", publish_id=publish_id, progress=0.0)
         
-        return videos_data.get("data", {}).get("videos", [])
+        # Step 3: Stream the video to TikTok chunk by chunk, checkpointing every acknowledged chunk
+        async def on_ack(index, first, last):
+            await upload_checkpoints.ack(publish_id, index, first, last)
+        
+        async def on_progress(chunks_done, total_chunk_count):
+            await publish_jobs.update(job_id, progress=round(chunks_done / total_chunk_count, 4))
+        
+        with stage_duration.time("upload.transfer"):
+            await video_upload.upload_video(
+                video_url, upload_url, plan, accepts_ranges,
+                on_progress=on_progress, acked=acked, on_ack=on_ack,
+            )
+        await publish_jobs.update(job_id, stage="uploaded", progress=1.0)
+        await upload_checkpoints.clear(publish_id)
+    
+    # Step 4: Wait for TikTok to process the upload
+    with stage_duration.time("publish.wait_status"):
+        status = await _wait_publish_status(job_id, tiktok_token, publish_id)
+    video_cache.invalidate_prefix(job["email"], job["provider"], job["provider_id"])
+    if status.get("status") == "FAILED":
+        # Final answer from TikTok; retrying would only poll the same status again
+        error = f"TikTok rejected the video: {status.get('fail_reason')}"
+        logger.error(error, log_type="error", extra_data={"publish_id": publish_id})
+        return {"status": FAILED, "error": error, "publish_status": status.get("status")}
+    
+    logger.info(
+        "Tạo video TikTok thành công",
+        log_type="app",
+        extra_data={"publish_id": publish_id},
+    )
+    logger.audit_log(
+        "Tạo video TikTok thành công",
+        log_type="audit",
+        extra_data={"publish_id": publish_id},
+    )
+    return {"stage": "published", "publish_status": status.get("status")}
+
+publish_jobs.register(PUBLISH_JOB_KIND, run_publish_job)
+
+async def create_video_batch(request: Request, provider, user):
+    """Check a batch of posts, resolving every account's token at once, and queue the valid ones as one job.
+
+    The body holds ``items``, each with a ``provider_id`` and the fields of a
+    single post (``video_url``, ``description``, ``privacy_level``); fields in
+    an optional ``content`` object apply to every item that does not set them.
+    """
+    try:
+        logger.info("Tiến hành tạo nhiều video TikTok", log_type="app")
+        logger.audit_log("Tiến hành tạo nhiều video TikTok", log_type="audit")
+        
+        data = await request.json()
+        defaults = data.get("content") or {}
+        raw_items = data.get("items")
+        if not isinstance(raw_items, list) or not raw_items:
+            return {"error": "items must be a non-empty list"}
+        if len(raw_items) > BATCH_MAX_ITEMS:
+            return {"error": f"A batch holds at most {BATCH_MAX_ITEMS} items"}
+        
+        try:
+            publish_at = _parse_publish_at(data.get("publish_at"))
+        except (TypeError, ValueError, OverflowError, OSError):
+            return {"error": "publish_at must be an ISO 8601 time or a Unix timestamp"}
+        
+        raw_items = [raw if isinstance(raw, dict) else {} for raw in raw_items]
+        with stage_duration.time("db.find_tokens"):
+            tokens = await token_manager.get_access_tokens(
+                user["email"], "tiktok", [raw.get("provider_id") for raw in raw_items]
+            )
+        items = []
+        for index, raw in enumerate(raw_items):
+            content = {**defaults, **raw}
+            provider_id = content.pop("provider_id", None)
+            item = {"index": index, "provider_id": provider_id, "content": content, "status": QUEUED}
+            if provider_id not in tokens:
+                item.update(status="rejected", error="TikTok account not found")
+            elif not content.get("video_url"):
+                item.update(status="rejected", error="Video URL is required for TikTok posts")
+            items.append(item)
+        
+        results = [
+            {key: item[key] for key in ("index", "provider_id", "status", "error") if key in item}
+            for item in items
+        ]
+        if all(item["status"] == "rejected" for item in items):
+            return {"batch_id": None, "status": "rejected", "items": results}
+        
+        batch_id, status = await _enqueue_or_schedule(
+            BATCH_JOB_KIND,
+            {"chunk_size": data.get("chunk_size")},
+            publish_at,
+            email=user["email"],
+            provider=provider,
+            items=items,
+        )
+        logger.audit_log(
+            "Đã đưa nhiều video TikTok vào hàng đợi",
+            log_type="audit",
+            extra_data={"batch_id": batch_id, "items": len(items), "publish_at": publish_at},
+        )
+        return {"batch_id": batch_id, "status": status, "publish_at": publish_at, "items": results}
         
     except Exception as e:
-        print(f"Error getting TikTok videos: {e}")
+        errors_total.inc(provider, "video.batch")
+        logger.error(f"Fail to create TikTok video batch: {str(e)}", log_type="error")
+        return {"error": f"Fail to create TikTok video batch. Please try again: {str(e)}"}
+
+async def get_video_batch(provider, batch_id, user):
+    """Report each item of a batch, merged with the publish job that follows it once uploaded"""
+    batch = await publish_jobs.get(batch_id)
+    if (not batch or batch.get("kind") != BATCH_JOB_KIND
+            or batch.get("email") != user["email"] or batch.get("provider") != provider):
+        return {"error": "Batch not found"}
+    item_jobs = {
+        job["_id"]: job
+        for job in await publish_jobs.get_many(item["job_id"] for item in batch["items"] if item.get("job_id"))
+    }
+    items = []
+    for item in batch["items"]:
+        job = item_jobs.get(item.get("job_id"), {})
+        items.append({
+            "index": item["index"],
+            "provider_id": item["provider_id"],
+            "status": job.get("status", item["status"]),
+            "job_id": item.get("job_id"),
+            "publish_id": item.get("publish_id"),
+            "publish_status": job.get("publish_status"),
+            "error": job.get("error") or item.get("error"),
+        })
+    return {"batch_id": batch["_id"], "status": batch["status"], "publish_at": batch.get("publish_at"),
+            "items": items}
+
+async def _publish_batch_group(batch, video_url, group, tokens, slot, save):
+    """Start a post for every item sharing ``video_url``, then upload the source to all of them in one pass"""
+    try:
+        with stage_duration.time("upload.probe_source"):
+            video_size, _ = await video_upload.probe_source(video_url)
+        plan = video_upload.plan_chunks(video_size, batch["payload"].get("chunk_size"))
+    except Exception as e:
+        for item in group:
+            item.update(status=FAILED, error=f"Fail to read the source video: {str(e)}")
+        await save()
+        return
+    
+    async def init(item):
+        tiktok_token = tokens.get(item["provider_id"])
+        if not tiktok_token:
+            item.update(status=FAILED, error="TikTok account not found")
+            return None
+        try:
+            async with slot(item["provider_id"]):
+                item["publish_id"], upload_url = await _init_publish(tiktok_token, item["content"], plan)
+        except Exception as e:
+            item.update(status=FAILED, error=f"Fail to create TikTok video: {str(e)}")
+            return None
+        item["status"] = "uploading"
+        return upload_url
+    
+    upload_urls = await asyncio.gather(*(init(item) for item in group))
+    targets = [(item, upload_url) for item, upload_url in zip(group, upload_urls) if upload_url]
+    await save()
+    if not targets:
+        return
+    
+    try:
+        with stage_duration.time("upload.transfer"):
+            errors = await video_upload.upload_fanout(
+                video_url, [upload_url for _, upload_url in targets], plan,
+                put_slot=lambda target: slot(targets[target][0]["provider_id"]),
+            )
+    except Exception as e:
+        errors = [str(e)] * len(targets)
+    
+    for (item, _), error in zip(targets, errors):
+        if error:
+            item.update(status=FAILED, error=f"Fail to upload TikTok video: {error}")
+            continue
+        # Only TikTok's processing is left; the item's own job follows it
+        item["job_id"] = await publish_jobs.enqueue(
+            PUBLISH_JOB_KIND,
+            item["content"],
+            email=batch["email"],
+            provider=batch["provider"],
+            provider_id=item["provider_id"],
+            publish_id=item["publish_id"],
+            stage="uploaded",
+            progress=1.0,
+            batch_id=batch["_id"],
+        )
+        item["status"] = "uploaded"
+    await save()
+
+async def run_publish_batch(job):
+    """Upload every item of a batch, fetching each distinct source video once.
+
+    publish.init calls and chunk uploads run at most ``BATCH_CONCURRENCY`` at
+    a time for the batch and ``BATCH_ACCOUNT_CONCURRENCY`` per account. Each
+    uploaded item is handed to a publish job of its own, which waits for
+    TikTok to process it. A retried batch skips items that already finished.
+    """
+    batch_id = job["_id"]
+    items = job["items"]
+    pending = [item for item in items if item["status"] in (QUEUED, "uploading")]
+    tokens = await token_manager.get_access_tokens(
+        job["email"], "tiktok", [item["provider_id"] for item in pending]
+    )
+    batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    account_slots = defaultdict(lambda: asyncio.Semaphore(BATCH_ACCOUNT_CONCURRENCY))
+    
+    @contextlib.asynccontextmanager
+    async def slot(provider_id):
+        # Wait for the account first, so a busy account does not hold a batch-wide slot
+        async with account_slots[provider_id], batch_slots:
+            yield
+    
+    async def save():
+        done = sum(1 for item in pending if item["status"] in ("uploaded", FAILED))
+        await publish_jobs.update(batch_id, items=items, progress=round(done / len(pending), 4))
+    
+    groups = defaultdict(list)
+    for item in pending:
+        groups[item["content"]["video_url"]].append(item)
+    await asyncio.gather(*(
+        _publish_batch_group(job, video_url, group, tokens, slot, save)
+        for video_url, group in groups.items()
+    ))
+    
+    uploaded = sum(1 for item in items if item["status"] == "uploaded")
+    failed = sum(1 for item in items if item["status"] == FAILED)
+    logger.info(
+        "Đã tải lên nhiều video TikTok",
+        log_type="app",
+        extra_data={"batch_id": batch_id, "uploaded": uploaded, "failed": failed, "sources": len(groups)},
+    )
+    if not uploaded:
+        return {"status": FAILED, "error": "No item of the batch could be uploaded"}
+    return {"stage": "dispatched", "uploaded": uploaded, "failed": failed}
+
+publish_jobs.register(BATCH_JOB_KIND, run_publish_batch)
+
+async def _fetch_video_page(tiktok_token, cursor, max_count):
+    """Fetch one page of the account's videos from TikTok"""
+    body = {"max_count": max_count}
+    if cursor is not None:
+        body["cursor"] = cursor
+    videos_response = await tiktok_api.post(
+        "video.list",
+        TIKTOK_VIDEO_LIST_URL,
+        token=tiktok_token,
+        headers={"Content-Type": "application/json"},
+        params={"fields": TIKTOK_VIDEO_FIELDS},
+        json=body,
+    )
+    videos_response.raise_for_status()
+    data = videos_response.json().get("data", {})
+    return {
+        "videos": data.get("videos", []),
+        "cursor": data.get("cursor"),
+        "has_more": data.get("has_more", False),
+    }
+
+async def _get_video_page(email, provider, provider_id, tiktok_token, cursor, max_count, refresh=False):
+    """One page of videos through the per-account response cache"""
+    return await video_cache.get_or_load(
+        (email, provider, provider_id, cursor, max_count),
+        lambda: _fetch_video_page(tiktok_token, cursor, max_count),
+        refresh=refresh,
+    )
+
+async def get_user_videos(provider, provider_id, user, cursor=None, max_count=20, refresh=False):
+    """Get one page of the user's TikTok videos; pass the returned cursor for the next page"""
+    try:
+        # Find TikTok account
+        tiktok_token = await _find_tiktok_token(user["email"], provider_id)
+        if not tiktok_token:
+            return {"error": "TikTok account not found"}
+        
+        max_count = min(max(max_count, 1), TIKTOK_VIDEO_LIST_MAX_COUNT)
+        return await _get_video_page(
+            user["email"], provider, provider_id, tiktok_token, cursor, max_count, refresh
+        )
+        
+    except Exception as e:
+        errors_total.inc(provider, "videos")
+        logger.error(f"Error getting TikTok videos: {str(e)}", log_type="error")
         raise e
+
+async def stream_user_videos(provider, provider_id, user, max_count=20, refresh=False):
+    """Follow the cursor through every page, streaming each one as an NDJSON line"""
+    tiktok_token = await _find_tiktok_token(user["email"], provider_id)
+    if not tiktok_token:
+        return {"error": "TikTok account not found"}
+    max_count = min(max(max_count, 1), TIKTOK_VIDEO_LIST_MAX_COUNT)
+    
+    async def pages():
+        cursor = None
+        for _ in range(TIKTOK_VIDEO_LIST_MAX_PAGES):
+            try:
+                page = await _get_video_page(
+                    user["email"], provider, provider_id, tiktok_token, cursor, max_count, refresh
+                )
+            except Exception as e:
+                errors_total.inc(provider, "videos")
+                logger.error(f"Error getting TikTok videos: {str(e)}", log_type="error")
+                yield dumps({"error": str(e)}) + b"\n"
+                return
+            yield dumps(page) + b"\n"
+            if not page["has_more"]:
+                return
+            cursor = page["cursor"]
+    
+    return StreamingResponse(pages(), media_type="application/x-ndjson")
+
+async def _get_account_videos(email, provider, social_account, max_count, refresh, semaphore):
+    """First page of videos for one linked account, or a per-account error"""
+    result = {"account_id": social_account["provider_id"], "name": social_account.get("name")}
+    async with semaphore:
+        try:
+            tiktok_token = await _find_tiktok_token(email, social_account["provider_id"])
+            if not tiktok_token:
+                return {**result, "error": "TikTok account not found"}
+            page = await _get_video_page(
+                email, provider, social_account["provider_id"], tiktok_token, None, max_count, refresh
+            )
+        except Exception as e:
+            errors_total.inc(provider, "videos")
+            logger.error(
+                f"Error getting TikTok videos: {str(e)}",
+                log_type="error",
+                extra_data={"account_id": social_account["provider_id"]},
+            )
+            return {**result, "error": str(e)}
+    return {**result, **page}
+
+async def stream_all_user_videos(provider, user, max_count=20, refresh=False):
+    """Fetch the first page of videos of every linked account concurrently.
+
+    Each account is streamed as one NDJSON line as soon as it finishes, so a
+    slow account never holds back the others; pass an ``account_id`` and its
+    ``cursor`` to ``/api/{provider}/videos/{provider_id}`` for further pages.
+    """
+    social_accounts = await _list_social_accounts(user["email"], provider)
+    max_count = min(max(max_count, 1), TIKTOK_VIDEO_LIST_MAX_COUNT)
+    
+    async def accounts():
+        semaphore = asyncio.Semaphore(TIKTOK_VIDEO_FANOUT_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(
+                _get_account_videos(user["email"], provider, social_account, max_count, refresh, semaphore)
+            )
+            for social_account in social_accounts
+        ]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield dumps(await done) + b"\n"
+        finally:
+            # The client went away: stop fetching for it
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(accounts(), media_type="application/x-ndjson")
+
+class TikTokProvider(Provider):
+    """TikTok Login Kit, Display API and Content Posting API"""
+    name = "tiktok"
+    
+    def register_oauth(self, oauth):
+        # TikTok doesn't have a standard OAuth discovery endpoint like Google,
+        # so the endpoints are configured by hand
+        oauth.register(
+            name=self.name,
+            client_id=os.getenv("TIKTOK_CLIENT_ID"),
+            client_secret=os.getenv("TIKTOK_CLIENT_SECRET"),
+            authorization_endpoint=TIKTOK_AUTHORIZE_URL,
+            token_endpoint=TIKTOK_TOKEN_URL,
+            client_cls=TikTokOAuthApp,
+            client_kwargs={
+                "scope": "user.info.basic video.publish video.upload",
+                "response_type": "code",
+                # Authlib still builds a client to render the login redirect; skip reloading the CA bundle
+                "verify": http_clients.ssl_context(),
+            },
+        )
+        self.oauth_client = oauth.create_client(self.name)
+    
+    async def login(self, request, redirect_uri, email, platform):
+        return await login(request, self.name, self.oauth_client, redirect_uri, email, platform)
+    
+    async def callback(self, request, email, platform):
+        return await handle_callback(request, self.name, self.oauth_client, email, platform)
+    
+    async def get_accounts(self, user):
+        return await get_tiktok_accounts(self.name, user)
+    
+    async def get_videos(self, provider_id, user, cursor=None, max_count=20, all_pages=False, refresh=False):
+        if all_pages:
+            return await stream_user_videos(self.name, provider_id, user, max_count, refresh)
+        return await get_user_videos(self.name, provider_id, user, cursor, max_count, refresh)
+    
+    async def get_all_videos(self, user, max_count=20, refresh=False):
+        return await stream_all_user_videos(self.name, user, max_count, refresh)
+    
+    async def create_video_post(self, request, user):
+        return await create_video_post(request, self.name, user)
+    
+    async def upload_video_post(self, request, user):
+        return await upload_video_post(request, self.name, user)
+    
+    async def create_video_batch(self, request, user):
+        return await create_video_batch(request, self.name, user)
+    
+    async def get_video_batch(self, batch_id, user):
+        return await get_video_batch(self.name, batch_id, user)
+    
+    async def get_video_job(self, job_id, user):
+        return await get_video_job(self.name, job_id, user)
+    
+    async def receive_webhook(self, request):
+        return await receive_webhook(request)
+
+providers.register(TikTokProvider())
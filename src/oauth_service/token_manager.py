@@ -0,0 +1,296 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from pymongo import ReturnDocument
+
+from shared_module.DB import connect
+from shared_module.cache import account_cache
+from shared_module.log import logging_config
+from shared_module.outbound import CircuitOpenError
+from shared_module.state import WORKER_ID, state_backend
+from src.oauth_service.tiktok_api import TIKTOK_API_BASE_URL, tiktok_api
+
+logger = logging_config.get_logger("token_manager")
+
+TIKTOK_TOKEN_URL = f"{TIKTOK_API_BASE_URL}/v2/oauth/token/"
+
+# Refresh on use when the access token expires within this many seconds
+REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", 300))
+# The sweeper renews tokens expiring within this window, every interval
+SWEEP_AHEAD = float(os.getenv("TOKEN_SWEEP_AHEAD", 1800))
+SWEEP_INTERVAL = float(os.getenv("TOKEN_SWEEP_INTERVAL", 300))
+SWEEP_BATCH_SIZE = int(os.getenv("TOKEN_SWEEP_BATCH_SIZE", 50))
+SWEEP_CONCURRENCY = int(os.getenv("TOKEN_SWEEP_CONCURRENCY", 5))
+# Longest a worker may hold the cross-worker refresh lock of one account
+REFRESH_LOCK_TTL = float(os.getenv("TOKEN_REFRESH_LOCK_TTL", 30))
+
+
+class TokenRefreshError(Exception):
+    """Raised when TikTok did not refresh a token; after a refusal the user has to log in again"""
+
+
+def _expiry(seconds, now):
+    return now + timedelta(seconds=int(seconds)) if seconds else None
+
+
+def _as_utc(value):
+    # pymongo returns naive datetimes in UTC unless tz_aware is set
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class TokenManager:
+    """Persists full OAuth token sets and keeps access tokens fresh.
+
+    Tokens live in the ``oauth_tokens`` collection keyed by provider and
+    provider_id. ``get_access_token`` refreshes tokens that are about to
+    expire, concurrent refreshes of one account share a single call to
+    ``TIKTOK_TOKEN_URL``, and a background sweeper renews soon-to-expire
+    tokens in batches before anyone asks for them. A refresh TikTok refuses
+    is recorded in ``refresh_error`` and not tried again until the user logs
+    in; rate limits and outages are retried by the next sweep or use.
+    """
+
+    def __init__(self, collection_name="oauth_tokens"):
+        self.collection_name = collection_name
+        self._inflight = {}
+        self._sweeper = None
+
+    @property
+    def collection(self):
+        return connect.adb[self.collection_name]
+
+    @staticmethod
+    def _key(provider, provider_id):
+        return f"{provider}:{provider_id}"
+
+    async def save(self, email, provider, provider_id, token):
+        """Store the token set returned by the OAuth code exchange or a refresh"""
+        now = datetime.now(timezone.utc)
+        record = {
+            "_id": self._key(provider, provider_id),
+            "email": email,
+            "provider": provider,
+            "provider_id": provider_id,
+            "access_token": token["access_token"],
+            "refresh_token": token.get("refresh_token"),
+            "scope": token.get("scope"),
+            "expires_at": _expiry(token.get("expires_in"), now),
+            "refresh_expires_at": _expiry(token.get("refresh_expires_in"), now),
+            "refresh_error": None,
+            "updated_at": now,
+        }
+        if not record["refresh_token"]:
+            # A refresh may leave the refresh token out; the stored one stays valid
+            del record["refresh_token"], record["refresh_expires_at"]
+        record = await self.collection.find_one_and_update(
+            {"_id": record["_id"]}, {"$set": record}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        account_cache.invalidate((email, provider, provider_id, "token"))
+        return record
+
+    async def _load(self, email, provider, provider_id):
+        record = await self.collection.find_one(
+            {"_id": self._key(provider, provider_id), "email": email}
+        )
+        if record:
+            return record
+        # Accounts linked before full token sets were stored only have the access token
+        social_account = await connect.find_social_account(email, provider, provider_id)
+        if social_account:
+            return {"access_token": social_account["token"], "expires_at": None}
+        return None
+
+    async def get_access_token(self, email, provider, provider_id):
+        """Return a usable access token, refreshing it first if it is about to expire"""
+        record = await account_cache.get_or_load(
+            (email, provider, provider_id, "token"),
+            lambda: self._load(email, provider, provider_id),
+        )
+        if not record:
+            return None
+        return await self._fresh_access_token(record)
+
+    async def get_access_tokens(self, email, provider, provider_ids):
+        """Return ``{provider_id: access_token}`` for many accounts, reading the database once.
+
+        Cached records are used as they are and the others are fetched with a
+        single ``$in`` query; only accounts linked before full token sets were
+        stored need a second query on the user document. Accounts without a
+        token are left out. Tokens about to expire are refreshed concurrently.
+        """
+        provider_ids = [provider_id for provider_id in dict.fromkeys(provider_ids) if provider_id]
+        records = {}
+        for provider_id in provider_ids:
+            record = account_cache.get((email, provider, provider_id, "token"))
+            if record:
+                records[provider_id] = record
+        missing = [provider_id for provider_id in provider_ids if provider_id not in records]
+        if missing:
+            found = await self.collection.find({
+                "_id": {"$in": [self._key(provider, provider_id) for provider_id in missing]},
+                "email": email,
+            })
+            for record in found:
+                records[record["provider_id"]] = record
+            legacy = [provider_id for provider_id in missing if provider_id not in records]
+            if legacy:
+                for social_account in await connect.find_social_accounts(email, provider, legacy):
+                    records[social_account["provider_id"]] = {
+                        "access_token": social_account["token"], "expires_at": None,
+                    }
+            for provider_id in missing:
+                if provider_id in records:
+                    account_cache.set((email, provider, provider_id, "token"), records[provider_id])
+        tokens = await asyncio.gather(*(self._fresh_access_token(record) for record in records.values()))
+        return dict(zip(records, tokens))
+
+    async def _fresh_access_token(self, record):
+        expires_at = _as_utc(record.get("expires_at"))
+        margin = datetime.now(timezone.utc) + timedelta(seconds=REFRESH_MARGIN)
+        # A refused refresh is not retried on use; logging in again stores a new token set
+        if expires_at and expires_at <= margin and record.get("refresh_token") and not record.get("refresh_error"):
+            try:
+                record = await self.refresh(record)
+            except (TokenRefreshError, httpx.TransportError, CircuitOpenError) as e:
+                # Hand back what we have; it may still be valid for up to REFRESH_MARGIN seconds,
+                # and TikTok answers 401 if it really expired
+                logger.warning(
+                    "Token refresh failed, using the current access token",
+                    log_type="app",
+                    extra_data={"account": record.get("_id"), "error": str(e) or type(e).__name__},
+                )
+        return record["access_token"]
+
+    async def refresh(self, record):
+        """Refresh one token set; concurrent calls for the same account share one request"""
+        future = self._inflight.get(record["_id"])
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[record["_id"]] = future
+        try:
+            refreshed = await self._refresh(record)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(refreshed)
+            return refreshed
+        finally:
+            del self._inflight[record["_id"]]
+
+    async def _refresh(self, record):
+        lock = f"token-refresh:{record['_id']}"
+        if not await state_backend.add(lock, WORKER_ID, REFRESH_LOCK_TTL):
+            return await self._wait_for_refresh(record)
+        try:
+            return await self._request_refresh(record)
+        finally:
+            await state_backend.delete(lock)
+
+    async def _wait_for_refresh(self, record):
+        """Another worker is refreshing this account; wait for it to store the new token"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REFRESH_LOCK_TTL
+        while loop.time() < deadline:
+            await asyncio.sleep(0.2)
+            current = await self.collection.find_one({"_id": record["_id"]})
+            if current and current["access_token"] != record["access_token"]:
+                account_cache.invalidate((record["email"], record["provider"], record["provider_id"], "token"))
+                return current
+            if current and current.get("refresh_error"):
+                raise TokenRefreshError(current["refresh_error"])
+        raise TokenRefreshError("Timed out waiting for another worker to refresh the token")
+
+    async def _request_refresh(self, record):
+        response = await tiktok_api.post(
+            "oauth.token",
+            TIKTOK_TOKEN_URL,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data={
+                "client_key": os.getenv("TIKTOK_CLIENT_ID"),
+                "client_secret": os.getenv("TIKTOK_CLIENT_SECRET"),
+                "grant_type": "refresh_token",
+                "refresh_token": record["refresh_token"],
+            },
+        )
+        token = response.json() if response.content else {}
+        if response.status_code >= 400 or "access_token" not in token:
+            reason = token.get("error_description") or token.get("error") or response.status_code
+            # Rate limits and outages left after the outbound retries are tried again later;
+            # anything else, such as invalid_grant, needs the user to log in again
+            permanent = response.status_code != 429 and response.status_code < 500
+            if permanent:
+                await self.collection.update_one(
+                    {"_id": record["_id"]}, {"$set": {"refresh_error": str(reason)}}
+                )
+                account_cache.invalidate((record["email"], record["provider"], record["provider_id"], "token"))
+            logger.warning(
+                "TikTok token refresh failed",
+                log_type="app",
+                extra_data={"account": record["_id"], "reason": str(reason), "permanent": permanent},
+            )
+            raise TokenRefreshError(str(reason))
+        return await self.save(record["email"], record["provider"], record["provider_id"], token)
+
+    async def sweep(self):
+        """Refresh every token expiring within SWEEP_AHEAD seconds, one batch at a time"""
+        now = datetime.now(timezone.utc)
+        query = {
+            "expires_at": {"$lte": now + timedelta(seconds=SWEEP_AHEAD)},
+            "refresh_expires_at": {"$gt": now},
+            "refresh_error": None,
+        }
+        semaphore = asyncio.Semaphore(SWEEP_CONCURRENCY)
+        refreshed = failed = 0
+
+        async def refresh_one(record):
+            async with semaphore:
+                await self.refresh(record)
+
+        while True:
+            batch = await self.collection.find(query, limit=SWEEP_BATCH_SIZE, sort=[("expires_at", 1)])
+            if not batch:
+                break
+            results = await asyncio.gather(
+                *(refresh_one(record) for record in batch), return_exceptions=True
+            )
+            batch_failed = sum(isinstance(result, Exception) for result in results)
+            refreshed += len(results) - batch_failed
+            failed += batch_failed
+            # Stop when nothing in the batch could be refreshed so we never spin on it
+            if len(batch) < SWEEP_BATCH_SIZE or batch_failed == len(batch):
+                break
+        if refreshed or failed:
+            logger.info(
+                "Token sweep finished",
+                log_type="app",
+                extra_data={"refreshed": refreshed, "failed": failed},
+            )
+        return refreshed, failed
+
+    async def _sweep_forever(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Token sweep failed: {str(e)}", log_type="error")
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def start(self):
+        self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+
+token_manager = TokenManager()
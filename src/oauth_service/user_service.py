@@ -0,0 +1,154 @@
+import asyncio
+import os
+
+from shared_module.log import logging_config
+from shared_module.metrics import metrics
+from shared_module.outbound import EndpointPolicy, OutboundClient
+
+logger = logging_config.get_logger("user_service")
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service.railway.internal:8080").rstrip("/")
+CREATE_OAUTH_USER_PATH = "/api/user/create_oauth_user"
+CREATE_OAUTH_USERS_PATH = os.getenv("USER_SERVICE_BULK_PATH", "/api/user/create_oauth_users")
+# Upserts arriving within this many seconds are sent as one bulk call; 0 disables batching
+BATCH_WINDOW = float(os.getenv("USER_SERVICE_BATCH_WINDOW", 0.02))
+BATCH_MAX_SIZE = int(os.getenv("USER_SERVICE_BATCH_MAX_SIZE", 50))
+
+# Statuses meaning the user service has no bulk endpoint
+BULK_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+# create_oauth_user is an upsert keyed by email, provider and provider_id, so retrying it is safe
+USER_SERVICE_POLICIES = {
+    "create_oauth_user": EndpointPolicy(idempotent=True),
+    "create_oauth_users": EndpointPolicy(idempotent=True),
+}
+
+batch_size = metrics.histogram(
+    "user_service_batch_size", "Upserts sent per user service call",
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+coalesced_upserts = metrics.counter(
+    "user_service_coalesced_total", "Upserts merged into an identical pending one"
+)
+
+
+class UserServiceClient:
+    """Client for the user service that micro-batches ``create_oauth_user`` upserts.
+
+    Calls made within ``batch_window`` seconds of each other are sent as one
+    POST to the bulk endpoint, and repeated upserts of the same account in a
+    window are merged so only the latest payload is sent. If the user service
+    answers the bulk path with 404/405/501 the client switches to one POST
+    per upsert for the rest of the process.
+    """
+
+    def __init__(self, base_url, batch_window=BATCH_WINDOW, batch_max_size=BATCH_MAX_SIZE, api=None):
+        self.base_url = base_url
+        self.batch_window = batch_window
+        self.batch_max_size = batch_max_size
+        self.api = api or OutboundClient(
+            "user_service",
+            USER_SERVICE_POLICIES,
+            max_retries=int(os.getenv("USER_SERVICE_MAX_RETRIES", 2)),
+            backoff_base=float(os.getenv("USER_SERVICE_BACKOFF_BASE", 0.2)),
+        )
+        self.bulk_supported = batch_window > 0
+        self._pending = {}
+        self._flush_handle = None
+        self._batches = set()
+
+    @staticmethod
+    def _key(payload):
+        return payload["user"]["email"], payload["provider"], payload["provider_id"]
+
+    async def create_oauth_user(self, payload):
+        """Create the user if needed and link the OAuth account; returns the user service response"""
+        if not self.bulk_supported:
+            return await self._create_one(payload)
+
+        future = asyncio.get_running_loop().create_future()
+        key = self._key(payload)
+        entry = self._pending.get(key)
+        if entry is not None:
+            # Same account twice in one window: send the newest payload once
+            coalesced_upserts.inc()
+            entry[0] = payload
+            entry[1].append(future)
+        else:
+            self._pending[key] = [payload, [future]]
+
+        if len(self._pending) >= self.batch_max_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = list(self._pending.values()), {}
+        if pending:
+            task = asyncio.create_task(self._send(pending))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _send(self, pending):
+        payloads = [payload for payload, _ in pending]
+        try:
+            if len(payloads) == 1:
+                results = [await self._create_one(payloads[0])]
+            else:
+                results = await self._create_bulk(payloads)
+        except Exception as e:
+            for _, futures in pending:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for (_, futures), result in zip(pending, results):
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _create_one(self, payload):
+        batch_size.observe(1)
+        response = await self.api.post(
+            "create_oauth_user", f"{self.base_url}{CREATE_OAUTH_USER_PATH}", json=payload
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _create_bulk(self, payloads):
+        """One POST for many upserts; results come back in request order"""
+        batch_size.observe(len(payloads))
+        response = await self.api.post(
+            "create_oauth_users", f"{self.base_url}{CREATE_OAUTH_USERS_PATH}", json={"users": payloads}
+        )
+        if response.status_code in BULK_UNSUPPORTED_STATUSES:
+            logger.warning(
+                "User service has no bulk endpoint, sending upserts one by one",
+                log_type="app",
+                extra_data={"status": response.status_code},
+            )
+            self.bulk_supported = False
+            return await asyncio.gather(
+                *(self._create_one(payload) for payload in payloads), return_exceptions=True
+            )
+        response.raise_for_status()
+        results = response.json().get("results", [])
+        if len(results) != len(payloads):
+            raise ValueError("User service bulk response does not match the request")
+        return results
+
+    async def aclose(self):
+        """Send whatever is still waiting for its batch window"""
+        self._flush()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+
+user_service = UserServiceClient(USER_SERVICE_URL)
@@ -0,0 +1,421 @@
+import asyncio
+import contextlib
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from shared_module.DB import connect
+from shared_module.http_client import http_clients
+from shared_module.log import logging_config
+
+logger = logging_config.get_logger("video_upload")
+
+# TikTok media transfer limits
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_FINAL_CHUNK_SIZE = 128 * 1024 * 1024
+MAX_CHUNK_COUNT = 1000
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("TIKTOK_UPLOAD_CHUNK_SIZE", 10 * 1024 * 1024))
+# TikTok documents sequential chunk uploads, so parallel PUTs are opt-in
+DEFAULT_PARALLELISM = int(os.getenv("TIKTOK_UPLOAD_PARALLELISM", 1))
+# Extra attempts for a chunk whose transfer failed for a transient reason
+CHUNK_RETRIES = int(os.getenv("TIKTOK_UPLOAD_CHUNK_RETRIES", 3))
+CHUNK_RETRY_DELAY = float(os.getenv("TIKTOK_UPLOAD_CHUNK_RETRY_DELAY", 1.0))
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+# TikTok's upload_url stays valid for an hour after publish.init
+UPLOAD_URL_TTL = float(os.getenv("TIKTOK_UPLOAD_URL_TTL", 3600))
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+
+
+class UploadError(Exception):
+    """Raised when the source video or the TikTok upload endpoint misbehaves"""
+
+
+class ChunkPlan:
+    """Byte ranges for a TikTok FILE_UPLOAD, following the media transfer rules"""
+
+    def __init__(self, video_size, chunk_size, total_chunk_count):
+        self.video_size = video_size
+        self.chunk_size = chunk_size
+        self.total_chunk_count = total_chunk_count
+
+    def ranges(self):
+        """Yield ``(index, first_byte, last_byte)``; the final chunk absorbs the remainder"""
+        for index in range(self.total_chunk_count):
+            first = index * self.chunk_size
+            if index == self.total_chunk_count - 1:
+                last = self.video_size - 1
+            else:
+                last = first + self.chunk_size - 1
+            yield index, first, last
+
+    def source_info(self):
+        return {
+            "source": "FILE_UPLOAD",
+            "video_size": self.video_size,
+            "chunk_size": self.chunk_size,
+            "total_chunk_count": self.total_chunk_count,
+        }
+
+
+def plan_chunks(video_size, chunk_size=None):
+    """Build the chunk plan TikTok expects for a video of ``video_size`` bytes"""
+    if video_size <= 0:
+        raise UploadError("Video is empty")
+    chunk_size = min(max(chunk_size or DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+    if video_size < chunk_size:
+        # Videos under 5 MiB must be sent whole; ones under a chunk fit in a single chunk anyway
+        return ChunkPlan(video_size, video_size, 1)
+
+    # Grow the chunk size if the video would need more chunks than TikTok allows
+    while video_size // chunk_size > MAX_CHUNK_COUNT and chunk_size < MAX_CHUNK_SIZE:
+        chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+    total_chunk_count = video_size // chunk_size
+    final_chunk = video_size - (total_chunk_count - 1) * chunk_size
+    if total_chunk_count > MAX_CHUNK_COUNT or final_chunk > MAX_FINAL_CHUNK_SIZE:
+        raise UploadError(f"Video of {video_size} bytes is too large to upload")
+    return ChunkPlan(video_size, chunk_size, total_chunk_count)
+
+
+async def probe_source(video_url):
+    """Return ``(video_size, accepts_ranges)`` for ``video_url`` without downloading it"""
+    client = http_clients.get("upload")
+    async with client.stream("GET", video_url, headers={"Range": "bytes=0-0"}) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+            if match:
+                return int(match.group(1)), True
+        length = response.headers.get("Content-Length")
+        if response.status_code == 200 and length:
+            return int(length), False
+    raise UploadError("Could not determine the size of the source video")
+
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+async def _exact_length(blocks, expected):
+    """Pass ``blocks`` through, failing if the total differs from ``expected`` bytes"""
+    received = 0
+    async for block in blocks:
+        received += len(block)
+        if received > expected:
+            raise UploadError(f"Source returned more than {expected} bytes for a chunk")
+        yield block
+    if received != expected:
+        raise UploadError(f"Source returned {received} of {expected} bytes for a chunk")
+
+
+async def _drain_buffer(buffer):
+    """Yield ``buffer`` in blocks so the PUT body never needs a second full copy"""
+    for offset in range(0, len(buffer), STREAM_BLOCK_SIZE):
+        yield bytes(buffer[offset:offset + STREAM_BLOCK_SIZE])
+
+
+async def _put_chunk(upload_url, plan, first, last, body):
+    """PUT bytes ``first..last`` to TikTok; ``body`` is an async iterator of blocks"""
+    response = await http_clients.get("upload").put(
+        upload_url,
+        content=body,
+        headers={
+            "Content-Type": "video/mp4",
+            "Content-Length": str(last - first + 1),
+            "Content-Range": f"bytes {first}-{last}/{plan.video_size}",
+        },
+    )
+    response.raise_for_status()
+
+
+async def _with_retries(attempt, first, last):
+    """Await ``attempt()``, retrying dropped connections and transient statuses with backoff"""
+    for retry in range(CHUNK_RETRIES + 1):
+        try:
+            return await attempt()
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code not in RETRYABLE_STATUSES:
+                raise
+            if retry == CHUNK_RETRIES:
+                raise
+            logger.warning(
+                "Retrying video chunk",
+                log_type="app",
+                extra_data={"range": f"{first}-{last}", "attempt": retry + 1, "error": str(e) or type(e).__name__},
+            )
+            await asyncio.sleep(CHUNK_RETRY_DELAY * 2 ** retry)
+
+
+async def _upload_ranged(video_url, upload_url, plan, parallelism, acked, on_chunk):
+    """Pipe a ranged GET for each chunk straight into its PUT"""
+    client = http_clients.get("upload")
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def transfer(index, first, last):
+        async def attempt():
+            headers = {"Range": f"bytes={first}-{last}"}
+            async with client.stream("GET", video_url, headers=headers) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise UploadError("Source stopped honouring range requests")
+                body = _exact_length(response.aiter_raw(STREAM_BLOCK_SIZE), last - first + 1)
+                await _put_chunk(upload_url, plan, first, last, body)
+
+        async with semaphore:
+            await _with_retries(attempt, first, last)
+        await on_chunk(index, first, last)
+
+    tasks = [
+        asyncio.create_task(transfer(index, first, last))
+        for index, first, last in plan.ranges() if index not in acked
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def _buffer_sender(upload_url, plan):
+    """``send(first, last, buffer)`` that PUTs one buffered chunk to ``upload_url`` with retries"""
+    async def send(first, last, buffer):
+        await _with_retries(
+            lambda: _put_chunk(upload_url, plan, first, last, _drain_buffer(buffer)), first, last
+        )
+
+    return send
+
+
+async def _upload_blocks(blocks, plan, parallelism, acked, send, on_chunk):
+    """Cut a stream of byte blocks into chunks, awaiting ``send`` for each one once it is complete.
+
+    Acknowledged chunks still have to be read from the stream, but they are
+    discarded instead of buffered and sent again.
+    """
+    semaphore = asyncio.Semaphore(parallelism)
+    tasks = []
+
+    async def transfer(index, first, last, buffer):
+        try:
+            await send(first, last, buffer)
+        finally:
+            # httpx keeps the request body alive in reference cycles; release it now
+            buffer.clear()
+            semaphore.release()
+        await on_chunk(index, first, last)
+
+    pending = list(plan.ranges())
+    position = 0
+    filled = 0
+    buffer = bytearray()
+    try:
+        async for block in blocks:
+            view = memoryview(block)
+            while view:
+                if position == len(pending):
+                    raise UploadError("Source video is larger than advertised")
+                index, first, last = pending[position]
+                skip = index in acked
+                if not filled and not skip:
+                    # Wait for a free upload slot before buffering the next chunk
+                    await semaphore.acquire()
+                    # Stop reading once a chunk failed for good instead of sending the rest for nothing
+                    failed = next((task for task in tasks if task.done() and not task.cancelled()
+                                   and task.exception() is not None), None)
+                    if failed is not None:
+                        semaphore.release()
+                        raise failed.exception()
+                take = min(len(view), last - first + 1 - filled)
+                if not skip:
+                    buffer += view[:take]
+                filled += take
+                view = view[take:]
+                if filled == last - first + 1:
+                    if not skip:
+                        tasks.append(asyncio.create_task(transfer(index, first, last, buffer)))
+                        buffer = bytearray()
+                    filled = 0
+                    position += 1
+        if position != len(pending):
+            raise UploadError("Source video ended before all chunks were read")
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _upload_streamed(video_url, plan, parallelism, acked, send, on_chunk):
+    """Cut a single streamed GET into chunks, for sources without range support"""
+    async with http_clients.get("upload").stream("GET", video_url) as response:
+        response.raise_for_status()
+        await _upload_blocks(
+            response.aiter_raw(STREAM_BLOCK_SIZE), plan, parallelism, acked, send, on_chunk
+        )
+
+
+def _chunk_callback(plan, acked, on_ack, on_progress):
+    chunks_done = len(acked)
+
+    async def on_chunk(index, first, last):
+        nonlocal chunks_done
+        if on_ack:
+            await on_ack(index, first, last)
+        chunks_done += 1
+        if on_progress:
+            await on_progress(chunks_done, plan.total_chunk_count)
+
+    return on_chunk
+
+
+async def upload_video(video_url, upload_url, plan, accepts_ranges, parallelism=None, on_progress=None,
+                       acked=(), on_ack=None):
+    """Stream ``video_url`` to TikTok's ``upload_url`` chunk by chunk.
+
+    At most ``parallelism`` chunks are in flight at any time. Ranged sources are
+    piped block by block; other sources buffer one chunk per in-flight upload,
+    so peak memory stays within ``chunk_size * parallelism`` whatever the video size.
+    A chunk that fails on a dropped connection or a transient status is sent
+    again up to ``CHUNK_RETRIES`` times. Chunks whose index is in ``acked``
+    were acknowledged by an earlier attempt and are skipped.
+    ``on_ack(index, first_byte, last_byte)`` and then
+    ``on_progress(chunks_done, total_chunk_count)`` are awaited after each chunk.
+    """
+    parallelism = max(1, parallelism or DEFAULT_PARALLELISM)
+    acked = set(acked)
+    on_chunk = _chunk_callback(plan, acked, on_ack, on_progress)
+    if len(acked) < plan.total_chunk_count:
+        if accepts_ranges:
+            await _upload_ranged(video_url, upload_url, plan, parallelism, acked, on_chunk)
+        else:
+            await _upload_streamed(
+                video_url, plan, parallelism, acked, _buffer_sender(upload_url, plan), on_chunk
+            )
+    logger.info(
+        "Uploaded video chunks to TikTok",
+        log_type="app",
+        extra_data={"video_size": plan.video_size, "chunks": plan.total_chunk_count, "resumed": len(acked)},
+    )
+
+
+async def upload_stream(blocks, upload_url, plan, parallelism=None, on_progress=None):
+    """Upload a video that arrives as an async iterator of byte blocks, such as a request body.
+
+    The stream is cut into the chunks of ``plan`` as it is read and must carry
+    exactly ``plan.video_size`` bytes. Reading pauses while every upload slot
+    is busy, so peak memory stays within ``chunk_size * parallelism`` and a
+    failed chunk can still be sent again from its buffer. A stream cannot be
+    read twice, so there is nothing to checkpoint for a later attempt.
+    """
+    parallelism = max(1, parallelism or DEFAULT_PARALLELISM)
+    on_chunk = _chunk_callback(plan, set(), None, on_progress)
+    await _upload_blocks(blocks, plan, parallelism, set(), _buffer_sender(upload_url, plan), on_chunk)
+    logger.info(
+        "Uploaded video chunks to TikTok",
+        log_type="app",
+        extra_data={"video_size": plan.video_size, "chunks": plan.total_chunk_count, "streamed": True},
+    )
+
+
+async def upload_fanout(video_url, upload_urls, plan, put_slot=None, parallelism=None, on_progress=None):
+    """Read ``video_url`` once and send every chunk to each of ``upload_urls``.
+
+    All targets share ``plan``. The source is streamed with a single GET,
+    each chunk is buffered once and PUT to every target still in the running,
+    with the async context manager ``put_slot(target_index)`` held around
+    each PUT. A target whose chunk still fails after retries is dropped
+    while the others carry on. Returns an error message or None per target;
+    raises UploadError when the source misbehaves or every target failed.
+    """
+    errors = [None] * len(upload_urls)
+
+    async def put(target, first, last, buffer):
+        try:
+            async with put_slot(target) if put_slot else contextlib.nullcontext():
+                await _with_retries(
+                    lambda: _put_chunk(upload_urls[target], plan, first, last, _drain_buffer(buffer)),
+                    first, last,
+                )
+        except (httpx.HTTPError, UploadError) as e:
+            errors[target] = str(e) or type(e).__name__
+
+    async def send(first, last, buffer):
+        await asyncio.gather(*(
+            put(target, first, last, buffer) for target in range(len(upload_urls)) if errors[target] is None
+        ))
+        if all(errors):
+            raise UploadError(f"Every upload target failed: {errors[0]}")
+
+    parallelism = max(1, parallelism or DEFAULT_PARALLELISM)
+    on_chunk = _chunk_callback(plan, set(), None, on_progress)
+    await _upload_streamed(video_url, plan, parallelism, set(), send, on_chunk)
+    logger.info(
+        "Uploaded video chunks to TikTok",
+        log_type="app",
+        extra_data={"video_size": plan.video_size, "chunks": plan.total_chunk_count,
+                    "targets": len(upload_urls), "failed": sum(1 for error in errors if error)},
+    )
+    return errors
+
+
+class UploadCheckpoints:
+    """Chunks TikTok has acknowledged for each publish_id, kept in MongoDB.
+
+    A publish job that is retried or picked up after a restart finds the
+    upload URL, the chunk plan and the acknowledged byte ranges here and only
+    sends what is missing. Entries expire together with TikTok's upload URL.
+    """
+
+    def __init__(self, collection_name="upload_checkpoints", ttl=UPLOAD_URL_TTL):
+        self.collection_name = collection_name
+        self.ttl = ttl
+
+    @property
+    def collection(self):
+        return connect.adb[self.collection_name]
+
+    async def create(self, publish_id, upload_url, plan):
+        await self.collection.update_one(
+            {"_id": publish_id},
+            {"$set": {
+                "upload_url": upload_url,
+                "plan": {
+                    "video_size": plan.video_size,
+                    "chunk_size": plan.chunk_size,
+                    "total_chunk_count": plan.total_chunk_count,
+                },
+                "acked": [],
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+            }},
+            upsert=True,
+        )
+
+    async def load(self, publish_id):
+        """Return ``(upload_url, plan, acked chunk indexes)``, or None when the upload cannot be resumed"""
+        doc = await self.collection.find_one({"_id": publish_id})
+        if not doc:
+            return None
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        # The TTL monitor only runs once a minute
+        if expires_at <= datetime.now(timezone.utc):
+            return None
+        acked = {chunk["index"] for chunk in doc.get("acked", [])}
+        return doc["upload_url"], ChunkPlan(**doc["plan"]), acked
+
+    async def ack(self, publish_id, index, first, last):
+        await self.collection.update_one(
+            {"_id": publish_id},
+            {"$addToSet": {"acked": {"index": index, "first": first, "last": last}}},
+        )
+
+    async def clear(self, publish_id):
+        await self.collection.delete_one({"_id": publish_id})
+
+
+upload_checkpoints = UploadCheckpoints()